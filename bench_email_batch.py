@@ -0,0 +1,48 @@
+# bench_email_batch.py — tri spam : un email par requête vs lots (email_batch.py)
+# Mesure le débit (items/s, horloge murale) et l'exactitude sur les mêmes emails.
+# Nécessite Ollama + le modèle de llm_triage_csv ; cache LLM désactivé pour des mesures honnêtes.
+# Sans modèle : OLLAMA_MOCK=1 (mock_ollama.py, délais MOCK_*) → surcoût de la chaîne seul,
+# accuracy alors sans signification.
+# Usage:
+#   python bench_email_batch.py [n_emails=50] [tailles_lot=4,8,16]
+import os, sys, time
+os.environ.setdefault("LLM_CACHE", "0")
+
+import email_batch
+import llm_triage_csv as tri
+import mock_ollama
+from model_residency import Residency, log
+
+def score(recs):
+    ok = [r for r in recs if r["success"]]
+    acc = sum(r["pred"]["label"] == r["gt"] for r in ok) / len(recs) if recs else 0.0
+    return acc, sum(1 for r in recs if r.get("fallback"))
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    sizes = [int(x) for x in (sys.argv[2] if len(sys.argv) > 2 else "4,8,16").split(",")]
+    rows = tri.load_rows()[:n]
+    mock = mock_ollama.attach(tri.OLLAMA) if mock_ollama.enabled() else None
+    # profil des lots (num_ctx le plus grand) : pas de rechargement entre les deux chemins
+    log(Residency(tri.OLLAMA).load(tri.MODEL, "email_batch"), "BENCH")
+
+    t0 = time.time()
+    single = [tri.classify(r) for r in rows]
+    wall = time.time() - t0
+    acc, _ = score(single)
+    print(f"== {len(rows)} emails, modèle {tri.MODEL} ==")
+    print(f"unitaire      : {len(rows)/wall:.2f} items/s | mur={wall:.1f}s | accuracy={acc:.1%}")
+
+    for size in sizes:
+        batches = email_batch.pack([(r, r[1]) for r in rows], tri.MODEL, max_items=size)
+        t0 = time.time()
+        recs = [rec for b in batches for rec in tri.classify_batch(b)]
+        wall = time.time() - t0
+        acc, fb = score(recs)
+        print(f"lots de ≤{size:<3}  : {len(recs)/wall:.2f} items/s | mur={wall:.1f}s | accuracy={acc:.1%} | "
+              f"{len(batches)} lots | repli unitaire={fb}")
+    if mock:
+        mock.report()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# bench_extract.py — extraction DOM : 1 page.evaluate vs chemin par locators
+# Usage:
+#   python bench_extract.py [data/urls.txt] [n_urls=20] [répétitions=5]
+import sys, time
+from pathlib import Path
+from statistics import median
+from playwright.sync_api import sync_playwright
+
+from rpa_runner import (SEL_TITLE, URLS_PATH, accept_cookies, extract_all, new_context, read_urls)
+
+def timed(fn, reps):
+    out = None; times = []
+    for _ in range(reps):
+        t0 = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - t0)
+    return out, median(times)
+
+def main():
+    path = Path(sys.argv[1]) if len(sys.argv) > 1 else URLS_PATH
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    reps = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    t_dom, t_loc, same = [], [], 0
+
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        for url in read_urls(path)[:n]:
+            ctx = new_context(browser)
+            page = ctx.new_page()
+            try:
+                page.goto(url, timeout=15000)
+                page.wait_for_load_state("domcontentloaded")
+                accept_cookies(page)
+                page.wait_for_selector(SEL_TITLE, timeout=15000)
+                time.sleep(0.4)
+                (p_dom, m_dom), td = timed(lambda: extract_all(page, "dom"), reps)
+                (p_loc, m_loc), tl = timed(lambda: extract_all(page, "locators"), reps)
+                t_dom.append(td); t_loc.append(tl)
+                same += int(p_dom == p_loc and m_dom == m_loc)
+                print(f"[BENCH] {url} dom={td*1000:.1f}ms locators={tl*1000:.1f}ms identique={p_dom == p_loc}")
+            except Exception as e:
+                print(f"[BENCH] {url} ignorée: {type(e).__name__}: {e}")
+            finally:
+                ctx.close()
+        browser.close()
+
+    if t_dom:
+        md, ml = median(t_dom), median(t_loc)
+        print(f"\n== Extraction ({len(t_dom)} pages, médiane sur {reps} répétitions) ==")
+        print(f"dom={md*1000:.1f}ms | locators={ml*1000:.1f}ms | gain x{ml/md:.1f} | "
+              f"résultats identiques={same}/{len(t_dom)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# bench_html_parse.py — temps de parsing et pic mémoire par backend sur un corpus de pages sauvegardées
+# Usage:
+#   python bench_html_parse.py [dossier=data/pages] [répétitions=3]
+# Le corpus = fichiers *.html (ex. enregistrés depuis le navigateur ou via snapshots).
+# Chaque backend doit rendre exactement la sortie de legacy_main_text (sinon échec, pages listées).
+import sys, time, tracemalloc
+from pathlib import Path
+from statistics import median
+
+from html_text import available_backends, extract_main_text, legacy_main_text
+
+PAGES_DIR = Path("data/pages")
+
+def bench(fn, pages, reps):
+    times, peaks, outs = [], [], []
+    fn(pages[0])    # échauffement : imports paresseux, caches de sélecteurs CSS hors du pic mémoire
+    for html in pages:
+        tracemalloc.start()
+        out = fn(html)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        best = float("inf")
+        for _ in range(reps):
+            t0 = time.perf_counter()
+            fn(html)
+            best = min(best, time.perf_counter() - t0)
+        times.append(best); outs.append(out)
+    return times, peaks, outs
+
+def main():
+    root = Path(sys.argv[1]) if len(sys.argv) > 1 else PAGES_DIR
+    reps = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    files = sorted(root.glob("*.html"))
+    pages = [p.read_bytes() for p in files]
+    if not pages:
+        print(f"Aucune page *.html dans {root}"); sys.exit(1)
+
+    ref_t, ref_m, ref_out = bench(legacy_main_text, pages, reps)
+    print(f"== {len(pages)} pages ({sum(map(len, pages))/1e6:.1f} Mo) | meilleur de {reps} ==")
+    print(f"{'legacy (html.parser)':<24} médiane={median(ref_t)*1000:7.1f}ms  total={sum(ref_t):6.2f}s  "
+          f"pic mémoire méd.={median(ref_m)/1e6:6.1f}Mo")
+    diff = {}
+    for b in available_backends():
+        t, m, out = bench(lambda h: extract_main_text(h, backend=b), pages, reps)
+        same = sum(int(a == r) for a, r in zip(out, ref_out))
+        print(f"{b:<24} médiane={median(t)*1000:7.1f}ms  total={sum(t):6.2f}s  "
+              f"pic mémoire méd.={median(m)/1e6:6.1f}Mo  gain x{sum(ref_t)/sum(t):.1f}  "
+              f"sortie identique={same}/{len(pages)}")
+        bad = [f.name for f, a, r in zip(files, out, ref_out) if a != r]
+        if bad:
+            diff[b] = bad
+    print("(pic mémoire = allocations Python via tracemalloc ; la mémoire C de lxml/selectolax n'y figure pas)")
+    assert not diff, f"sortie différente de legacy_main_text : {diff}"
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+# bench_main_text.py — taille du texte envoyé au LLM : plus long bloc (ancien) vs extraction par densité
+# Usage:
+#   python bench_main_text.py [dossier=data/pages]
+# Estimation tokens ≈ car./4 ; l'effet réel sur le prefill se lit dans eval_ab.py
+# (relancer llm_runner avec MAIN_TEXT=longest puis MAIN_TEXT=density).
+import sys
+from pathlib import Path
+from statistics import median
+
+from html_text import density_main_text, extract_main_text
+
+PAGES_DIR = Path("data/pages")
+MAX_CHARS_IN = 6000   # même borne que llm_runner
+
+def main():
+    root = Path(sys.argv[1]) if len(sys.argv) > 1 else PAGES_DIR
+    rows = []
+    for p in sorted(root.glob("*.html")):
+        html = p.read_bytes()
+        a = extract_main_text(html)[:MAX_CHARS_IN]
+        b = density_main_text(html)[:MAX_CHARS_IN]
+        rows.append((len(a), len(b)))
+        print(f"{p.name:<40} longest={len(a):6d}  density={len(b):6d}  ({len(b)/max(len(a),1):.0%})")
+    if not rows:
+        print(f"Aucune page *.html dans {root}"); sys.exit(1)
+    la, lb = [r[0] for r in rows], [r[1] for r in rows]
+    print(f"\n== {len(rows)} pages ==\nmédiane car. longest={median(la):.0f} → density={median(lb):.0f} "
+          f"| tokens estimés {sum(la)/4/len(rows):.0f} → {sum(lb)/4/len(rows):.0f} par prompt "
+          f"(-{1-sum(lb)/max(sum(la),1):.0%})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+# bench_ollama_client.py — surcoût HTTP : requests.post à chaque appel (anciennes copies)
+# vs client partagé keep-alive (ollama_client), contre le faux serveur local (mock_ollama.py,
+# délais à 0 : seul le surcoût client/HTTP est mesuré).
+# Usage:
+#   python bench_ollama_client.py [n_appels=300]
+import sys, time
+from statistics import median
+
+import requests
+
+from mock_ollama import MockOllama
+from ollama_client import OllamaClient
+
+def timed(fn, n):
+    out = []
+    for _ in range(n):
+        t0 = time.perf_counter(); fn(); out.append(time.perf_counter() - t0)
+    return out
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    mock = MockOllama(token_ms=0, prefill_ms=0, load_s=0, canned={".": '{"label":"spam"}'}).start()
+    host = mock.host
+    prompt = "Classify this email as 'spam' or 'other'.\n" + "lorem ipsum " * 300
+    client = OllamaClient(host=host)
+    payload = client.payload("stub", prompt, system="sys", profile="email")
+
+    try:
+        old = timed(lambda: requests.post(f"{host}/api/generate", json=payload, timeout=(10, 35)).json()["response"], n)
+        new = timed(lambda: client.generate_text("stub", prompt, system="sys", profile="email", stream=False, cache=False), n)
+    finally:
+        client.close(); mock.stop()
+
+    mo, mn = median(old) * 1000, median(new) * 1000
+    print(f"== {n} appels /api/generate (serveur local, réponse immédiate) ==")
+    print(f"requests.post (1 connexion/appel) : médiane={mo:.2f}ms  total={sum(old):.2f}s")
+    print(f"OllamaClient (keep-alive)        : médiane={mn:.2f}ms  total={sum(new):.2f}s  → -{mo-mn:.2f}ms/appel")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+# bench_prefix_reuse.py — prefill réévalué par item : ordre historique (consignes de fin après
+# le contenu) vs préfixe statique en tête (ollama_client.compose, LLM_PREFIX).
+# Compteurs lus dans les réponses Ollama : prompt_eval_count / prompt_eval_duration.
+# Nécessite Ollama ; cache LLM et streaming désactivés (prompt_eval_* complets à chaque appel).
+# Sans modèle : OLLAMA_MOCK=1 (mock_ollama.py simule la reprise du préfixe commun ; MOCK_PREFILL_MS).
+# Usage:
+#   python bench_prefix_reuse.py [email|invoice] [n_items=50]
+import json, os, sys
+from statistics import median
+os.environ.setdefault("LLM_CACHE", "0")
+
+import mock_ollama
+import ollama_client
+from model_residency import Residency, log
+
+def items(task, n):
+    if task == "email":
+        import llm_triage_csv as mod
+        return mod, mod.classify, mod.load_rows()[:n]
+    import invoice_llm as mod
+    objs = [json.loads(l) for l in mod.IN.read_text(encoding="utf-8").splitlines()][:n]
+    return mod, mod.extract, objs
+
+def run(fn, batch):
+    recs = [fn(it) for it in batch]
+    pe = [r for r in recs if "prompt_eval_count" in r]
+    return sum(r["prompt_eval_count"] for r in pe), sum(r["prompt_eval_s"] for r in pe), \
+        median([r["prompt_eval_count"] for r in pe]) if pe else 0, len(pe)
+
+def main():
+    task = sys.argv[1] if len(sys.argv) > 1 else "email"
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    mod, fn, batch = items(task, n)
+    ollama_client.STREAM = False
+    mock = mock_ollama.attach(mod.OLLAMA) if mock_ollama.enabled() else None
+    log(Residency(mod.OLLAMA).load(mod.MODEL, "email" if task == "email" else "invoice"), "BENCH")
+
+    res = {}
+    for label, prefix in (("ordre historique", False), ("préfixe statique", True)):
+        ollama_client.PREFIX = prefix
+        res[prefix] = run(fn, batch)
+        tok, sec, med, k = res[prefix]
+        print(f"{label:<17}: {k} items | prompt_eval={tok} tokens (médiane/item={med:.0f}) | prefill={sec:.2f}s")
+    (t0, s0, _, _), (t1, s1, _, _) = res[False], res[True]
+    if t0 and s0:
+        print(f"→ économie : {t0-t1} tokens ({1-t1/t0:.1%}) | {s0-s1:.2f}s de prefill ({1-s1/s0:.1%})")
+    if mock:
+        mock.report()
+
+if __name__ == "__main__":
+    main()
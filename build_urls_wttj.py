@@ -4,14 +4,21 @@
 #
 # Arg1 = URL de recherche WTTJ (tu peux changer la query)
 # Arg2 = (optionnel) nombre max d'URLs à collecter (défaut 100)
+# Arg3 = (optionnel) mode de collecte : watch (défaut, événementiel) | scroll (ancien, sleeps fixes)
+#        | api (intercepte les réponses JSON de recherche et pagine directement, sans rendu)
 
-import sys, time, re
+import sys, time, re, json
 from pathlib import Path
 from urllib.parse import urljoin, urlparse
 from playwright.sync_api import sync_playwright
+from net_filter import NetFilter
+from http_client import get_client
 
 MAX_DEFAULT = 100
 OUT_PATH = Path("data/urls.txt")
+META_PATH = Path("data/urls_meta.jsonl")   # mode api : titre/entreprise/lieu par URL
+IDLE_MS = 3000        # mode watch : délai sans nouvelle carte avant de considérer un tour "vide"
+IDLE_ROUNDS = 2       # tours vides consécutifs avant arrêt
 
 def is_job_url(href: str) -> bool:
     if not href: return False
@@ -44,25 +51,13 @@ def scroll_and_collect(page, base_url: str, max_urls: int):
     last_count = -1
     stable_rounds = 0
 
-    # essaie d’appuyer sur "Voir plus" si présent
-    def click_voir_plus():
-        for txt in ["Voir plus", "Voir davantage", "See more", "Load more"]:
-            loc = page.get_by_text(txt, exact=False)
-            if loc.count() > 0:
-                try:
-                    loc.first.click(timeout=1500)
-                    return True
-                except:
-                    pass
-        return False
-
     for i in range(50):  # limite dure pour éviter les boucles infinies
         # scroll bas
         page.mouse.wheel(0, 4000)
         time.sleep(0.8)
 
         # tenter un bouton "voir plus"
-        clicked = click_voir_plus()
+        clicked = click_voir_plus(page)
         if clicked:
             time.sleep(0.8)
 
@@ -85,18 +80,206 @@ def scroll_and_collect(page, base_url: str, max_urls: int):
 
     return seen
 
+# MutationObserver : ne pousse que les liens /jobs/ des nœuds ajoutés (pas de re-scan complet)
+OBSERVER_JS = """() => {
+    if (window.__jobUrls) return window.__jobUrls.length;
+    const urls = window.__jobUrls = [];
+    const seen = new Set();
+    const grab = (root) => {
+        if (!(root instanceof Element)) return;
+        const as = root.matches("a[href*='/jobs/']") ? [root] : root.querySelectorAll("a[href*='/jobs/']");
+        for (const a of as) { if (a.href && !seen.has(a.href)) { seen.add(a.href); urls.push(a.href); } }
+    };
+    grab(document.body);
+    new MutationObserver((muts) => {
+        for (const m of muts) for (const n of m.addedNodes) grab(n);
+    }).observe(document.body, {childList: true, subtree: true});
+    return urls.length;
+}"""
+
+def click_voir_plus(page):
+    for txt in ["Voir plus", "Voir davantage", "See more", "Load more"]:
+        loc = page.get_by_text(txt, exact=False)
+        if loc.count() > 0:
+            try:
+                loc.first.click(timeout=1500)
+                return True
+            except Exception:
+                pass
+    return False
+
+def keep_url(u: str) -> bool:
+    # Filtre basique : on ne garde que le domaine WTTJ
+    return is_job_url(u) and "welcometothejungle.com" in urlparse(u).netloc
+
+def watch_and_collect(page, max_urls: int, sink=None):
+    """Collecte pilotée par les mutations du DOM : on attend l'arrivée de nouvelles
+    cartes (wait_for_function) au lieu de dormir, et on ne lit que les liens ajoutés.
+    `sink(url)` est appelé pour chaque nouvelle URL (écriture au fil de l'eau)."""
+    seen = set()
+    page.evaluate(OBSERVER_JS)
+    read = 0
+    idle = 0
+    while len(seen) < max_urls and idle < IDLE_ROUNDS:
+        # lire uniquement les nouveaux liens
+        new = page.evaluate("i => window.__jobUrls.slice(i)", read)
+        read += len(new)
+        for u in new:
+            if u not in seen and keep_url(u):
+                seen.add(u)
+                if sink: sink(u)
+                if len(seen) >= max_urls: break
+        if len(seen) >= max_urls:
+            break
+
+        # déclencher la page suivante puis attendre le signal (nouveaux nœuds)
+        page.mouse.wheel(0, 4000)
+        click_voir_plus(page)
+        try:
+            page.wait_for_function("n => window.__jobUrls.length > n", arg=read, timeout=IDLE_MS)
+            idle = 0
+        except Exception:
+            idle += 1
+    return seen
+
+# ========= MODE API (réponses JSON de recherche) =========
+def _lang(search_url: str) -> str:
+    m = re.match(r"/([a-z]{2})/", urlparse(search_url).path)
+    return m.group(1) if m else "fr"
+
+def job_hits(obj):
+    """Parcourt une réponse JSON et renvoie les objets qui ressemblent à une offre
+    (slug + organization.slug, format des hits de recherche WTTJ)."""
+    out = []
+    if isinstance(obj, dict):
+        org = obj.get("organization")
+        if isinstance(obj.get("slug"), str) and isinstance(org, dict) and org.get("slug"):
+            out.append(obj)
+        else:
+            for v in obj.values():
+                out += job_hits(v)
+    elif isinstance(obj, list):
+        for v in obj:
+            out += job_hits(v)
+    return out
+
+def hit_to_meta(hit: dict, lang: str) -> dict:
+    org = hit.get("organization") or {}
+    offices = hit.get("offices") or []
+    city = offices[0].get("city", "") if offices and isinstance(offices[0], dict) else ""
+    sal = ""
+    if hit.get("salary_minimum") or hit.get("salary_maximum"):
+        lo, hi = hit.get("salary_minimum") or "", hit.get("salary_maximum") or ""
+        sal = f"{lo} - {hi} {hit.get('salary_currency') or ''}".strip(" -")
+    return {
+        "url": f"https://www.welcometothejungle.com/{lang}/companies/{org['slug']}/jobs/{hit['slug']}",
+        "title": hit.get("name", "") or "",
+        "company": org.get("name", "") or "",
+        "location": city or "",
+        "salary": sal,
+        "summary": hit.get("summary", "") or hit.get("profile", "") or "",
+    }
+
+def _next_page_body(post_data: str, page_no: int):
+    """Corps de requête de recherche (format Algolia multi-queries) pour la page `page_no`."""
+    try:
+        body = json.loads(post_data)
+    except Exception:
+        return None
+    reqs = body.get("requests") if isinstance(body, dict) else None
+    if not reqs:
+        return None
+    for r in reqs:
+        params = r.get("params", "")
+        if "page=" in params:
+            r["params"] = re.sub(r"(^|&)page=\d+", rf"\g<1>page={page_no}", params)
+        else:
+            r["params"] = params + ("&" if params else "") + f"page={page_no}"
+    return json.dumps(body)
+
+def api_collect(page, search_url: str, max_urls: int, sink=None):
+    """Capte les réponses JSON de la recherche, puis rejoue la requête page par page
+    en HTTP direct (pas de rendu, pas de scroll). `sink(meta)` reçoit chaque offre."""
+    lang = _lang(search_url)
+    seen = {}
+    first = {}
+
+    def take(data):
+        for hit in job_hits(data):
+            try:
+                meta = hit_to_meta(hit, lang)
+            except Exception:
+                continue
+            if meta["url"] not in seen and keep_url(meta["url"]) and len(seen) < max_urls:
+                seen[meta["url"]] = meta
+                if sink: sink(meta)
+
+    def on_response(resp):
+        if "json" not in (resp.headers.get("content-type") or "") or resp.request.method != "POST":
+            return
+        try:
+            data = resp.json()
+        except Exception:
+            return
+        if job_hits(data) and not first:
+            first.update(url=resp.url, headers=resp.request.headers, post=resp.request.post_data or "")
+            take(data)
+
+    page.on("response", on_response)
+    page.reload(wait_until="domcontentloaded")
+    try:
+        page.wait_for_event("response", predicate=lambda r: bool(first), timeout=15000)
+    except Exception:
+        pass
+    page.remove_listener("response", on_response)
+    if not first:
+        print("⚠️  aucune réponse JSON de recherche captée (mode api)")
+        return seen
+
+    skip = {"content-length", "accept-encoding", "host", "connection", "cookie"}
+    headers = {k: v for k, v in first["headers"].items() if not k.startswith(":") and k.lower() not in skip}
+    # session du navigateur (cookies anti-bot / consentement) reprise par le client HTTP
+    cookies = page.context.cookies(first["url"])
+    if cookies:
+        headers["Cookie"] = "; ".join(f"{c['name']}={c['value']}" for c in cookies)
+    page_no = 1
+    while len(seen) < max_urls:
+        body = _next_page_body(first["post"], page_no)
+        if body is None:
+            break
+        try:
+            resp = get_client().post(first["url"], headers=headers, data=body)
+        except Exception:
+            break
+        if not resp.ok:
+            break
+        try:
+            data = resp.json()
+        except ValueError:
+            # page HTML (anti-bot, erreur) au lieu du JSON : on garde ce qui est déjà collecté
+            print(f"⚠️  page {page_no + 1} : réponse non JSON, arrêt de la pagination")
+            break
+        before = len(seen)
+        take(data)
+        if len(seen) == before:
+            break
+        page_no += 1
+    return seen
+
 def main():
     if len(sys.argv) < 2:
-        print("Usage: python build_urls_wttj.py '<search_url>' [max_urls]")
+        print("Usage: python build_urls_wttj.py '<search_url>' [max_urls] [watch|scroll|api]")
         sys.exit(1)
     search_url = sys.argv[1]
     max_urls = int(sys.argv[2]) if len(sys.argv) >= 3 else MAX_DEFAULT
+    mode = sys.argv[3] if len(sys.argv) >= 4 else "watch"
 
     OUT_PATH.parent.mkdir(parents=True, exist_ok=True)
 
     with sync_playwright() as p:
         browser = p.chromium.launch(headless=True)
-        ctx = browser.new_context()
+        net = NetFilter()
+        ctx = net.install(browser.new_context())
         page = ctx.new_page()
         page.goto(search_url, timeout=30000)
         page.wait_for_load_state("domcontentloaded")
@@ -111,19 +294,30 @@ def main():
         except:
             pass
 
-        urls = scroll_and_collect(page, search_url, max_urls)
+        t0 = time.time()
+        if mode == "scroll":
+            urls = scroll_and_collect(page, search_url, max_urls)
+            # Dédup + tri
+            urls = sorted(u for u in set(urls) if keep_url(u))
+            with OUT_PATH.open("w", encoding="utf-8") as f:
+                for u in urls:
+                    f.write(u + "\n")
+        elif mode == "api":
+            with OUT_PATH.open("w", encoding="utf-8") as f, META_PATH.open("w", encoding="utf-8") as fm:
+                def sink(meta):
+                    f.write(meta["url"] + "\n"); f.flush()
+                    fm.write(json.dumps(meta, ensure_ascii=False) + "\n"); fm.flush()
+                urls = api_collect(page, search_url, max_urls, sink)
+        else:
+            # écriture au fil de l'eau (ordre de découverte)
+            with OUT_PATH.open("w", encoding="utf-8") as f:
+                def sink(u):
+                    f.write(u + "\n"); f.flush()
+                urls = watch_and_collect(page, max_urls, sink)
         browser.close()
+        net.report("WTTJ-NET")
 
-    # Dédup + tri
-    urls = sorted(set(urls))
-    # Filtre basique : on ne garde que le domaine WTTJ
-    urls = [u for u in urls if "welcometothejungle.com" in urlparse(u).netloc]
-
-    with OUT_PATH.open("w", encoding="utf-8") as f:
-        for u in urls:
-            f.write(u + "\n")
-
-    print(f"✅ Écrit {len(urls)} URLs dans {OUT_PATH}")
+    print(f"✅ Écrit {len(urls)} URLs dans {OUT_PATH} ({time.time()-t0:.1f}s, mode={mode})")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,71 @@
+# email_batch.py — tri spam par lots : plusieurs emails fenêtrés dans un seul prompt,
+# réponse = tableau JSON {id, label} (schéma "spam_batch", cf. llm_schemas.py).
+# Le prefill du SYSTEM et le surcoût HTTP sont payés une fois par lot au lieu d'une fois par email.
+# - taille de lot : au plus LLM_BATCH emails, et ce qui tient dans num_ctx du profil "email_batch"
+# - un email absent ou mal parsé dans la réponse → None (l'appelant repasse en requête unitaire)
+#
+# LLM_BATCH=0 (défaut) : un email par requête ; LLM_BATCH=N : lots d'au plus N emails
+import os
+
+import llm_schemas
+import token_window
+from ollama_client import PROFILES, compose, get_ollama, timing, usage
+
+BATCH = int(os.getenv("LLM_BATCH", "0"))
+PROFILE = "email_batch"
+ITEM_TOKENS = 160           # fenêtre par email dans un lot (le prompt unitaire garde plus)
+OUT_TOKENS_PER_ITEM = 12    # {"i":12,"l":"other"},
+
+OLLAMA = get_ollama()
+
+SYSTEM = (
+    "You are an email spam classifier. You receive several emails, each introduced by '### <id>'.\n"
+    "Output ONLY valid JSON with this exact schema:\n"
+    + llm_schemas.shape("spam_batch") + "\n"
+    "Exactly one entry per email, with the same ids. Allowed labels: spam, other."
+)
+HEADER = "Classify each email below as 'spam' or 'other'.\n\n"
+ITEM_TMPL = "### {i}\n{email}\n\n"
+FOOTER = "Return ONLY the JSON."
+
+def pack(items, model="", max_items=None, num_ctx=None):
+    """[(clé, texte)] → lots [[(clé, texte fenêtré)]] dont prompt + sortie tiennent dans num_ctx."""
+    max_items = max_items or BATCH or 1
+    num_ctx = num_ctx or PROFILES[PROFILE]["options"]["num_ctx"]
+    fixed = token_window.est_tokens(SYSTEM + HEADER + FOOTER, model) + token_window.MARGIN
+    batches, cur, used = [], [], fixed
+    for key, text in items:
+        t = token_window.window(text, ITEM_TOKENS, model, kind="email")
+        cost = token_window.est_tokens(ITEM_TMPL.format(i=len(cur), email=t), model) + OUT_TOKENS_PER_ITEM
+        if cur and (len(cur) >= max_items or used + cost > num_ctx):
+            batches.append(cur)
+            cur, used = [], fixed
+        cur.append((key, t))
+        used += cost
+    if cur:
+        batches.append(cur)
+    return batches
+
+def label_batch(model: str, batch):
+    """→ (labels, infos) ; labels[j] = "spam" | "other", ou None si l'email j manque / est invalide."""
+    n = len(batch)
+    prefix, prompt = compose(HEADER, "".join(ITEM_TMPL.format(i=j, email=t) for j, (_, t) in enumerate(batch)), FOOTER)
+    labels = [None] * n
+    infos = {"batch_size": n, "error": ""}
+    try:
+        resp = OLLAMA.generate(model, prompt, system=SYSTEM, profile=PROFILE, prefix=prefix,
+                               options={"num_predict": 16 + OUT_TOKENS_PER_ITEM * n},
+                               fmt=llm_schemas.fmt("spam_batch", n=n), required=llm_schemas.required("spam_batch"))
+        infos.update(cached=resp["cached"], **usage(resp), **timing(resp))
+        data = llm_schemas.parse("spam_batch", resp["response"])
+        for it in data.get("results", []):
+            try:
+                j = int(it.get("id", -1))
+            except (TypeError, ValueError):
+                continue
+            lab = str(it.get("label", "")).strip().lower()
+            if 0 <= j < n and labels[j] is None and lab in ("spam", "other"):
+                labels[j] = lab
+    except Exception as e:
+        infos["error"] = repr(e)
+    return labels, infos
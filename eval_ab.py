@@ -1,7 +1,11 @@
 # eval_ab.py
+# CACHED=exclude (défaut) | include : réponses servies par llm_cache dans la latence ou non
 import json, statistics as stats, csv, re
 from pathlib import Path
 
+import llm_cascade
+from eval_common import cached_note, latencies, report_llm
+
 def load_jsonl(p):
     out=[]
     for line in Path(p).read_text(encoding="utf-8").splitlines():
@@ -38,12 +42,38 @@ def exact_match(pred, gt):
     f1  = 2*prec*rec/(prec+rec) if (prec+rec) else 0.0
     return em, f1
 
+def field_accuracy(recs, gt):
+    """Exactitude moyenne des 4 champs texte (taux de succès sans vérité terrain)."""
+    if not gt:
+        return sum(int(r["success"]) for r in recs)/len(recs) if recs else 0.0
+    ems=[sum(em.values())/len(em) for em,_ in (exact_match(r["pred"], gt[r["id"]]) for r in recs if r["id"] in gt)]
+    return sum(ems)/len(ems) if ems else 0.0
+
 def summarize(recs, name, gt):
     n=len(recs)
-    lat=[r["latency_s"] for r in recs]
+    lat=latencies(recs) or [0.0]
     succ=[int(r["success"]) for r in recs]
     print(f"\n== {name} ==")
-    print(f"n={n} | latence moyenne={sum(lat)/n:.3f}s | médiane={stats.median(lat):.3f}s | succès={sum(succ)/n:.1%}")
+    print(f"n={n} | latence moyenne={sum(lat)/len(lat):.3f}s | médiane={stats.median(lat):.3f}s | succès={sum(succ)/n:.1%}"
+          + cached_note(recs))
+    # taille de prompt / prefill (variantes LLM, si enregistrés)
+    pr=[r for r in recs if "prompt_chars" in r]
+    if pr:
+        modes=sorted({r.get("main_text","") for r in pr})
+        pe=[r for r in pr if "prompt_eval_count" in r]
+        print(f"Prompt ({'/'.join(modes)}) : {sum(r['prompt_chars'] for r in pr)/len(pr):.0f} car."
+              + (f" | {sum(r['prompt_eval_count'] for r in pe)/len(pe):.0f} tokens | "
+                 f"prefill médian={stats.median([r['prompt_eval_s'] for r in pe]):.3f}s" if pe else ""))
+    report_llm(recs)
+    # streaming : 1er token et JSON valide (hors réponses en cache)
+    st=[r for r in recs if r.get("t_json_s") is not None]
+    if st:
+        ft=[r["ttft_s"] for r in st if r.get("ttft_s") is not None]
+        print(f"Streaming : 1er token médian={stats.median(ft) if ft else 0.0:.3f}s | "
+              f"JSON valide médian={stats.median([r['t_json_s'] for r in st]):.3f}s | "
+              f"arrêts anticipés={sum(1 for r in st if r.get('early_stop'))}/{len(st)}")
+    # LLM_CASCADE=1 : part escaladée au gros modèle, latence/exactitude gardés vs escaladés
+    llm_cascade.report(recs, lambda rs: field_accuracy(rs, gt))
     if gt:
         em_all = {"title":[], "company":[], "location":[], "salary":[]}; f1s=[]
         for r in recs:
@@ -56,11 +86,23 @@ def summarize(recs, name, gt):
             print("Exactitude : " + " | ".join([f"{k}={sum(v)/len(v):.1%}" for k,v in em_all.items()]))
             print(f"Skills F1 moyen = {sum(f1s)/len(f1s):.3f}")
 
+def tier(r):
+    # anciens enregistrements : source="meta" ou rien (visite navigateur)
+    return r.get("tier") or ("meta" if r.get("source") == "meta" else "browser")
+
 def main():
-    A=load_jsonl("results/results_rpa.jsonl")
+    rows=load_jsonl("results/results_rpa.jsonl")
+    # A_RPA = visites navigateur seulement ; les autres voies ont leurs propres mesures
+    A=[r for r in rows if tier(r) == "browser"]
+    meta=[r for r in rows if tier(r) == "meta"]       # RPA_META=1 : jamais visitées
+    fast=[r for r in rows if tier(r) == "jsonld"]     # jsonld_fast.py : HTTP + JSON-LD, sans navigateur
+    if meta:
+        print(f"(A_RPA_META : {len(meta)} URL(s) non visitées, exclues de A_RPA)")
     B=load_jsonl("results/results_llm.jsonl")
     gt=load_gt()
     summarize(A, "A_RPA", gt)
+    if fast:
+        summarize(fast, "A_RPA_JSONLD", gt)
     summarize(B, "B_LLM", gt)
 
 if __name__=="__main__":
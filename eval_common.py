@@ -0,0 +1,32 @@
+# eval_common.py — lignes de bilan communes aux évaluations (eval_ab, eval_email_ab, eval_invoice_ab)
+# CACHED=exclude (défaut) | include : réponses servies par llm_cache dans la latence ou non
+import os
+from statistics import median
+
+CACHED = os.getenv("CACHED", "exclude")
+
+def latencies(recs, ok_only=False) -> list:
+    """Latences prises en compte (réponses en cache exclues sauf CACHED=include)."""
+    return [r.get("latency_s", 0.0) for r in recs
+            if (CACHED == "include" or not r.get("cached")) and (not ok_only or r.get("success", True))]
+
+def cached_note(recs) -> str:
+    """Suffixe de la ligne de latence : nombre de réponses servies par llm_cache."""
+    n = sum(1 for r in recs if r.get("cached"))
+    if not n:
+        return ""
+    return f" | en cache={n} ({'inclus' if CACHED == 'include' else 'exclus'} de la latence)"
+
+def report_llm(recs):
+    """Tokens générés par item (comparer LLM_SCHEMA=0 et 1) et latence médiane par num_ctx choisi
+    avec le temps de (re)chargement du modèle (dimensionnement adaptatif, LLM_ADAPT)."""
+    ev = [r["eval_count"] for r in recs if r.get("eval_count")]
+    if ev:
+        print(f"Sortie : {sum(ev)/len(ev):.1f} tokens générés/item (médiane={median(ev):.0f})")
+    by_ctx = {}
+    for r in recs:
+        if r.get("num_ctx") and not r.get("cached"):
+            by_ctx.setdefault(r["num_ctx"], []).append(r["latency_s"])
+    if by_ctx:
+        print("num_ctx : " + " | ".join(f"{c}→{len(v)} items, médiane={median(v):.3f}s" for c, v in sorted(by_ctx.items()))
+              + f" | chargements={sum(1 for r in recs if r.get('load_s', 0) > 1)} ({sum(r.get('load_s', 0) for r in recs):.1f}s)")
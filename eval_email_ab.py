@@ -1,8 +1,12 @@
 # eval_email_ab.py
+# CACHED=exclude (défaut) | include : réponses servies par llm_cache dans la latence ou non
 import json
 from pathlib import Path
 from statistics import median
 
+import llm_cascade
+from eval_common import cached_note, latencies, report_llm
+
 LABELS = ["spam","other"]
 
 def load_jsonl(p: Path):
@@ -11,10 +15,10 @@ def load_jsonl(p: Path):
 
 def metrics(recs):
     n=len(recs)
-    lat=[r["latency_s"] for r in recs] if n else []
+    lat=latencies(recs)
     succ=[int(r["success"]) for r in recs] if n else []
-    mean = sum(lat)/n if n else 0.0
-    med  = median(lat) if n else 0.0
+    mean = sum(lat)/len(lat) if lat else 0.0
+    med  = median(lat) if lat else 0.0
     ok   = sum(succ)/n if n else 0.0
     return n, mean, med, ok
 
@@ -29,7 +33,6 @@ def eval_cls(recs):
     if n==0: return 0.0, 0.0
     acc = sum(int(a==b) for a,b in zip(y_true,y_pred))/n
     # macro F1 binaire
-    from collections import Counter
     conf = {lab:{lab2:0 for lab2 in LABELS} for lab in LABELS}
     for t,p in zip(y_true,y_pred):
         conf[t][p]+=1
@@ -49,8 +52,12 @@ def show(name, recs):
     n, mean, med, ok = metrics(recs)
     acc, mf1 = eval_cls(recs)
     print(f"\n== {name} ==\n"
-          f"n={n} | latence moyenne={mean:.3f}s | médiane={med:.3f}s | succès={ok:.1%}\n"
+          f"n={n} | latence moyenne={mean:.3f}s | médiane={med:.3f}s | succès={ok:.1%}"
+          + cached_note(recs) + "\n"
           f"Accuracy={acc:.1%} | Macro-F1={mf1:.3f}")
+    report_llm(recs)
+    # LLM_CASCADE=1 : part escaladée au gros modèle, latence/accuracy gardés vs escaladés
+    llm_cascade.report(recs, lambda rs: eval_cls(rs)[0])
 
 # ajoute en bas dans main()
 def main():
@@ -3,8 +3,12 @@ import os, json, re, datetime
 from pathlib import Path
 from statistics import median
 
+import llm_cascade
+from eval_common import cached_note, latencies, report_llm
+
 # Ground truth : par défaut items.jsonl ; override possible avec env GT=path
 GT_PATH = Path(os.getenv("GT", "data/fatura_subset/items.jsonl"))
+# CACHED=exclude (défaut) | include : réponses servies par llm_cache dans la latence ou non (eval_common)
 A_PATH  = Path("results_invoice/rules.jsonl")        # A_RULES_INV
 B_PATH  = Path("results_invoice/llm.jsonl")          # B_LLM_INV
 C_PATH  = Path("results_invoice/llm_select.jsonl")   # C_LLM_SELECT
@@ -77,7 +81,7 @@ def compare(pred: dict, gt: dict) -> dict:
     }
 
 def metrics(rows, gtmap):
-    lat=[r.get("latency_s",0.0) for r in rows if r.get("success", True)]
+    lat=latencies(rows, ok_only=True)
     mean = sum(lat)/len(lat) if lat else 0.0
     med  = median(lat) if lat else 0.0
     per_field = {f:0 for f in FIELDS}; n=0; all_ok=0
@@ -99,9 +103,13 @@ def show(name, rows, gt):
         return
     n, mean, med, per_field, exact = metrics(rows, gt)
     print(f"\n== {name} ==\n"
-          f"n={n} | latence moyenne={mean:.3f}s | médiane={med:.3f}s\n"
+          f"n={n} | latence moyenne={mean:.3f}s | médiane={med:.3f}s"
+          + cached_note(rows) + "\n"
           + "\n".join([f"- {k}: {v:.2%}" for k,v in per_field.items()]) +
           f"\n→ Exact-match (tous champs): {exact:.2%}")
+    report_llm(rows)
+    # LLM_CASCADE=1 : part escaladée au gros modèle, latence/exact-match gardés vs escaladés
+    llm_cascade.report(rows, lambda rs: metrics(rs, gt)[4])
 
 def main():
     print(f"GT utilisée : {GT_PATH}")
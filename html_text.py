@@ -0,0 +1,273 @@
+# html_text.py — texte principal d'une page HTML (backend de parsing interchangeable)
+# Backends : "selectolax" (défaut si installé), "lxml" (bs4 + lxml), "html.parser" (bs4 pur Python).
+# Variable d'environnement HTML_PARSER pour forcer un backend.
+import os, re
+
+from bs4 import BeautifulSoup
+from bs4.element import CData, NavigableString
+
+try:
+    import lxml  # noqa: F401
+    _HAS_LXML = True
+except ImportError:
+    _HAS_LXML = False
+
+try:  # lexbor (selectolax >= 0.3), sinon l'ancien backend modest
+    from selectolax.lexbor import LexborHTMLParser as _SlxParser
+except ImportError:
+    try:
+        from selectolax.parser import HTMLParser as _SlxParser
+    except ImportError:
+        _SlxParser = None
+
+BACKEND = os.getenv("HTML_PARSER", "selectolax" if _SlxParser else ("lxml" if _HAS_LXML else "html.parser"))
+
+SELECTORS = ["[data-testid='job-description']", "article", "[role='main']",
+             "main", "[class*='description']"]
+MIN_CHARS = 200
+DROP_TAGS = ["script", "style", "noscript"]
+
+def _outermost(nodes, key, parent):
+    """Garde les nœuds sans ancêtre candidat, dans l'ordre d'origine.
+    Le texte d'un ancêtre contient celui de ses descendants : le plus long candidat
+    est forcément un nœud « externe », inutile d'extraire le texte des autres."""
+    ids = {key(n) for n in nodes}
+    out, seen = [], set()
+    for n in nodes:
+        k = key(n)
+        if k in seen:
+            continue
+        seen.add(k)
+        p = parent(n)
+        while p is not None and key(p) not in ids:
+            p = parent(p)
+        if p is None:
+            out.append(n)
+    return out
+
+def _bs4_text(html, parser):
+    soup = BeautifulSoup(html, parser)
+    for t in soup(DROP_TAGS):
+        t.extract()
+    nodes = [n for sel in SELECTORS for n in soup.select(sel)]
+    best = ""
+    for n in _outermost(nodes, id, lambda x: x.parent):
+        txt = n.get_text(separator="\n", strip=True)
+        if len(txt) > MIN_CHARS and len(txt) > len(best):
+            best = txt
+    return best or soup.get_text(separator="\n")
+
+def _slx_strip_text(node) -> str:
+    """Équivalent de get_text(separator="\n", strip=True) : nœuds texte nettoyés, vides ignorés.
+    (node.text(strip=True) garde des morceaux vides : des "\n\n" gonflent la longueur des blocs
+    de lignes courtes et faussent le choix du candidat.)"""
+    parts = (t.text_content.strip() for t in node.traverse(include_text=True) if t.tag == "-text")
+    return "\n".join(p for p in parts if p)
+
+def _selectolax_text(html):
+    tree = _SlxParser(html)
+    tree.strip_tags(DROP_TAGS)
+    nodes = [n for sel in SELECTORS for n in tree.css(sel)]
+    best = ""
+    for n in _outermost(nodes, lambda x: x.mem_id, lambda x: x.parent):
+        txt = _slx_strip_text(n)
+        if len(txt) > MIN_CHARS and len(txt) > len(best):
+            best = txt
+    if best:
+        return best
+    return tree.root.text(separator="\n") if tree.root else ""     # <head> compris, comme soup.get_text
+
+def extract_main_text(html, backend=None) -> str:
+    """Plus long bloc candidat (> MIN_CHARS) ou texte complet, en une passe d'extraction."""
+    backend = backend or BACKEND
+    if backend == "selectolax" and _SlxParser is not None:
+        return _selectolax_text(html)
+    if backend == "lxml" and not _HAS_LXML:
+        backend = "html.parser"
+    return _bs4_text(html, "lxml" if backend == "lxml" else "html.parser")
+
+def legacy_main_text(html) -> str:
+    """Ancien algorithme (get_text sur chaque candidat, y compris imbriqués) — référence du bench."""
+    soup = BeautifulSoup(html, "html.parser")
+    for t in soup(DROP_TAGS):
+        t.extract()
+    candidates = []
+    for sel in SELECTORS:
+        for n in soup.select(sel):
+            txt = n.get_text(separator="\n", strip=True)
+            if txt and len(txt) > MIN_CHARS:
+                candidates.append(txt)
+    return max(candidates, key=len) if candidates else soup.get_text(separator="\n")
+
+def available_backends():
+    return ["html.parser"] + (["lxml"] if _HAS_LXML else []) + (["selectolax"] if _SlxParser else [])
+
+# ========= EXTRACTION PAR DENSITÉ (type readability) =========
+# Score des blocs : longueur de texte × (1 - densité de liens), pondéré par les indices
+# class/id ; on garde le meilleur conteneur puis on en retire les sous-blocs parasites.
+
+BLOCK_TAGS = ["p", "li", "td", "pre", "blockquote", "h1", "h2", "h3", "h4", "dd"]
+NEG_HINTS = re.compile(r"nav|menu|footer|header|cookie|consent|banner|share|social|related|similar|"
+                       r"recommend|sidebar|aside|breadcrumb|newsletter|promo|modal|popup|login|signup", re.I)
+POS_HINTS = re.compile(r"description|job|offer|offre|content|article|body|main|post|details", re.I)
+BOILER_TAGS = ["nav", "footer", "header", "aside", "form", "button", "svg", "iframe"]
+MIN_BLOCK_CHARS = 25
+
+def _hint_weight(attrs: str) -> float:
+    w = 0.0
+    if NEG_HINTS.search(attrs): w -= 25
+    if POS_HINTS.search(attrs): w += 25
+    return w
+
+# Accès à l'arbre par backend (même algorithme de densité au-dessus) :
+# parse (sans DROP_TAGS/BOILER_TAGS) → racine, parcours préfixe, nom de balise, texte d'un nœud
+# texte (None sinon), id/class/data-testid, texte final, suppression d'un sous-arbre
+class _Bs4Dom:
+    TEXT_TYPES = (NavigableString, CData)    # comme get_text : ni commentaires ni doctype
+
+    def __init__(self, html, parser):
+        self.root = BeautifulSoup(html, parser)
+        for t in self.root(DROP_TAGS + BOILER_TAGS):
+            t.decompose()
+    key = staticmethod(id)
+    def walk(self, n):
+        yield n
+        yield from n.descendants
+    def parent(self, n):
+        p = n.parent
+        return None if p is None or p.name == "[document]" else p
+    def tag(self, n):
+        return n.name
+    def string(self, n):
+        return str(n) if type(n) in self.TEXT_TYPES else None
+    def attrs(self, n):
+        return " ".join([n.get("id") or ""] + list(n.get("class") or []) + [n.get("data-testid") or ""])
+    def text(self, n):
+        return n.get_text(separator="\n", strip=True)
+    def decompose(self, n):
+        n.decompose()
+
+class _SlxDom:
+    def __init__(self, html):
+        tree = _SlxParser(html)
+        tree.strip_tags(DROP_TAGS)
+        for n in tree.css(",".join(BOILER_TAGS)):
+            n.decompose()
+        self.root = tree.root
+    key = staticmethod(lambda n: n.mem_id)
+    def walk(self, n):
+        return n.traverse(include_text=True) if n is not None else ()
+    def parent(self, n):
+        p = n.parent
+        return None if p is None or p.tag == "-document" else p
+    def tag(self, n):
+        return None if n.tag.startswith("-") else n.tag
+    def string(self, n):
+        return n.text_content if n.tag == "-text" else None
+    def attrs(self, n):
+        a = n.attributes
+        return " ".join([a.get("id") or "", a.get("class") or "", a.get("data-testid") or ""])
+    def text(self, n):
+        return _slx_strip_text(n)
+    def decompose(self, n):
+        n.decompose()
+
+def _dom(html, backend):
+    if backend == "selectolax" and _SlxParser is not None:
+        return _SlxDom(html)
+    return _Bs4Dom(html, "lxml" if backend in ("lxml", "selectolax") and _HAS_LXML else "html.parser")
+
+def _measure(dom):
+    """Une passe ascendante → par élément [car. (get_text(strip=True)), morceaux non vides,
+    virgules, car. des liens descendants] : plus de get_text / find_all("a") répétés par ancêtre."""
+    stats = {}
+    nodes = list(dom.walk(dom.root))
+    for n in reversed(nodes):              # préfixe inversé : descendants avant leur ancêtre
+        s = dom.string(n)
+        if s is not None:
+            s = s.strip()
+            own = [len(s), int(bool(s)), s.count(","), 0]
+        elif dom.tag(n) is None:
+            continue
+        else:
+            own = stats.setdefault(dom.key(n), [0, 0, 0, 0])
+        p = dom.parent(n)
+        if p is None:
+            continue
+        acc = stats.setdefault(dom.key(p), [0, 0, 0, 0])
+        acc[0] += own[0]; acc[1] += own[1]; acc[2] += own[2]
+        acc[3] += own[3] + (own[0] if dom.tag(n) == "a" else 0)
+    return nodes, stats
+
+def density_main_text(html, backend=None) -> str:
+    """Cœur de page par score de densité ; retombe sur extract_main_text si rien ne se dégage.
+    Backend HTML_PARSER (selectolax, lxml ou html.parser), longueurs calculées une seule fois."""
+    backend = backend or BACKEND
+    dom = _dom(html, backend)
+    nodes, stats = _measure(dom)
+
+    def density(k, text_len):
+        return min(1.0, stats[k][3] / text_len) if text_len else 1.0
+
+    scores, by_key = {}, {}
+    for blk in nodes:
+        if dom.tag(blk) not in BLOCK_TAGS:
+            continue
+        k = dom.key(blk)
+        chars, parts, commas, _ = stats.get(k, (0, 0, 0, 0))
+        txt_len = chars + max(parts - 1, 0)        # get_text(" ", strip=True)
+        if txt_len < MIN_BLOCK_CHARS:
+            continue
+        s = 1 + commas + min(txt_len // 100, 3)
+        s *= 1 - density(k, txt_len)
+        # le bloc nourrit son parent (100%) et son grand-parent (50%)
+        parent = dom.parent(blk)
+        for depth, anc in enumerate([parent, dom.parent(parent) if parent is not None else None]):
+            if anc is None:
+                continue
+            ka = dom.key(anc)
+            if ka not in by_key:
+                by_key[ka] = anc
+                scores[ka] = _hint_weight(dom.attrs(anc))
+            scores[ka] += s / (1 + depth)
+
+    if not scores:
+        return extract_main_text(html, backend)
+    kb = max(scores, key=lambda k: scores[k] * (1 - density(k, stats[k][0])))
+    best = by_key[kb]
+
+    # nettoyage interne : sous-blocs à forte densité de liens ou indices négatifs
+    # (décision sur les longueurs d'origine ; seuls les plus externes sont supprimés)
+    drop = []
+    for sub in dom.walk(best):
+        k = dom.key(sub)
+        if dom.tag(sub) not in ("div", "section", "ul", "ol", "table") or k == kb:
+            continue
+        txt_len = stats.get(k, (0,))[0]
+        if _hint_weight(dom.attrs(sub)) < 0 or (txt_len and density(k, txt_len) > 0.5):
+            drop.append(sub)
+    for sub in _outermost(drop, dom.key, dom.parent):
+        dom.decompose(sub)
+    text = dom.text(best)
+    return text if len(text) > MIN_CHARS else extract_main_text(html, backend)
+
+# Texte brut (cache Playwright) : pas de balises, on coupe sur des marqueurs de fin
+# et on retire les lignes courtes de navigation / cookies.
+TAIL_MARKERS = re.compile(r"^(offres similaires|ces offres pourraient|vous aimerez aussi|similar jobs|"
+                          r"other jobs|d'autres offres|voir toutes les offres|à propos de nous)\b", re.I)
+NOISE_LINE = re.compile(r"cookie|consentement|accepter|tout refuser|se connecter|s'inscrire|"
+                        r"log in|sign up|newsletter|partager|share|©|mentions légales|politique de confidentialité", re.I)
+
+def trim_text(text: str) -> str:
+    """Version texte brut : coupe après les listes « offres similaires » et retire le bruit."""
+    out = []
+    for ln in text.splitlines():
+        s = ln.strip()
+        if not s:
+            continue
+        if TAIL_MARKERS.search(s) and len(out) > 5:
+            break
+        if len(s) < 80 and NOISE_LINE.search(s):
+            continue
+        out.append(s)
+    return "\n".join(out)
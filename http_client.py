@@ -0,0 +1,167 @@
+# http_client.py — client HTTP partagé : keep-alive, décompression, limites par hôte, retries
+# Utilisé par llm_runner (html_to_text), jsonld_fast et build_urls_wttj (mode api).
+#
+# Auto-contrôle contre un serveur HTTP local (gzip/deflate/br, retry sur 503, une seule connexion
+# réutilisée en séquentiel, au plus PER_HOST requêtes simultanées par hôte) :
+#   python http_client.py --selftest
+import sys, threading, time
+from collections import defaultdict
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:  # urllib3 ne décode le brotli que si l'un de ces paquets est installé
+    import brotli as _brotli
+except ImportError:
+    try:
+        import brotlicffi as _brotli
+    except ImportError:
+        _brotli = None
+
+UA = ("Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+      "(KHTML, like Gecko) Chrome/124.0 Safari/537.36")
+# on n'annonce que ce qu'on sait décoder
+ACCEPT_ENCODING = "gzip, deflate, br" if _brotli else "gzip, deflate"
+HEADERS = {
+    "User-Agent": UA,
+    "Accept": "text/html,application/xhtml+xml",
+    "Accept-Language": "fr-FR,fr;q=0.9,en;q=0.8",
+    "Accept-Encoding": ACCEPT_ENCODING,
+}
+
+CONNECT_TIMEOUT_S = 5
+READ_TIMEOUT_S    = 12
+RETRIES           = 2          # sur erreurs de connexion et 429/5xx (méthodes idempotentes seulement)
+BACKOFF_S         = 0.5        # 0.5s, 1s, 2s...
+POOL_SIZE         = 16         # connexions keep-alive par hôte
+PER_HOST          = 4          # requêtes simultanées max par hôte
+
+class HttpClient:
+    def __init__(self, timeout=(CONNECT_TIMEOUT_S, READ_TIMEOUT_S), retries=RETRIES,
+                 backoff=BACKOFF_S, pool_size=POOL_SIZE, per_host=PER_HOST, headers=None):
+        self.timeout = timeout
+        self.per_host = per_host
+        self.session = requests.Session()
+        self.session.headers.update(headers or HEADERS)
+        retry = Retry(total=retries, connect=retries, read=retries, backoff_factor=backoff,
+                      status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=Retry.DEFAULT_ALLOWED_METHODS, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._sems = defaultdict(lambda: threading.BoundedSemaphore(self.per_host))
+        self._lock = threading.Lock()
+
+    def _sem(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            return self._sems[host]
+
+    def request(self, method, url, timeout=None, **kw) -> requests.Response:
+        with self._sem(url):
+            return self.session.request(method, url, timeout=timeout or self.timeout, **kw)
+
+    def get(self, url, **kw) -> requests.Response:
+        return self.request("GET", url, **kw)
+
+    def post(self, url, **kw) -> requests.Response:
+        return self.request("POST", url, **kw)
+
+    def get_bytes(self, url, **kw) -> bytes:
+        """Corps décompressé (gzip/deflate/br) ; lève HTTPError si statut >= 400."""
+        r = self.get(url, **kw)
+        r.raise_for_status()
+        return r.content
+
+    def get_text(self, url, **kw) -> str:
+        r = self.get(url, **kw)
+        r.raise_for_status()
+        return r.text
+
+    def close(self):
+        self.session.close()
+
+_DEFAULT = None
+
+def get_client() -> HttpClient:
+    """Client partagé du processus (pool de connexions commun)."""
+    global _DEFAULT
+    if _DEFAULT is None:
+        _DEFAULT = HttpClient()
+    return _DEFAULT
+
+# ========= AUTO-CONTRÔLE (serveur local) =========
+def _selftest():
+    import gzip, zlib
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    BODY = ("<html><body><main>" + "offre data analyst " * 200 + "</main></body></html>").encode("utf-8")
+    state = {"flaky": 0, "conns": set(), "inflight": 0, "max_inflight": 0}
+    lock = threading.Lock()
+
+    class H(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"   # keep-alive
+        wbufsize = 1 << 16              # en-têtes + corps en un seul envoi (pas d'attente Nagle)
+        def log_message(self, *a): pass
+        def do_GET(self):
+            state["conns"].add(self.client_address)
+            enc, body = "", BODY
+            if self.path == "/gzip":
+                enc, body = "gzip", gzip.compress(BODY)
+            elif self.path == "/deflate":
+                enc, body = "deflate", zlib.compress(BODY)
+            elif self.path == "/br" and _brotli:
+                enc, body = "br", _brotli.compress(BODY)
+            elif self.path == "/slow":
+                with lock:
+                    state["inflight"] += 1
+                    state["max_inflight"] = max(state["max_inflight"], state["inflight"])
+                time.sleep(0.05)
+                with lock:
+                    state["inflight"] -= 1
+            elif self.path == "/flaky":
+                state["flaky"] += 1
+                if state["flaky"] < 2:
+                    self.send_response(503); self.send_header("Content-Length", "0"); self.end_headers()
+                    return
+            self.send_response(200)
+            if enc: self.send_header("Content-Encoding", enc)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), H)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{srv.server_port}"
+    c = HttpClient(backoff=0.01)
+    try:
+        paths = ["/plain", "/gzip", "/deflate"] + (["/br"] if _brotli else [])
+        for p in paths:
+            assert c.get_bytes(base + p) == BODY, f"décodage {p}"
+        assert c.get_bytes(base + "/flaky") == BODY and state["flaky"] == 2, "retry 503"
+        t0 = time.perf_counter()
+        for _ in range(50):
+            c.get_bytes(base + "/gzip")
+        dt = (time.perf_counter() - t0) / 50
+        n_seq = len(paths) + 52
+        assert len(state["conns"]) == 1, f"keep-alive : {len(state['conns'])} connexions pour {n_seq} requêtes"
+        # limite par hôte : 3 x PER_HOST requêtes lancées d'un coup, jamais plus de PER_HOST en vol
+        threads = [threading.Thread(target=c.get_bytes, args=(base + "/slow",)) for _ in range(3 * c.per_host)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+        assert state["max_inflight"] == c.per_host, f"limite par hôte : {state['max_inflight']} en vol (max {c.per_host})"
+        assert len(state["conns"]) <= c.per_host, f"pool : {len(state['conns'])} connexions (max {c.per_host})"
+        print(f"✅ décodage {', '.join(p[1:] for p in paths)} | retry 503 OK | "
+              f"connexions ouvertes=1 pour {n_seq} requêtes | {dt*1000:.2f} ms/req | "
+              f"en vol max={state['max_inflight']}/{c.per_host} par hôte, {len(state['conns'])} connexions au total")
+    finally:
+        c.close(); srv.shutdown()
+
+if __name__ == "__main__":
+    if "--selftest" in sys.argv:
+        _selftest()
+    else:
+        print("Usage: python http_client.py --selftest")
@@ -1,7 +1,12 @@
 # hybrid_triage_csv.py — règles rapides + LLM sur cas suspects
-import csv, json, time, re, sys, multiprocessing
+import csv, json, time, re, sys
 from pathlib import Path
-import requests
+from ollama_client import compose, get_ollama, timing, usage
+import llm_schemas
+import token_window
+from llm_dispatch import imap_ordered, RunStats
+import email_batch
+from model_residency import resident
 
 try:
     sys.stdout.reconfigure(encoding="utf-8")
@@ -14,7 +19,7 @@ OUT = Path("results_email/results_hybrid.jsonl")
 OUT.parent.mkdir(parents=True, exist_ok=True)
 
 MODEL = "mistral"
-OLLAMA_URL = "http://localhost:11434/api/generate"
+OLLAMA = get_ollama()   # profil "email_hybrid" : num_predict 25, num_ctx 768
 
 # --- règles (mêmes patterns que rules_triage_csv.py, score = nb de hits)
 SPAM_PATTERNS = [
@@ -51,34 +56,79 @@ def rule_label(text: str) -> str:
 
 SYSTEM = (
     "You are an email spam classifier. Output ONLY valid JSON with this exact schema:\n"
-    "{\"label\":\"spam_or_other\"}\n"
+    + llm_schemas.shape("spam") + "\n"
     "Allowed labels: spam, other."
 )
-PROMPT_TMPL = (
-    "Classify this email as 'spam' or 'other'.\n"
-    "Email:\n----\n{email}\n----\n"
-    "Return ONLY the JSON."
-)
-
-def call_ollama(model: str, prompt: str):
-    payload = {
-        "model": model,
-        "prompt": prompt,
-        "system": SYSTEM,
-        "format": "json",
-        "options": {
-            "temperature": 0,
-            "num_predict": 25,
-            "num_thread": multiprocessing.cpu_count(),
-            "num_ctx": 768,
-        },
-        "stream": False,
-        "keep_alive": "5m"
-    }
-    r = requests.post(OLLAMA_URL, json=payload, timeout=(10, 30))
-    if r.status_code != 200:
-        raise RuntimeError(f"Ollama {r.status_code}: {r.text}")
-    return r.json()["response"]
+# consignes statiques (tête + rappel final) / contenu propre à l'email — cf. ollama_client.compose
+PROMPT_HEAD = "Classify this email as 'spam' or 'other'.\n"
+PROMPT_BODY = "Email:\n----\n{email}\n----\n"
+PROMPT_TAIL = "Return ONLY the JSON."
+
+def call_ollama(model: str, email: str):
+    # réponse complète : "response" + "cached" (servie par llm_cache)
+    prefix, prompt = compose(PROMPT_HEAD, PROMPT_BODY.format(email=email), PROMPT_TAIL)
+    return OLLAMA.generate(model, prompt, system=SYSTEM, profile="email_hybrid", prefix=prefix,
+                           fmt=llm_schemas.fmt("spam"), required=llm_schemas.required("spam"))
+
+def email_budget() -> int:
+    prefix, body = compose(PROMPT_HEAD, PROMPT_BODY.format(email=""), PROMPT_TAIL)
+    return token_window.budget(MODEL, "email_hybrid", SYSTEM, prefix, body, fmt=llm_schemas.fmt("spam"))
+
+def llm_label(r):
+    t0 = time.time(); success=True; err=""; pred="other"; cached=False; times={}
+    try:
+        short = token_window.window(r["text"], email_budget(), MODEL, kind="email")
+        resp = call_ollama(MODEL, short)
+        raw, cached = resp["response"], resp["cached"]
+        times = {**timing(resp), **usage(resp)}
+        data = llm_schemas.parse("spam", raw)   # schéma : label garanti (sinon échec explicite)
+        lab = str(data.get("label","other")).strip().lower()
+        pred = "spam" if lab == "spam" else "other"
+    except Exception as e:
+        success=False; err=repr(e)
+    r["llm_label"] = pred
+    r["llm_success"] = success
+    r["llm_error"] = err
+    r["llm_latency"] = round(time.time()-t0, 3)
+    r["llm_cached"] = cached
+    r["llm_timing"] = times
+    return r
+
+def llm_label_batch(batch):
+    """Un lot de suspects (email_batch.pack) ; les emails manquants dans la réponse
+    repassent par llm_label() (requête unitaire)."""
+    t0 = time.time()
+    labels, infos = email_batch.label_batch(MODEL, batch)
+    lat = round(time.time()-t0, 3)
+    n = infos["batch_size"]
+    share = round(lat / n, 3)   # latence par email (comparable au mode unitaire) ; le lot entier à part
+    times = {k: infos[k] for k in ("ttft_s", "t_json_s", "early_stop", "num_ctx", "num_predict", "load_s")
+             if k in infos}
+    times["eval_count"] = round(infos.get("eval_count", 0) / n, 1)
+    times["batch_latency_s"] = lat
+    out = []
+    for (r, _), lab in zip(batch, labels):
+        if lab is None:
+            r = llm_label(r)
+            r["llm_latency"] = round(share + r["llm_latency"], 3)   # part du lot raté + requête unitaire
+            r["llm_timing"] = {**r["llm_timing"], "batch_size": n, "batch_latency_s": lat, "fallback": True}
+        else:
+            r["llm_label"] = lab
+            r["llm_success"] = True
+            r["llm_error"] = ""
+            r["llm_latency"] = share
+            r["llm_cached"] = infos.get("cached", False)
+            r["llm_timing"] = {**times, "batch_size": n}
+        out.append(r)
+    return out
+
+def llm_phase(suspects):
+    # LLM_BATCH=N : suspects regroupés par lots (email_batch.py), sinon un par requête
+    if email_batch.BATCH > 1:
+        for rs in imap_ordered(llm_label_batch, email_batch.pack([(r, r["text"]) for r in suspects], MODEL)):
+            yield from rs
+    else:
+        yield from imap_ordered(llm_label, suspects)
 
 def run():
     rows = []
@@ -107,25 +157,13 @@ def run():
     TOP_K = min(len(suspects), max(10, N_MAX//2))  # ex: 25 max sur 50
     suspects = suspects[:TOP_K]
 
-    # 3) Appel LLM uniquement sur ces suspects (texte tronqué)
-    for r in suspects:
-        t0 = time.time(); success=True; err=""; pred="other"
-        try:
-            short = r["text"][:1500]
-            raw = call_ollama(MODEL, PROMPT_TMPL.format(email=short))
-            try:
-                data = json.loads(raw)
-            except Exception:
-                m = re.search(r"\{.*\}", raw, flags=re.S)
-                data = json.loads(m.group(0)) if m else {"label":"other"}
-            lab = str(data.get("label","other")).strip().lower()
-            pred = "spam" if lab == "spam" else "other"
-        except Exception as e:
-            success=False; err=repr(e)
-        r["llm_label"] = pred
-        r["llm_success"] = success
-        r["llm_error"] = err
-        r["llm_latency"] = round(time.time()-t0, 3)
+    # 3) Appel LLM uniquement sur ces suspects (texte tronqué), LLM_PARALLEL=K en vol
+    stats = RunStats()
+    for r in llm_phase(suspects):
+        stats.add({"latency_s": r["llm_latency"]})
+    stats.report("HYBRID-LLM")
+    if OLLAMA.cache is not None:
+        OLLAMA.cache.report()
 
     # 4) Fusion des décisions : LLM override sur suspects, sinon règles
     for r in rows:
@@ -141,15 +179,14 @@ def run():
             "success": success,
             "error": err,
             "gt": r["gt"],
-            "pred": {"label": final}
+            "pred": {"label": final},
+            "cached": r.get("llm_cached", False),
+            **r.get("llm_timing", {})
         }
         OUT.open("a", encoding="utf-8").write(json.dumps(rec, ensure_ascii=False)+"\n")
         print(f"[HYBRID] {r['id']} -> {final} (gt={r['gt']}) score={r['rule_score']} llm={'yes' if r in suspects else 'no'}")
 
 if __name__ == "__main__":
-    # pré-chauffage
-    try:
-        requests.post(OLLAMA_URL, json={"model": MODEL, "prompt": "{}", "format":"json", "stream": False}, timeout=(5,10))
-    except Exception:
-        pass
-    run()
+    # modèle chargé et confirmé avant la boucle chronométrée (temps de chargement consigné à part)
+    with resident(OLLAMA, MODEL, profile="email_batch" if email_batch.BATCH > 1 else "email_hybrid", tag="C_HYBRID"):
+        run()
@@ -1,7 +1,13 @@
 # invoices_llm.py
-import json, time, sys, multiprocessing, re
+import json, time, sys
 from pathlib import Path
-import requests
+from ollama_client import compose, get_ollama, timing, usage
+import llm_schemas
+import token_window
+import llm_cascade
+from invoice_rules import extract_rules
+from llm_dispatch import imap_ordered, RunStats
+from model_residency import resident
 
 try:
     sys.stdout.reconfigure(encoding="utf-8")
@@ -12,58 +18,70 @@ OUT = Path("results_invoice/llm.jsonl")
 OUT.parent.mkdir(parents=True, exist_ok=True)
 
 MODEL = "llama3.2:1b"
-URL = "http://localhost:11434/api/generate"
+OLLAMA = get_ollama()   # profil "invoice" : num_predict 80, num_ctx 1024
 
 SYSTEM = (
     "You extract key fields from invoices. Output ONLY valid JSON:\n"
-    "{\"invoice_no\":\"str\",\"date\":\"str\",\"vendor\":\"str\",\"total\":\"str\",\"currency\":\"str\"}\n"
-    "If unknown, use empty string. Keep numbers canonical (e.g., 1234.56)."
+    + llm_schemas.shape("invoice") + "\n"
+    "If unknown, use empty string. Keep numbers canonical (e.g., 1234.56). Currency: EUR, USD, GBP or empty."
 )
-PROMPT = "Invoice text:\n----\n{doc}\n----\nReturn ONLY the JSON."
+# contenu de la facture / rappel statique (placé en tête avec LLM_PREFIX, cf. ollama_client.compose)
+PROMPT_BODY = "Invoice text:\n----\n{doc}\n----\n"
+PROMPT_TAIL = "Return ONLY the JSON."
 
-def call_ollama(prompt):
-    payload = {
-        "model": MODEL, "prompt": prompt, "system": SYSTEM, "format":"json",
-        "options": {"temperature":0, "num_predict": 80, "num_ctx": 1024,
-                    "num_thread": multiprocessing.cpu_count()},
-        "stream": False, "keep_alive": "5m"
-    }
-    r = requests.post(URL, json=payload, timeout=(10,35))
-    if r.status_code!=200: raise RuntimeError(f"Ollama {r.status_code}: {r.text}")
-    return r.json()["response"]
+def call_ollama(doc, model=MODEL):
+    # réponse complète : "response" + "cached" (servie par llm_cache)
+    prefix, prompt = compose("", PROMPT_BODY.format(doc=doc), PROMPT_TAIL)
+    return OLLAMA.generate(model, prompt, system=SYSTEM, profile="invoice", prefix=prefix,
+                           fmt=llm_schemas.fmt("invoice"), required=llm_schemas.required("invoice"))
+
+def doc_budget(model=MODEL) -> int:
+    prefix, body = compose("", PROMPT_BODY.format(doc=""), PROMPT_TAIL)
+    return token_window.budget(model, "invoice", SYSTEM, prefix, body, fmt=llm_schemas.fmt("invoice"))
+
+def window(obj, model=MODEL):
+    # fenêtre en tokens : lignes total / facture / date / montants d'abord (le total est souvent en bas)
+    return token_window.window(obj["text"], doc_budget(model), model, kind="invoice")
 
-def force_json(s):
-    try: return json.loads(s)
-    except: m = re.search(r"\{.*\}", s, flags=re.S); return json.loads(m.group(0)) if m else {}
+def extract(obj):
+    rule = extract_rules(obj["text"]) if llm_cascade.ENABLED else None   # hors chronométrage, comme A_RULES_INV
+    t0 = time.time(); success=True; err=""; pred={}; cached=False; times={}
+    try:
+        # LLM_CASCADE=1 : petit modèle d'abord, gros modèle si peu sûr ou en désaccord avec invoice_rules
+        resp = llm_cascade.generate("invoice", lambda m: call_ollama(window(obj, m), m), MODEL, rule=rule)
+        raw, cached = resp["response"], resp["cached"]
+        times = {**timing(resp), **usage(resp), **llm_cascade.info(resp)}
+        data = llm_schemas.parse("invoice", raw)
+        pred = {
+            "invoice_no": data.get("invoice_no","") or "",
+            "date": data.get("date","") or "",
+            "vendor": data.get("vendor","") or "",
+            "total": data.get("total","") or "",
+            "currency": data.get("currency","") or "",
+        }
+    except Exception as e:
+        success=False; err=repr(e); pred={"invoice_no":"","date":"","vendor":"","total":"","currency":""}
+    return {
+        "id": obj["id"], "variant":"B_LLM_INV",
+        "latency_s": round(time.time()-t0,3), "success": success, "error": err, "pred": pred,
+        "cached": cached, **times
+    }
 
 def main():
     OUT.write_text("", encoding="utf-8")
-    for line in IN.read_text(encoding="utf-8").splitlines():
-        obj = json.loads(line)
-        doc = obj["text"][:6000]
-        t0 = time.time(); success=True; err=""; pred={}
-        try:
-            raw = call_ollama(PROMPT.format(doc=doc))
-            data = force_json(raw)
-            pred = {
-                "invoice_no": data.get("invoice_no","") or "",
-                "date": data.get("date","") or "",
-                "vendor": data.get("vendor","") or "",
-                "total": data.get("total","") or "",
-                "currency": data.get("currency","") or "",
-            }
-        except Exception as e:
-            success=False; err=repr(e); pred={"invoice_no":"","date":"","vendor":"","total":"","currency":""}
-        rec = {
-            "id": obj["id"], "variant":"B_LLM_INV",
-            "latency_s": round(time.time()-t0,3), "success": success, "error": err, "pred": pred
-        }
+    objs = [json.loads(line) for line in IN.read_text(encoding="utf-8").splitlines()]
+    stats = RunStats()
+    for rec in imap_ordered(extract, objs):   # LLM_PARALLEL=K, ordre conservé
+        stats.add(rec)
         OUT.open("a", encoding="utf-8").write(json.dumps(rec, ensure_ascii=False)+"\n")
-        print(f"[LLM] {obj['id']} -> {pred} err={err}")
+        print(f"[LLM] {rec['id']} -> {rec['pred']} err={rec['error']}")
+    stats.report("LLM")
+    if OLLAMA.cache is not None:
+        OLLAMA.cache.report()
     print(f"✅ Résultats: {OUT}")
 
 if __name__ == "__main__":
-    try: requests.post(URL, json={"model":MODEL,"prompt":"{}","format":"json","stream":False}, timeout=(5,10))
-    except: pass
-    main()
+    # modèle chargé et confirmé avant la boucle chronométrée (temps de chargement consigné à part)
+    with resident(OLLAMA, llm_cascade.models(MODEL), profile="invoice", tag="B_LLM_INV"):
+        main()
 
@@ -1,7 +1,12 @@
 # invoices_llm_select.py — LLM choisit parmi des candidats extraits par règles
-import json, re, time, sys, multiprocessing
+import json, re, time, sys
 from pathlib import Path
-import requests
+from ollama_client import compose, get_ollama, timing, usage
+import llm_schemas
+import llm_cascade
+from invoice_rules import extract_rules
+from llm_dispatch import imap_ordered, RunStats
+from model_residency import resident
 
 try:
     sys.stdout.reconfigure(encoding="utf-8")
@@ -12,7 +17,7 @@ OUT = Path("results_invoice/llm_select.jsonl")
 OUT.parent.mkdir(parents=True, exist_ok=True)
 
 MODEL = "llama3.2:1b"  # léger & rapide en CPU
-URL   = "http://localhost:11434/api/generate"
+OLLAMA = get_ollama()  # profil "invoice_select" : num_predict 50, num_ctx 768
 
 CUR_PAT = r"(€|eur|euro|\$|usd|£|gbp)"
 AMT_PAT = r"(?<!\w)(\d{1,3}(?:[ .,\u00A0]\d{3})*(?:[.,]\d{2})?)(?!\w)"
@@ -95,92 +100,101 @@ def extract_candidates(text):
 SYSTEM = (
     "You must choose the correct fields of an invoice by selecting indices from candidate lists.\n"
     "Return ONLY valid JSON with this schema:\n"
-    "{\"vendor_idx\":int, \"invoice_idx\":int, \"date_idx\":int, \"amount_idx\":int, \"currency\":\"\"}\n"
+    + llm_schemas.shape("select") + "\n"
     "- Indices are 0-based. Use -1 if none applies.\n"
     "- currency must be one of: \"\", \"EUR\", \"USD\", \"GBP\".\n"
     "- Prefer the grand total (Amount Due / Total TTC) over subtotals or line items."
 )
 
-PROMPT_TMPL = (
-    "Pick the best indices from the candidate lists below.\n\n"
+# consignes statiques (tête + rappel final) / listes propres à la facture — cf. ollama_client.compose
+PROMPT_HEAD = "Pick the best indices from the candidate lists below.\n\n"
+PROMPT_TAIL = "Return ONLY the JSON."
+PROMPT_BODY = (
     "VENDORS:\n{vendors}\n\n"
     "INVOICE_NUMBERS:\n{invoices}\n\n"
     "DATES:\n{dates}\n\n"
     "AMOUNTS (value ~ currency ~ context line):\n{amounts}\n\n"
-    "Return ONLY the JSON."
 )
 
-def call_ollama(prompt):
-    payload = {
-        "model": MODEL, "prompt": prompt, "system": SYSTEM, "format":"json",
-        "options": {"temperature":0, "num_predict": 50, "num_ctx": 768,
-                    "num_thread": multiprocessing.cpu_count()},
-        "stream": False, "keep_alive": "5m"
-    }
-    r = requests.post(URL, json=payload, timeout=(10, 35))
-    if r.status_code != 200:
-        raise RuntimeError(f"Ollama {r.status_code}: {r.text}")
-    return r.json()["response"]
+def call_ollama(lists, sizes, model=MODEL):
+    # réponse complète : "response" + "cached" (servie par llm_cache)
+    # schéma : chaque indice limité à -1..len(candidats)-1
+    prefix, prompt = compose(PROMPT_HEAD, lists, PROMPT_TAIL)
+    return OLLAMA.generate(model, prompt, system=SYSTEM, profile="invoice_select", prefix=prefix,
+                           fmt=llm_schemas.fmt("select", **sizes), required=llm_schemas.required("select"))
+
+def pick(data, cands):
+    """Indices choisis (sortie parsée) → valeurs finales."""
+    vendor_cands, inv_cands, date_cands, amt_cands = cands
+    v_idx = int(data.get("vendor_idx",-1))
+    i_idx = int(data.get("invoice_idx",-1))
+    d_idx = int(data.get("date_idx",-1))
+    a_idx = int(data.get("amount_idx",-1))
+    cur   = (data.get("currency","") or "").upper()
+    vendor = vendor_cands[v_idx] if 0 <= v_idx < len(vendor_cands) else ""
+    invoice_no = inv_cands[i_idx] if 0 <= i_idx < len(inv_cands) else ""
+    date = date_cands[d_idx] if 0 <= d_idx < len(date_cands) else ""
+    if 0 <= a_idx < len(amt_cands):
+        total_val, total_cur, _ = amt_cands[a_idx]
+        total = f"{total_val:.2f}"
+        currency = cur or total_cur
+    else:
+        total=""; currency=cur
+    return {"invoice_no": invoice_no, "date": date, "vendor": vendor, "total": total, "currency": currency}
+
+def select_one(obj):
+    text = obj["text"]
+    vendor_cands, inv_cands, date_cands, amt_cands = extract_candidates(text)
+
+    def fmt_list(lst): 
+        return "\n".join([f"[{i}] {x}" for i,x in enumerate(lst)])
+    def fmt_amts(lst):
+        return "\n".join([f"[{i}] {v:.2f} ~ {c or ''} ~ {ln[:120]}" for i,(v,c,ln) in enumerate(lst)])
+
+    lists = PROMPT_BODY.format(
+        vendors = fmt_list(vendor_cands),
+        invoices= fmt_list(inv_cands),
+        dates   = fmt_list(date_cands),
+        amounts = fmt_amts(amt_cands),
+    )
+    cands = (vendor_cands, inv_cands, date_cands, amt_cands)
+    rule = extract_rules(text) if llm_cascade.ENABLED else None
+    t0=time.time(); success=True; err=""; pred={}; cached=False; times={}
 
-def force_json(s):
-    try: return json.loads(s)
-    except: 
-        m = re.search(r"\{.*\}", s, flags=re.S)
-        return json.loads(m.group(0)) if m else {}
+    try:
+        sizes = {"v": len(vendor_cands), "i": len(inv_cands), "d": len(date_cands), "a": len(amt_cands)}
+        # LLM_CASCADE=1 : petit modèle d'abord, gros modèle si peu sûr ou en désaccord avec invoice_rules
+        resp = llm_cascade.generate("select", lambda m: call_ollama(lists, sizes, m), MODEL,
+                                    rule=rule, to_pred=lambda data: pick(data, cands))
+        raw, cached = resp["response"], resp["cached"]
+        times = {**timing(resp), **usage(resp), **llm_cascade.info(resp)}
+        pred = pick(llm_schemas.parse("select", raw), cands)
+    except Exception as e:
+        success=False; err=repr(e)
+        pred = pick({}, cands)
+
+    rec = {
+        "id": obj["id"], "variant":"C_LLM_SELECT",
+        "latency_s": round(time.time()-t0,3), "success": success, "error": err,
+        "pred": pred,
+        "cached": cached, **times
+    }
+    return rec
 
 def run():
     OUT.write_text("", encoding="utf-8")
-    for line in IN.read_text(encoding="utf-8").splitlines():
-        obj = json.loads(line); text = obj["text"]
-        vendor_cands, inv_cands, date_cands, amt_cands = extract_candidates(text)
-
-        def fmt_list(lst): 
-            return "\n".join([f"[{i}] {x}" for i,x in enumerate(lst)])
-        def fmt_amts(lst):
-            return "\n".join([f"[{i}] {v:.2f} ~ {c or ''} ~ {ln[:120]}" for i,(v,c,ln) in enumerate(lst)])
-
-        prompt = PROMPT_TMPL.format(
-            vendors = fmt_list(vendor_cands),
-            invoices= fmt_list(inv_cands),
-            dates   = fmt_list(date_cands),
-            amounts = fmt_amts(amt_cands),
-        )
-        t0=time.time(); success=True; err=""; pred={}
-
-        try:
-            raw = call_ollama(prompt)
-            data = force_json(raw)
-            v_idx = int(data.get("vendor_idx",-1))
-            i_idx = int(data.get("invoice_idx",-1))
-            d_idx = int(data.get("date_idx",-1))
-            a_idx = int(data.get("amount_idx",-1))
-            cur   = (data.get("currency","") or "").upper()
-        except Exception as e:
-            success=False; err=repr(e)
-            v_idx=i_idx=d_idx=a_idx=-1; cur=""
-
-        # map vers valeurs finales
-        vendor = vendor_cands[v_idx] if 0 <= v_idx < len(vendor_cands) else ""
-        invoice_no = inv_cands[i_idx] if 0 <= i_idx < len(inv_cands) else ""
-        date = date_cands[d_idx] if 0 <= d_idx < len(date_cands) else ""
-        if 0 <= a_idx < len(amt_cands):
-            total_val, total_cur, _ = amt_cands[a_idx]
-            total = f"{total_val:.2f}"
-            currency = cur or total_cur
-        else:
-            total=""; currency=cur
-
-        rec = {
-            "id": obj["id"], "variant":"C_LLM_SELECT",
-            "latency_s": round(time.time()-t0,3), "success": success, "error": err,
-            "pred": {"invoice_no": invoice_no, "date": date, "vendor": vendor, "total": total, "currency": currency}
-        }
+    objs = [json.loads(line) for line in IN.read_text(encoding="utf-8").splitlines()]
+    stats = RunStats()
+    for rec in imap_ordered(select_one, objs):   # LLM_PARALLEL=K, ordre conservé
+        stats.add(rec)
         OUT.open("a", encoding="utf-8").write(json.dumps(rec, ensure_ascii=False)+"\n")
-        print(f"[LLM_SELECT] {obj['id']} -> {rec['pred']} err={err}")
+        print(f"[LLM_SELECT] {rec['id']} -> {rec['pred']} err={rec['error']}")
+    stats.report("LLM_SELECT")
+    if OLLAMA.cache is not None:
+        OLLAMA.cache.report()
 
 if __name__ == "__main__":
-    # chauffe
-    try: requests.post(URL, json={"model":MODEL,"prompt":"{}","format":"json","stream":False}, timeout=(5,10))
-    except: pass
-    run()
+    # modèle chargé et confirmé avant la boucle chronométrée (temps de chargement consigné à part)
+    with resident(OLLAMA, llm_cascade.models(MODEL), profile="invoice_select", tag="C_LLM_SELECT"):
+        run()
 
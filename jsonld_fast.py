@@ -0,0 +1,179 @@
+# jsonld_fast.py — voie rapide sans navigateur : données structurées schema.org JobPosting
+# HTML brut en HTTP → JSON-LD → même `pred` que rpa_runner ; Playwright seulement si champs manquants.
+# Enregistrements : variant A_RPA_JSONLD / tier "jsonld" (les visites navigateur restent A_RPA / "browser"),
+# mesurés à part dans eval_ab pour ne pas mêler des parses HTTP de quelques ms aux latences du RPA.
+# Usage:
+#   python jsonld_fast.py [data/urls.txt]
+# SNAPSHOT=record|replay (cf. snapshots.py) : HTML enregistré / rejoué comme pour llm_runner et le RPA.
+import html, json, re, sys, time
+from pathlib import Path
+from statistics import median
+
+import snapshots
+from http_client import get_client
+from rpa_runner import (META_FIELDS, PAGES, URLS_PATH, clean, pick_skills, read_urls, run_batch, write_record)
+
+try:
+    sys.stdout.reconfigure(encoding="utf-8")
+except Exception:
+    pass
+
+REQUIRED = ("title", "company", "location")   # sinon → fallback navigateur
+
+LDJSON_RE = re.compile(r"<script[^>]+type=[\"']application/ld\+json[\"'][^>]*>(.*?)</script>", re.S | re.I)
+
+SNAP = snapshots.get_store()        # SNAPSHOT=record|replay (cf. snapshots.py)
+REPLAY = SNAP is not None and snapshots.MODE == "replay"
+
+def fetch_html(url: str):
+    """→ (html, en-têtes, statut) ; en replay, la page enregistrée (hors ligne)."""
+    if REPLAY:
+        snap = SNAP.get(url)
+        if not snap or not snap["html"]:
+            raise LookupError(f"snapshot absent: {url}")
+        return snap["html"], snap["headers"], snap["status"]
+    r = get_client().get(url)
+    r.raise_for_status()
+    return r.text, r.headers, r.status_code
+
+def _walk(obj):
+    if isinstance(obj, dict):
+        yield obj
+        for v in obj.values():
+            yield from _walk(v)
+    elif isinstance(obj, list):
+        for v in obj:
+            yield from _walk(v)
+
+def _is_posting(obj) -> bool:
+    t = obj.get("@type")
+    return t == "JobPosting" or (isinstance(t, list) and "JobPosting" in t)
+
+def find_job_posting(page_html: str):
+    for block in LDJSON_RE.findall(page_html):
+        try:
+            data = json.loads(block.strip())
+        except Exception:
+            try:
+                data = json.loads(html.unescape(block.strip()))
+            except Exception:
+                continue
+        for obj in _walk(data):
+            if _is_posting(obj):
+                return obj
+    return None
+
+def _first(x):
+    return x[0] if isinstance(x, list) and x else x
+
+def _name(x) -> str:
+    x = _first(x)
+    if isinstance(x, dict):
+        x = x.get("name", "")
+    return x if isinstance(x, str) else ""
+
+def _location(loc) -> str:
+    loc = _first(loc)
+    if not isinstance(loc, dict):
+        return loc if isinstance(loc, str) else ""
+    addr = _first(loc.get("address", loc))   # address peut être une liste de PostalAddress
+    if isinstance(addr, str):
+        return addr
+    if not isinstance(addr, dict):
+        return ""
+    return addr.get("addressLocality") or addr.get("addressRegion") or addr.get("addressCountry") or ""
+
+def _salary(sal) -> str:
+    sal = _first(sal)
+    if not isinstance(sal, dict):
+        return str(sal) if sal else ""
+    cur = sal.get("currency", "")
+    val = sal.get("value", {})
+    if not isinstance(val, dict):
+        return f"{val} {cur}".strip()
+    lo, hi = val.get("minValue"), val.get("maxValue")
+    amount = f"{lo} - {hi}" if lo and hi else str(lo or hi or val.get("value") or "")
+    if not amount:
+        return ""
+    unit = val.get("unitText", "")
+    return " ".join(x for x in [amount, cur, f"/ {unit}" if unit else ""] if x)
+
+def _skills(sk):
+    if isinstance(sk, str):
+        sk = re.split(r"[,;\n]", sk)
+    elif isinstance(sk, dict):
+        sk = [sk]
+    if not isinstance(sk, list):
+        return []
+    # DefinedTerm sans "name" → ignoré
+    return pick_skills([n for n in map(_name, sk) if n])
+
+def posting_to_pred(jp: dict) -> dict:
+    return {
+        "title": clean(jp.get("title", "") or ""),
+        "company": clean(_name(jp.get("hiringOrganization"))),
+        "location": clean(_location(jp.get("jobLocation"))),
+        "salary": clean(_salary(jp.get("baseSalary"))),
+        "skills": _skills(jp.get("skills")),
+    }
+
+def description_text(jp: dict) -> str:
+    desc = jp.get("description", "") or ""
+    desc = re.sub(r"<(br|/p|/li|/h\d)[^>]*>", "\n", desc, flags=re.I)
+    desc = html.unescape(re.sub(r"<[^>]+>", "", desc))
+    return re.sub(r"\n{2,}", "\n", desc).strip()
+
+def cache_text(jp: dict, pred: dict) -> str:
+    """Texte LLM : champs structurés en tête (comme rpa_runner.prefill_cache) puis la description."""
+    head = "\n".join(pred[k] for k in META_FIELDS if pred.get(k))
+    return head + "\n" + description_text(jp)
+
+def try_fast(url: str):
+    """→ pred complet, ou None si la voie rapide ne suffit pas."""
+    try:
+        page_html, headers, status = fetch_html(url)
+        jp = find_job_posting(page_html)
+    except Exception:
+        return None
+    if not jp:
+        return None
+    try:
+        pred = posting_to_pred(jp)
+    except Exception:
+        return None   # JSON-LD de forme inattendue → navigateur
+    if not all(pred[k] for k in REQUIRED):
+        return None
+    # cache texte pour LLM : titre/entreprise/lieu/salaire + description JSON-LD (texte principal)
+    text = cache_text(jp, pred)
+    if not PAGES.has(url):
+        PAGES.put(url, text)
+    if SNAP and snapshots.MODE == "record":
+        # URL sans visite navigateur : le snapshot porte ce HTML et le texte vu par le LLM (replay)
+        SNAP.put(url, page_html, text, headers, status)
+    return pred
+
+def run(urls):
+    recs, fallback = [], []
+    for url in urls:
+        t0 = time.time()
+        pred = try_fast(url)
+        if pred is None:
+            fallback.append(url)
+            continue
+        recs.append(write_record(url, t0, True, "", pred, tier="jsonld", variant="A_RPA_JSONLD"))
+
+    if fallback:
+        recs += run_batch(fallback)
+
+    fast = [r["latency_s"] for r in recs if r["tier"] == "jsonld"]
+    slow = [r["latency_s"] for r in recs if r["tier"] == "browser"]
+    if recs:
+        print(f"\n== Voie JSON-LD ==\n"
+              f"résolues sans navigateur={len(fast)}/{len(recs)} ({len(fast)/len(recs):.1%}) | "
+              f"médiane JSON-LD={median(fast) if fast else 0:.3f}s | "
+              f"médiane navigateur={median(slow) if slow else 0:.3f}s")
+    return recs
+
+if __name__ == "__main__":
+    path = Path(sys.argv[1]) if len(sys.argv) > 1 else URLS_PATH
+    run(read_urls(path))
@@ -0,0 +1,124 @@
+# llm_cache.py — cache disque des réponses LLM (relancer un runner sur les mêmes entrées
+# ne refait pas l'inférence CPU).
+# - clé = sha256(digest du modèle, system, prompt rendu, options de décodage, format)
+#   → changer de modèle (ou le re-pull), de prompt ou d'options invalide naturellement
+# - seules les requêtes déterministes (temperature 0) sont mises en cache
+# - éviction par taille totale (LLM_CACHE_MAX_MB, LRU)
+#
+# Index + réponses : cache/llm.sqlite
+# Contournement :  LLM_CACHE=0
+# Bilan :          python llm_cache.py
+import hashlib, json, os, sqlite3, threading, time
+from pathlib import Path
+
+ENABLED   = os.getenv("LLM_CACHE", "1") != "0"
+CACHE_DB  = Path(os.getenv("LLM_CACHE_DB", "cache/llm.sqlite"))
+MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_MB", "100")) * 1_000_000
+
+# options sans effet sur la sortie tant que le prompt tient (taille de contexte, threads)
+NEUTRAL_OPTIONS = {"num_ctx", "num_keep", "num_thread"}
+# champs de requête sans effet sur la réponse (le modèle est couvert par son digest)
+TRANSPORT = {"model", "stream", "keep_alive"}
+
+def key(digest: str, body: dict) -> str:
+    """Clé stable : digest du modèle + tout ce qui conditionne la sortie (hors keep_alive/stream).
+    Les autres champs du corps (logprobs, raw, template...) entrent dans la clé quand ils sont
+    présents : une réponse mise en cache sans logprobs ne sert pas une requête qui en demande."""
+    opts = {k: v for k, v in body.get("options", {}).items() if k not in NEUTRAL_OPTIONS}
+    parts = {"digest": digest, "system": body.get("system", ""), "prompt": body.get("prompt", ""),
+             "options": opts, "format": body.get("format", "")}
+    parts.update({k: v for k, v in body.items() if k not in TRANSPORT and k not in parts})
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+def cacheable(body: dict) -> bool:
+    return body.get("options", {}).get("temperature", 0.8) == 0
+
+class LLMCache:
+    def __init__(self, path: Path = CACHE_DB, max_bytes=MAX_BYTES):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.db = sqlite3.connect(str(path), check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY, model TEXT, response TEXT, size INTEGER,
+            created_at REAL, accessed_at REAL)""")
+        # dernier digest connu par modèle : le cache reste utilisable serveur arrêté
+        self.db.execute("CREATE TABLE IF NOT EXISTS digests (model TEXT PRIMARY KEY, digest TEXT)")
+        self.db.commit()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, k: str):
+        """Réponse /api/generate en cache (dict) ou None."""
+        with self._lock:
+            row = self.db.execute("SELECT response FROM responses WHERE key=?", (k,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.db.execute("UPDATE responses SET accessed_at=? WHERE key=?", (time.time(), k))
+            self.db.commit()
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, k: str, model: str, resp: dict):
+        data = json.dumps(resp, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self.db.execute("INSERT OR REPLACE INTO responses VALUES (?,?,?,?,?,?)",
+                            (k, model, data, len(data.encode("utf-8")), now, now))
+            self.db.commit()
+        self.evict()
+
+    def remember_digest(self, model: str, digest: str):
+        with self._lock:
+            self.db.execute("INSERT OR REPLACE INTO digests VALUES (?,?)", (model, digest))
+            self.db.commit()
+
+    def known_digest(self, model: str) -> str:
+        with self._lock:
+            row = self.db.execute("SELECT digest FROM digests WHERE model=?", (model,)).fetchone()
+        return row[0] if row else ""
+
+    def evict(self):
+        with self._lock:
+            total = self.db.execute("SELECT COALESCE(SUM(size),0) FROM responses").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            lru = []
+            for k, size in self.db.execute("SELECT key, size FROM responses ORDER BY accessed_at"):
+                if total <= self.max_bytes * 0.9:   # marge pour ne pas évincer à chaque put
+                    break
+                lru.append((k,)); total -= size
+            self.db.executemany("DELETE FROM responses WHERE key=?", lru)
+            self.db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            n, total = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size),0) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {"entries": n, "bytes": total, "hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0}
+
+    def report(self, tag="LLM-CACHE"):
+        s = self.stats()
+        print(f"[{tag}] {s['entries']} réponses ({s['bytes']/1e6:.1f}/{self.max_bytes/1e6:.0f} Mo) | "
+              f"hits={s['hits']} misses={s['misses']} (taux={s['hit_rate']:.1%})")
+        return s
+
+_CACHE = None
+
+def get_llm_cache():
+    """Cache partagé du processus, ou None si LLM_CACHE=0."""
+    global _CACHE
+    if not ENABLED:
+        return None
+    if _CACHE is None:
+        _CACHE = LLMCache()
+    return _CACHE
+
+if __name__ == "__main__":
+    c = get_llm_cache()
+    if c is None:
+        print("[LLM-CACHE] désactivé (LLM_CACHE=0)")
+    else:
+        c.report()
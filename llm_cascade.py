@@ -0,0 +1,102 @@
+# llm_cascade.py — cascade petit → grand modèle : le modèle léger traite chaque item, seuls les
+# items incertains repassent par le gros modèle (LLM_CASCADE=1 ; sinon le modèle du script, comme avant).
+# Confiance (0..1) = minimum des signaux disponibles :
+# - sortie hors schéma ou appel en échec → 0 (escalade d'office)
+# - logprobs des tokens générés ("logprobs": true, Ollama récent ; absents sur un ancien serveur) :
+#   token le moins sûr pour une décision (label, indices), moyenne géométrique pour l'extraction libre
+# - accord avec la sortie des règles : part des champs trouvés par les règles où le LLM coïncide
+# Sans aucun signal au-delà du schéma, la réponse du petit modèle est gardée.
+#
+# LLM_CASCADE_SMALL=llama3.2:1b  LLM_CASCADE_LARGE=mistral  LLM_CASCADE_MIN=0.7 (seuil d'escalade)
+# Bilan : taux d'escalade + latence/exactitude gardés vs escaladés dans les eval_*.py (report)
+import math, os, re, time
+from statistics import median
+
+import llm_schemas
+
+ENABLED  = os.getenv("LLM_CASCADE", "0") == "1"
+SMALL    = os.getenv("LLM_CASCADE_SMALL", "llama3.2:1b")
+LARGE    = os.getenv("LLM_CASCADE_LARGE", "mistral")
+MIN_CONF = float(os.getenv("LLM_CASCADE_MIN", "0.7"))
+
+# lecture des logprobs par tâche : "min" (une décision) ou "mean" (champs libres, beaucoup de tokens)
+LOGPROB = {"spam": "min", "select": "min", "invoice": "mean", "job": "mean"}
+
+def models(default: str) -> list:
+    """Modèles à garder chargés (cf. model_residency.resident)."""
+    return [SMALL, LARGE] if ENABLED else [default]
+
+def _norm(v) -> str:
+    s = re.sub(r"\s+", "", str(v)).lower()
+    try:
+        return f"{float(s.replace(',', '.')):.2f}"
+    except ValueError:
+        return s
+
+def agreement(pred: dict, rule: dict):
+    """Part des champs renseignés par les règles où le LLM donne la même valeur (None si aucun)."""
+    fields = [k for k, v in rule.items() if v not in ("", None)]
+    if not fields:
+        return None
+    return sum(_norm(pred.get(k, "")) == _norm(rule[k]) for k in fields) / len(fields)
+
+def logprob_conf(resp: dict, mode="mean"):
+    lps = [t["logprob"] for t in resp.get("logprobs") or [] if "logprob" in t]
+    if not lps:
+        return None
+    return math.exp(min(lps)) if mode == "min" else math.exp(sum(lps) / len(lps))
+
+def confidence(task: str, resp, rule=None, to_pred=None) -> float:
+    """Confiance dans la réponse du petit modèle. `to_pred` : sortie parsée → champs comparables
+    à `rule` (par défaut la sortie parsée elle-même)."""
+    if resp is None:
+        return 0.0
+    try:
+        data = llm_schemas.parse(task, resp["response"])
+    except Exception:
+        return 0.0
+    if not data:    # LLM_SCHEMA=0 : force_json n'a rien trouvé
+        return 0.0
+    signals = [logprob_conf(resp, LOGPROB.get(task, "mean"))]
+    if rule:
+        signals.append(agreement(to_pred(data) if to_pred else data, rule))
+    signals = [s for s in signals if s is not None]
+    return min(signals) if signals else 1.0
+
+def generate(task: str, call, model: str, rule=None, to_pred=None) -> dict:
+    """call(modèle) → réponse de OllamaClient.generate. Cascade désactivée : call(model).
+    Sinon petit modèle, puis gros modèle si confiance < MIN_CONF ; la réponse gardée porte
+    "cascade" (paire de modèles, modèle final, confiance du petit, escalade, durée de l'essai du petit)."""
+    if not ENABLED:
+        return call(model)
+    t0 = time.time()
+    try:
+        small = call(SMALL)
+    except Exception:
+        small = None    # serveur lent / erreur HTTP sur le petit : le gros tente sa chance
+    conf = confidence(task, small, rule, to_pred)
+    info = {"cascade": f"{SMALL}→{LARGE}", "model": SMALL, "confidence": round(conf, 3), "escalated": False}
+    if small is not None and conf >= MIN_CONF:
+        return {**small, "cascade": info}
+    info.update(model=LARGE, escalated=True, small_s=round(time.time() - t0, 3))
+    return {**call(LARGE), "cascade": info}
+
+def info(resp: dict) -> dict:
+    """Champs de cascade à recopier dans l'enregistrement (vide hors cascade)."""
+    return dict(resp.get("cascade", {}))
+
+def report(recs, score, tag="Cascade"):
+    """score(recs) → exactitude 0..1 de la tâche ; taux d'escalade et compromis latence/exactitude
+    entre items gardés (petit modèle seul) et escaladés (petit + gros)."""
+    cas = [r for r in recs if "escalated" in r]
+    if not cas:
+        return
+    esc = [r for r in cas if r["escalated"]]
+    kept = [r for r in cas if not r["escalated"]]
+    def part(name, rs):
+        if not rs:
+            return f"{name}=0"
+        lat = [r["latency_s"] for r in rs if not r.get("cached")]
+        return f"{name}={len(rs)} (latence médiane={median(lat) if lat else 0.0:.3f}s, exactitude={score(rs):.1%})"
+    print(f"{tag} {cas[0].get('cascade', '')} : escalade={len(esc)}/{len(cas)} ({len(esc)/len(cas):.1%}) | "
+          f"confiance médiane={median(r['confidence'] for r in cas):.2f} | {part('gardés', kept)} | {part('escaladés', esc)}")
@@ -0,0 +1,61 @@
+# llm_dispatch.py — K requêtes LLM en vol, sorties dans l'ordre d'entrée
+# Le serveur Ollama doit accepter des requêtes parallèles (OLLAMA_NUM_PARALLEL >= K).
+#
+# Variable d'environnement LLM_PARALLEL=K (défaut 1 = séquentiel, comme avant).
+import os, time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from statistics import median
+
+PARALLEL = max(1, int(os.getenv("LLM_PARALLEL", "1")))
+
+def imap_ordered(fn, items, k=None):
+    """Applique `fn` à chaque item avec au plus `k` appels simultanés ;
+    les résultats sont rendus dans l'ordre des items (tampon pour ceux qui finissent en avance)."""
+    k = k or PARALLEL
+    items = iter(items)
+    if k == 1:
+        for it in items:
+            yield fn(it)
+        return
+    with ThreadPoolExecutor(max_workers=k) as ex:
+        pending, done_buf = {}, {}
+        nxt_submit = nxt_yield = 0
+        for it in items:
+            pending[ex.submit(fn, it)] = nxt_submit; nxt_submit += 1
+            if len(pending) < k:
+                continue
+            # fenêtre pleine : attendre au moins une fin, puis vider ce qui est prêt dans l'ordre
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for f in done:
+                done_buf[pending.pop(f)] = f.result()
+            while nxt_yield in done_buf:
+                yield done_buf.pop(nxt_yield); nxt_yield += 1
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for f in done:
+                done_buf[pending.pop(f)] = f.result()
+            while nxt_yield in done_buf:
+                yield done_buf.pop(nxt_yield); nxt_yield += 1
+
+class RunStats:
+    """Débit (items/s, horloge murale) et latence par item, mesurés séparément."""
+    def __init__(self, k=None):
+        self.k = k or PARALLEL
+        self.t0 = time.time()
+        self.lat = []
+
+    def add(self, rec):
+        self.lat.append(rec.get("latency_s", 0.0))
+        return rec
+
+    def report(self, tag="LLM"):
+        wall = time.time() - self.t0
+        n = len(self.lat)
+        if not n:
+            return {}
+        s = {"n": n, "parallel": self.k, "wall_s": round(wall, 3),
+             "items_per_s": round(n / wall, 3) if wall else 0.0,
+             "latency_median_s": round(median(self.lat), 3)}
+        print(f"[{tag}] n={n} | K={self.k} | mur={wall:.1f}s | débit={s['items_per_s']:.2f} items/s | "
+              f"latence médiane/item={s['latency_median_s']:.3f}s")
+        return s
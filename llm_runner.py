@@ -1,11 +1,20 @@
 # llm_runner.py — rapide & robuste (Ollama + Mistral) — LECTURE CACHE OK
-import json, time, sys, re, multiprocessing, urllib.request, urllib.error
+import json, os, time, sys, re
 from pathlib import Path
-from hashlib import sha1
 
-import requests
-from bs4 import BeautifulSoup
 from playwright.sync_api import sync_playwright, TimeoutError as PWTimeout
+from net_filter import NetFilter
+from http_client import UA, get_client
+from html_text import extract_main_text, density_main_text, trim_text
+import site_template
+import snapshots
+from page_cache import get_cache
+from ollama_client import compose, get_ollama, timing, usage
+import llm_schemas
+import token_window
+import llm_cascade
+from llm_dispatch import imap_ordered, RunStats
+from model_residency import resident
 
 # --- éviter les warnings d'encodage en console
 try:
@@ -18,61 +27,71 @@ MODEL = "mistral"                   # reste sur Mistral comme d'hab
 OUT = Path("results/results_llm.jsonl")
 OUT.parent.mkdir(parents=True, exist_ok=True)
 
-CACHE_DIR = Path("cache")
-CACHE_DIR.mkdir(parents=True, exist_ok=True)
-
-UA = ("Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
-      "(KHTML, like Gecko) Chrome/124.0 Safari/537.36")
+PAGES = get_cache()                 # cache texte partagé avec le RPA (cf. page_cache.py)
 
 SYSTEM = (
     "Tu es un extracteur. Réponds UNIQUEMENT en JSON valide au format EXACT:\n"
-    "{\"title\":\"str\",\"company\":\"str\",\"location\":\"str\",\"salary\":\"str\",\"skills\":[\"str\",...]}\n"
+    + llm_schemas.shape("job") + "\n"
     "Pas d'explications."
 )
 
-USER_TMPL = (
-    "Extrait ces champs depuis le texte ci-dessous.\n"
-    "Texte:\n----\n{content}\n----\n"
+# consignes statiques (tête + rappels) / texte de la page — cf. ollama_client.compose
+USER_HEAD = "Extrait ces champs depuis le texte ci-dessous.\n"
+USER_BODY = "Texte:\n----\n{content}\n----\n"
+USER_TAIL = (
     "Rappels: Si un champ est introuvable, mets une chaîne vide. "
     "Limite skills à 10 items courts."
 )
 
-MAX_CHARS_IN   = 6000               # borne stricte d'entrée pour accélérer en CPU
-OLLAMA_URL     = "http://localhost:11434/api/generate"
-READ_TIMEOUT_S = 60                 # timeout lecture réponse LLM
-CONNECT_TIMEOUT_S = 15              # timeout connexion API
+OLLAMA = get_ollama()               # timeouts et options : profil "web" (ollama_client.py)
 MAX_RUNTIME_S  = 60                 # garde-fou total par URL
+MAIN_TEXT      = os.getenv("MAIN_TEXT", "density")   # "density" (sans boilerplate) | "longest" (ancien)
+SITE_TEMPLATE  = os.getenv("SITE_TEMPLATE", "1") != "0"  # retire les lignes communes au site (site_template.py)
 
-# ========= CACHE (lecture) =========
-def safe_name(url: str) -> str:
-    return sha1(url.encode("utf-8")).hexdigest()[:12]
+NET = NetFilter()                   # fallback Playwright : texte seulement
+SNAP = snapshots.get_store()        # SNAPSHOT=record|replay (cf. snapshots.py)
+REPLAY = SNAP is not None and snapshots.MODE == "replay"
 
-def read_cached_text(url: str, limit=MAX_CHARS_IN) -> str:
-    p = CACHE_DIR / f"{safe_name(url)}.txt"
-    if p.exists():
-        return p.read_text(encoding="utf-8")[:limit]
+# ========= CACHE (lecture) =========
+def read_cached_text(url: str, limit=None, allow_stale=False) -> str:
+    if REPLAY:
+        # replay : même texte principal que celui vu par le RPA à l'enregistrement
+        snap = SNAP.get(url)
+        text = snap["main_text"] if snap else ""
+    else:
+        text = PAGES.get(url, allow_stale=allow_stale) or ""
+    if text:
+        if SITE_TEMPLATE:
+            text = site_template.strip(url, text)
+        if MAIN_TEXT == "density":
+            text = trim_text(text)
+        return text[:limit]
     return ""
 
 # ========= FETCH & TEXTE =========
 def _requests_html(url: str, timeout=12):
-    req = urllib.request.Request(
-        url,
-        headers={
-            "User-Agent": UA,
-            "Accept": "text/html,application/xhtml+xml",
-            "Accept-Language": "fr-FR,fr;q=0.9,en;q=0.8",
-            "Accept-Encoding": "gzip, deflate, br",
-            "Connection": "keep-alive",
-        }
-    )
-    with urllib.request.urlopen(req, timeout=timeout) as resp:
-        return resp.read()
+    """→ (html, en-têtes), ou None si 304 (le texte en cache reste valable)."""
+    if REPLAY:
+        snap = SNAP.get(url)
+        if not snap or not snap["html"]:
+            raise LookupError(f"snapshot absent: {url}")
+        return snap["html"], snap["headers"]
+    # client partagé : keep-alive + corps décompressé (gzip/deflate/br)
+    # + revalidation conditionnelle si une entrée périmée existe
+    r = get_client().get(url, timeout=timeout, headers=PAGES.conditional_headers(url))
+    if r.status_code == 304:
+        PAGES.touch(url)
+        return None
+    r.raise_for_status()
+    if SNAP and snapshots.MODE == "record" and not SNAP.has(url):
+        SNAP.put(url, r.content, "", r.headers, r.status_code)
+    return r.content, r.headers
 
 def _playwright_text(url: str, timeout_ms=15000):
     # Fallback si anti-bot / DOM dynamique
     with sync_playwright() as p:
         browser = p.chromium.launch(headless=True)
-        ctx = browser.new_context(user_agent=UA)
+        ctx = NET.install(browser.new_context(user_agent=UA))
         page = ctx.new_page()
         page.goto(url, timeout=timeout_ms)
         page.wait_for_load_state("domcontentloaded")
@@ -88,75 +107,53 @@ def _playwright_text(url: str, timeout_ms=15000):
 
 def html_to_text(url: str, timeout=12):
     try:
-        html = _requests_html(url, timeout=timeout)
-        soup = BeautifulSoup(html, "html.parser")
-        for t in soup(["script","style","noscript"]):
-            t.extract()
-
-        candidates = []
-        for sel in ["[data-testid='job-description']", "article", "[role='main']",
-                    "main", "[class*='description']"]:
-            for n in soup.select(sel):
-                txt = n.get_text(separator="\n", strip=True)
-                if txt and len(txt) > 200:
-                    candidates.append(txt)
-
-        text = max(candidates, key=len) if candidates else soup.get_text(separator="\n")
+        fetched = _requests_html(url, timeout=timeout)
+        if fetched is None:   # 304 Not Modified
+            return read_cached_text(url, allow_stale=True)
+        html, headers = fetched
+        if MAIN_TEXT == "density":
+            text = density_main_text(html)   # cœur de l'offre, sans nav/cookies/offres similaires
+        else:
+            text = extract_main_text(html)   # backend HTML_PARSER (cf. html_text.py)
+        if not REPLAY and text:
+            PAGES.put(url, text, headers.get("etag", ""), headers.get("last-modified", ""))
     except Exception:
-        # fallback Playwright (anti-bot / DOM dynamique)
+        # fallback Playwright (anti-bot / DOM dynamique) — jamais en replay (hors ligne)
         try:
-            text = _playwright_text(url)
+            text = "" if REPLAY else _playwright_text(url)
         except PWTimeout:
             text = ""
 
     # nettoyage & borne
     text = re.sub(r"[ \t]+\n", "\n", text)
-    text = re.sub(r"\n{2,}", "\n", text).strip()
-    return text[:MAX_CHARS_IN]
+    return re.sub(r"\n{2,}", "\n", text).strip()
 
 # ========= OLLAMA CALL =========
-def call_ollama(model: str, prompt: str):
-    payload = {
-        "model": model,
-        "prompt": prompt,
-        "system": SYSTEM,
-        "format": "json",              # force JSON
-        "options": {
-            "temperature": 0,
-            "num_predict": 80,         # sortie courte
-            "num_thread": multiprocessing.cpu_count(),
-            "num_ctx": 2048,           # contexte réduit pour CPU
-            "top_p": 0.9
-        },
-        "stream": False,
-        "keep_alive": "5m"
-    }
-    r = requests.post(
-        OLLAMA_URL,
-        json=payload,
-        timeout=(CONNECT_TIMEOUT_S, READ_TIMEOUT_S)
-    )
-    if r.status_code != 200:
-        raise RuntimeError(f"Ollama {r.status_code}: {r.text}")
-    return r.json()["response"]
-
-def force_json(s: str):
-    # sécurité au cas où (format:"json" devrait suffire)
-    m = re.search(r"\{.*\}", s, flags=re.S)
-    if not m:
-        return {}
-    try:
-        return json.loads(m.group(0))
-    except Exception:
-        return {}
+def call_ollama(model: str, prefix: str, prompt: str):
+    # client partagé (keep-alive), profil "web" : num_predict 80, num_ctx 2048
+    # → "response" + compteurs (prompt_eval_count, prompt_eval_duration...)
+    return OLLAMA.generate(model, prompt, system=SYSTEM, profile="web", prefix=prefix,
+                           fmt=llm_schemas.fmt("job"), required=llm_schemas.required("job"))
+
+def content_budget(model=MODEL) -> int:
+    prefix, body = compose(USER_HEAD, USER_BODY.format(content=""), USER_TAIL)
+    return token_window.budget(model, "web", SYSTEM, prefix, body, fmt=llm_schemas.fmt("job"))
+
+def ask(content: str, model: str):
+    """Fenêtre + prompt pour `model` → (réponse, taille du prompt en caractères)."""
+    # fenêtre en tokens : ce qui tient dans num_ctx du profil "web", segments salaire/lieu/... d'abord
+    content = token_window.window(content, content_budget(model), model, kind="job")
+    prefix, user = compose(USER_HEAD, USER_BODY.format(content=content), USER_TAIL)
+    return {**call_ollama(model, prefix, user), "prompt_chars": len(prefix + user)}
 
 # ========= RUNNER =========
-def run_one(url: str):
+def process(url: str) -> dict:
+    """Texte + appel LLM pour une URL → enregistrement (sans écriture, utilisable en parallèle)."""
     t0 = time.time()
-    success, err, pred = True, "", {}
+    success, err, pred, stats = True, "", {}, {}
     try:
         # 1) lire le cache si dispo, sinon fallback HTML
-        content = read_cached_text(url, limit=MAX_CHARS_IN)
+        content = read_cached_text(url)
         if not content:
             content = html_to_text(url)
         if not content:
@@ -166,9 +163,17 @@ def run_one(url: str):
         if time.time() - t0 > MAX_RUNTIME_S:
             raise TimeoutError("budget_exhausted_before_llm")
 
-        user = USER_TMPL.format(content=content)
-        raw = call_ollama(MODEL, user)
-        pred = force_json(raw)
+        # LLM_CASCADE=1 : petit modèle d'abord, gros modèle si sortie peu sûre (logprobs) ou hors schéma
+        resp = llm_cascade.generate("job", lambda m: ask(content, m), MODEL)
+        stats = {
+            "main_text": MAIN_TEXT,
+            "prompt_chars": resp["prompt_chars"],
+            "cached": resp.get("cached", False),
+            **usage(resp),   # prompt_eval_* absents après un arrêt anticipé du streaming
+            **timing(resp),
+            **llm_cascade.info(resp),
+        }
+        pred = llm_schemas.parse("job", resp["response"])   # schéma "job" (clés compactes → complètes)
 
         # Normaliser les clés attendues
         pred = {
@@ -188,25 +193,45 @@ def run_one(url: str):
         "latency_s": round(time.time() - t0, 3),
         "success": success,
         "error": err,
-        "pred": pred
+        "pred": pred,
+        **stats
     }
-    OUT.open("a", encoding="utf-8").write(json.dumps(rec, ensure_ascii=False) + "\n")
-    print(f"[LLM] {url} -> {success} ({rec['latency_s']}s) err={err}")
     return rec
 
-if __name__ == "__main__":
-    # si pas d’argument: prend la 1ʳᵉ URL de data/urls.txt
-    if len(sys.argv) > 1:
-        url = sys.argv[1]
-    else:
-        try:
-            url = next(u for u in Path("data/urls.txt").read_text(encoding="utf-8").splitlines() if u.strip())
-        except Exception:
-            url = "https://example.org"
-    run_one(url)
-
-
+def write_record(rec: dict):
+    OUT.open("a", encoding="utf-8").write(json.dumps(rec, ensure_ascii=False) + "\n")
+    print(f"[LLM] {rec['id']} -> {rec['success']} ({rec['latency_s']}s) err={rec['error']}")
+    return rec
 
+def run_one(url: str):
+    return write_record(process(url))
 
+def run_batch(urls, k=None):
+    """Toutes les URLs avec K appels LLM en vol (LLM_PARALLEL) ; résultats écrits dans l'ordre."""
+    stats = RunStats(k)
+    for rec in imap_ordered(process, urls, k):
+        stats.add(write_record(rec))
+    stats.report("LLM")
+    PAGES.report()
+    if OLLAMA.cache is not None:
+        OLLAMA.cache.report()
 
+def read_urls(path=Path("data/urls.txt")):
+    return [u.strip() for u in path.read_text(encoding="utf-8").splitlines() if u.strip()]
 
+if __name__ == "__main__":
+    # --batch [fichier] : toutes les URLs (LLM_PARALLEL=K requêtes simultanées)
+    # sinon : l'URL donnée, ou la 1ʳᵉ URL de data/urls.txt
+    # modèle chargé et confirmé avant tout chronométrage (temps de chargement consigné à part)
+    with resident(OLLAMA, llm_cascade.models(MODEL), profile="web", tag="B_LLM"):
+        if len(sys.argv) > 1 and sys.argv[1] == "--batch":
+            run_batch(read_urls(Path(sys.argv[2]) if len(sys.argv) > 2 else Path("data/urls.txt")))
+        else:
+            if len(sys.argv) > 1:
+                url = sys.argv[1]
+            else:
+                try:
+                    url = read_urls()[0]
+                except Exception:
+                    url = "https://example.org"
+            run_one(url)
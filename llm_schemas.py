@@ -0,0 +1,153 @@
+# llm_schemas.py — sorties structurées : schéma JSON exact par tâche passé en "format"
+# (Ollama contraint le décodage → plus de JSON invalide ni de champ manquant, plus de force_json).
+# - clés compactes ("t" au lieu de "title") et enums → moins de tokens générés
+# - expand() remet les clés complètes attendues par les évaluations
+#
+# LLM_SCHEMA=0 : retour à "format": "json" + rattrapage regex (ancien comportement)
+import json, os, re
+
+ENABLED = os.getenv("LLM_SCHEMA", "1") != "0"
+
+_STR = {"type": "string"}
+CURRENCIES = ["", "EUR", "USD", "GBP"]
+
+def _example(prop: dict) -> str:
+    if "enum" in prop:
+        return "|".join(json.dumps(v) for v in prop["enum"])
+    if prop["type"] == "array":
+        return f"[{_example(prop['items'])},...]"
+    return {"string": '"str"', "integer": "int"}[prop["type"]]
+
+class Task:
+    def __init__(self, keys: dict, props: dict, legacy: str):
+        self.keys = keys        # clé compacte → clé complète
+        self.props = props      # schéma de chaque valeur (par clé compacte)
+        self.legacy = legacy    # format décrit au modèle en mode "json" (clés complètes)
+
+    def schema(self, **sizes) -> dict:
+        props = dict(self.props)
+        # listes d'indices : enum -1..n-1 (n = taille de la liste de candidats)
+        for k, n in sizes.items():
+            props[k] = {"type": "integer", "enum": list(range(-1, n))}
+        return {"type": "object", "properties": props, "required": list(props), "additionalProperties": False}
+
+    def shape(self) -> str:
+        if not ENABLED:
+            return self.legacy
+        return self.example() + "  (" + self.legend() + ")"
+
+    def example(self) -> str:
+        return "{" + ",".join(f'"{c}":{_example(p)}' for c, p in self.props.items()) + "}"
+
+    def legend(self) -> str:
+        return ", ".join(f"{c}={full}" for c, full in self.keys.items())
+
+    def expand(self, data: dict) -> dict:
+        return {self.keys.get(k, k): v for k, v in data.items()}
+
+class BatchTask(Task):
+    """Lot : un tableau d'objets `item` sous une seule clé, un par entrée du prompt
+    (`i` = position de l'entrée dans le lot)."""
+    def __init__(self, key: tuple, item: Task, legacy: str):
+        super().__init__({key[0]: key[1]}, {}, legacy)
+        self.item = item
+
+    def schema(self, n=1) -> dict:
+        item = self.item.schema(i=n)
+        item["properties"]["i"]["enum"] = list(range(n))
+        arr = {"type": "array", "items": item, "minItems": n, "maxItems": n}
+        c = next(iter(self.keys))
+        return {"type": "object", "properties": {c: arr}, "required": [c], "additionalProperties": False}
+
+    def shape(self) -> str:
+        if not ENABLED:
+            return self.legacy
+        c = next(iter(self.keys))
+        return f'{{"{c}":[{self.item.example()},...]}}  ({self.legend()}, {self.item.legend()})'
+
+    def expand(self, data: dict) -> dict:
+        c, full = next(iter(self.keys.items()))
+        return {full: [self.item.expand(x) for x in data.get(c, []) if isinstance(x, dict)]}
+
+_SPAM_LABEL = {"type": "string", "enum": ["spam", "other"]}
+
+TASKS = {
+    "job": Task(
+        {"t": "title", "c": "company", "l": "location", "s": "salary", "k": "skills"},
+        {"t": _STR, "c": _STR, "l": _STR, "s": _STR,
+         "k": {"type": "array", "items": _STR, "maxItems": 10}},
+        '{"title":"str","company":"str","location":"str","salary":"str","skills":["str",...]}'),
+    "spam": Task(
+        {"l": "label"},
+        {"l": _SPAM_LABEL},
+        '{"label":"spam_or_other"}'),
+    "spam_batch": BatchTask(
+        ("r", "results"),
+        Task({"i": "id", "l": "label"}, {"i": {"type": "integer"}, "l": _SPAM_LABEL}, ""),
+        '{"results":[{"id":int,"label":"spam_or_other"},...]}'),
+    "invoice": Task(
+        {"n": "invoice_no", "d": "date", "v": "vendor", "t": "total", "c": "currency"},
+        {"n": _STR, "d": _STR, "v": _STR, "t": _STR, "c": {"type": "string", "enum": CURRENCIES}},
+        '{"invoice_no":"str","date":"str","vendor":"str","total":"str","currency":"str"}'),
+    "select": Task(
+        {"v": "vendor_idx", "i": "invoice_idx", "d": "date_idx", "a": "amount_idx", "c": "currency"},
+        {"v": {"type": "integer"}, "i": {"type": "integer"}, "d": {"type": "integer"},
+         "a": {"type": "integer"}, "c": {"type": "string", "enum": CURRENCIES}},
+        '{"vendor_idx":int, "invoice_idx":int, "date_idx":int, "amount_idx":int, "currency":""}'),
+}
+
+STR_TOKENS = 16        # champ texte libre (titre, entreprise, vendeur...)
+ITEM_STR_TOKENS = 8    # élément de liste (compétence)
+
+def max_tokens(schema: dict) -> int:
+    """Borne haute des tokens d'une sortie conforme au schéma (→ num_predict sans troncature)."""
+    if "enum" in schema:
+        return max(len(json.dumps(v)) for v in schema["enum"]) // 3 + 2
+    t = schema.get("type")
+    if t == "object":
+        return 2 + sum(len(k) // 3 + 3 + max_tokens(p) for k, p in schema["properties"].items())
+    if t == "array":
+        item = schema["items"]
+        per = ITEM_STR_TOKENS if item.get("type") == "string" and "enum" not in item else max_tokens(item)
+        return 2 + schema.get("maxItems", 10) * (per + 1)
+    if t == "integer":
+        return 4
+    return STR_TOKENS
+
+def fmt(task: str, **sizes):
+    """Valeur du champ "format" : schéma JSON (clés compactes) ou "json"."""
+    return TASKS[task].schema(**sizes) if ENABLED else "json"
+
+def required(task: str) -> tuple:
+    """Clés à attendre avant l'arrêt anticipé du streaming."""
+    t = TASKS[task]
+    return tuple(t.keys) if ENABLED else tuple(t.keys.values())
+
+def shape(task: str) -> str:
+    return TASKS[task].shape()
+
+def expand(task: str, data: dict) -> dict:
+    return TASKS[task].expand(data)
+
+def force_json(s: str) -> dict:
+    # ancien rattrapage (format:"json" sans schéma) : premier {...} de la réponse
+    try:
+        return json.loads(s)
+    except Exception:
+        m = re.search(r"\{.*\}", s, flags=re.S)
+        if not m:
+            return {}
+        try:
+            return json.loads(m.group(0))
+        except Exception:
+            return {}
+
+def parse(task: str, raw: str) -> dict:
+    """Réponse → dict aux clés complètes. En mode schéma, une sortie invalide lève ValueError
+    (l'item est compté en échec au lieu d'être rempli silencieusement)."""
+    if not ENABLED:
+        return force_json(raw)
+    data = json.loads(raw)
+    if not isinstance(data, dict) or any(k not in data for k in TASKS[task].keys):
+        raise ValueError(f"sortie hors schéma ({task}): {raw[:200]}")
+    return expand(task, data)
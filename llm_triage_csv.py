@@ -1,7 +1,14 @@
 # llm_triage_csv.py
-import csv, json, time, sys, multiprocessing
+import csv, json, time, sys
 from pathlib import Path
-import requests
+from ollama_client import compose, get_ollama, timing, usage
+import llm_schemas
+import token_window
+import llm_cascade
+from llm_dispatch import imap_ordered, RunStats
+import email_batch
+from model_residency import resident
+from rules_triage_csv import classify_rules
 
 try:
     sys.stdout.reconfigure(encoding="utf-8")
@@ -14,41 +21,31 @@ OUT = Path("results_email/results_llm.jsonl")
 OUT.parent.mkdir(parents=True, exist_ok=True)
 
 MODEL = "mistral"
-OLLAMA_URL = "http://localhost:11434/api/generate"
+OLLAMA = get_ollama()   # profil "email" : num_predict 40, num_ctx 1024
 
 SYSTEM = (
     "You are an email spam classifier. Output ONLY valid JSON with this exact schema:\n"
-    "{\"label\":\"spam_or_other\"}\n"
+    + llm_schemas.shape("spam") + "\n"
     "Allowed labels: spam, other."
 )
 
-PROMPT_TMPL = (
-    "Classify this email as 'spam' or 'other'.\n"
-    "Email:\n----\n{email}\n----\n"
-    "Return ONLY the JSON."
-)
+# consignes statiques (tête + rappel final) / contenu propre à l'email — cf. ollama_client.compose
+PROMPT_HEAD = "Classify this email as 'spam' or 'other'.\n"
+PROMPT_BODY = "Email:\n----\n{email}\n----\n"
+PROMPT_TAIL = "Return ONLY the JSON."
 
-def call_ollama(model: str, prompt: str):
-    payload = {
-        "model": model,
-        "prompt": prompt,
-        "system": SYSTEM,
-        "format": "json",
-        "options": {
-            "temperature": 0,
-            "num_predict": 40,
-            "num_thread": multiprocessing.cpu_count(),
-            "num_ctx": 1024,
-        },
-        "stream": False,
-        "keep_alive": "5m"
-    }
-    r = requests.post(OLLAMA_URL, json=payload, timeout=(10, 35))
-    if r.status_code != 200:
-        raise RuntimeError(f"Ollama {r.status_code}: {r.text}")
-    return r.json()["response"]
+def call_ollama(model: str, email: str):
+    # réponse complète : "response" + "cached" (servie par llm_cache)
+    prefix, prompt = compose(PROMPT_HEAD, PROMPT_BODY.format(email=email), PROMPT_TAIL)
+    return OLLAMA.generate(model, prompt, system=SYSTEM, profile="email", prefix=prefix,
+                           fmt=llm_schemas.fmt("spam"), required=llm_schemas.required("spam"))
 
-def run():
+def email_budget(model=MODEL) -> int:
+    prefix, body = compose(PROMPT_HEAD, PROMPT_BODY.format(email=""), PROMPT_TAIL)
+    return token_window.budget(model, "email", SYSTEM, prefix, body, fmt=llm_schemas.fmt("spam"))
+
+def load_rows():
+    rows = []
     with CSV_PATH.open("r", encoding="utf-8", errors="ignore") as f:
         reader = csv.DictReader(f)
         for i, row in enumerate(reader):
@@ -57,44 +54,98 @@ def run():
             message = row.get("message","") or ""
             label_num = row.get("label")
             gt = "spam" if str(label_num) == "1" else "other"
+            # texte complet : fenêtré en tokens au moment de l'appel (classify / email_batch)
+            text = f"Subject: {subject}\n\n{message}"
+            rows.append((i, text, gt))
+    return rows
+
+def classify(item):
+    i, text, gt = item
+    rule = {"label": classify_rules(text)} if llm_cascade.ENABLED else None
+    t0 = time.time()
+    success, err, pred_label, cached, times = True, "", "other", False, {}
+    try:
+        # LLM_CASCADE=1 : petit modèle d'abord, gros modèle si peu sûr ou en désaccord avec les règles
+        resp = llm_cascade.generate(
+            "spam", lambda m: call_ollama(m, token_window.window(text, email_budget(m), m, kind="email")),
+            MODEL, rule=rule)
+        raw, cached = resp["response"], resp["cached"]
+        times = {**timing(resp), **usage(resp), **llm_cascade.info(resp)}
+        data = llm_schemas.parse("spam", raw)   # schéma : label garanti (sinon échec explicite)
+        lab = str(data.get("label","other")).strip().lower()
+        pred_label = "spam" if lab == "spam" else "other"
+    except Exception as e:
+        success, err = False, repr(e)
 
-            # texte court pour CPU : sujet + début de message
-            text = (f"Subject: {subject}\n\n{message}")[:4000]
-            t0 = time.time()
-            success, err, pred_label = True, "", "other"
-            try:
-                raw = call_ollama(MODEL, PROMPT_TMPL.format(email=text))
-                try:
-                    data = json.loads(raw)           # format:"json" -> déjà du JSON
-                except Exception:
-                    import re
-                    m = re.search(r"\{.*\}", raw, flags=re.S)
-                    data = json.loads(m.group(0)) if m else {"label":"other"}
-                lab = str(data.get("label","other")).strip().lower()
-                pred_label = "spam" if lab == "spam" else "other"
-            except Exception as e:
-                success, err = False, repr(e)
-
-            rec = {
-                "id": f"row_{i:04d}",
-                "variant": "B_LLM",
-                "latency_s": round(time.time()-t0, 3),
-                "success": success,
-                "error": err,
-                "gt": gt,
-                "pred": {"label": pred_label}
-            }
-            OUT.open("a", encoding="utf-8").write(json.dumps(rec, ensure_ascii=False)+"\n")
-            print(f"[LLM] row_{i:04d} -> {pred_label} (gt={gt}) err={err}")
+    return {
+        "id": f"row_{i:04d}",
+        "variant": "B_LLM",
+        "latency_s": round(time.time()-t0, 3),
+        "success": success,
+        "error": err,
+        "gt": gt,
+        "pred": {"label": pred_label},
+        "cached": cached,
+        **times
+    }
+
+def classify_batch(batch):
+    """Un lot (email_batch.pack) → un enregistrement par email ; les emails absents ou mal
+    parsés dans la réponse du lot repassent par classify() (requête unitaire)."""
+    t0 = time.time()
+    labels, infos = email_batch.label_batch(MODEL, batch)
+    lat = round(time.time()-t0, 3)
+    n = infos["batch_size"]
+    share = round(lat / n, 3)   # latence par email (comparable au mode unitaire) ; le lot entier à part
+    extra = {k: infos[k] for k in ("cached", "ttft_s", "t_json_s", "early_stop", "num_ctx", "num_predict", "load_s")
+             if k in infos}
+    recs = []
+    for (item, _), lab in zip(batch, labels):
+        if lab is None:
+            rec = classify(item)   # latence = part du lot raté + requête unitaire
+            recs.append({**rec, "latency_s": round(share + rec["latency_s"], 3), "batch_size": n,
+                         "batch_latency_s": lat, "fallback": True,
+                         **({"batch_error": infos["error"]} if infos["error"] else {})})
+            continue
+        i, _, gt = item
+        recs.append({
+            "id": f"row_{i:04d}",
+            "variant": "B_LLM",
+            "latency_s": share,
+            "batch_latency_s": lat,
+            "success": True,
+            "error": "",
+            "gt": gt,
+            "pred": {"label": lab},
+            "batch_size": n,
+            "eval_count": round(infos.get("eval_count", 0) / n, 1),
+            **extra
+        })
+    return recs
+
+def iter_records(rows):
+    # LLM_BATCH=N : lots d'emails (email_batch.py), sinon un email par requête
+    if email_batch.BATCH > 1:
+        for recs in imap_ordered(classify_batch, email_batch.pack([(r, r[1]) for r in rows], MODEL)):
+            yield from recs
+    else:
+        yield from imap_ordered(classify, rows)
+
+def run():
+    # LLM_PARALLEL=K requêtes en vol ; les lignes sont écrites dans l'ordre du CSV
+    stats = RunStats()
+    for rec in iter_records(load_rows()):
+        stats.add(rec)
+        OUT.open("a", encoding="utf-8").write(json.dumps(rec, ensure_ascii=False)+"\n")
+        print(f"[LLM] {rec['id']} -> {rec['pred']['label']} (gt={rec['gt']}) err={rec['error']}")
+    stats.report("LLM")
+    if OLLAMA.cache is not None:
+        OLLAMA.cache.report()
 
 if __name__ == "__main__":
-    # petit pré-chauffage recommandé
-    try:
-        requests.post(OLLAMA_URL, json={
-            "model": MODEL, "prompt": "{}", "format":"json", "stream": False
-        }, timeout=(5,10))
-    except Exception:
-        pass
-    run()
+    # modèle chargé et confirmé avant la boucle chronométrée (temps de chargement consigné à part)
+    with resident(OLLAMA, llm_cascade.models(MODEL), profile="email_batch" if email_batch.BATCH > 1 else "email",
+                  tag="B_LLM"):
+        run()
 
 
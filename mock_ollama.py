@@ -0,0 +1,335 @@
+# mock_ollama.py — faux serveur Ollama local et déterministe : mesure du surcoût de NOTRE
+# chaîne (HTTP, JSON, post-traitement, écritures) sans modèle installé.
+# Sous-ensemble de l'API utilisé par ollama_client / model_residency :
+# - POST /api/generate : "stream" true (NDJSON token par token) ou false, num_predict respecté,
+#   prompt vide = chargement seul (keep_alive) ; coupure du flux côté client = génération annulée
+# - GET /api/ps (modèles chargés), GET /api/tags (digest stable par nom de modèle)
+# - réponses : canned (motif regex → texte, cherché dans system + prompt) sinon sortie conforme
+#   au schéma "format" (tirage déterministe, graine = sha256 du prompt) ; "json" seul → {}
+# - délais simulés : chargement (modèle absent ou num_ctx changé), prefill par token de prompt
+#   NON couvert par le préfixe de l'appel précédent (comme le cache KV d'Ollama), délai par token généré
+# - "logprobs": true → logprob déterministe par token (ponctuation JSON quasi certaine)
+#
+# Réglages (env) : MOCK_TOKEN_MS=0  MOCK_PREFILL_MS=0  MOCK_LOAD_S=0  MOCK_CANNED=fichier.json
+# Serveur seul :   python mock_ollama.py [port=11435]
+# Runners contre le faux serveur (même chaîne complète, aucun modèle requis) :
+#   OLLAMA_HOST=http://127.0.0.1:11435 python llm_triage_csv.py   (idem invoice_llm, invoices_llm_select,
+#   hybrid_triage ; LLM_CACHE=0 pour ne pas mélanger avec le cache des vrais modèles)
+# Dans un bench :  OLLAMA_MOCK=1 python bench_email_batch.py   (cf. attach)
+# Auto-contrôle :  python mock_ollama.py --selftest   (llm_triage_csv, hybrid_triage, invoice_llm,
+#                  invoices_llm_select et llm_runner sur cache de pages pré-rempli, de bout en bout sur
+#                  des données synthétiques dans un répertoire temporaire)
+import hashlib, json, os, random, re, sys, threading, time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TOKEN_MS   = float(os.getenv("MOCK_TOKEN_MS", "0"))
+PREFILL_MS = float(os.getenv("MOCK_PREFILL_MS", "0"))
+LOAD_S     = float(os.getenv("MOCK_LOAD_S", "0"))
+CANNED     = os.getenv("MOCK_CANNED", "")
+MODELS = ("mistral:latest", "llama3.2:1b")    # modèles des scripts (installés d'office dans /api/tags)
+CHARS_PER_TOKEN = 4
+WORDS = ["acme", "paris", "lyon", "data", "python", "2024-01-15", "42.00", "inv-001", "remote"]
+_TOKEN = re.compile(r"\s*\w+|\s*[^\w\s]+|\s+")
+
+def _now():
+    return datetime.now(timezone.utc)
+
+def _name(model: str) -> str:
+    return model if ":" in model else f"{model}:latest"
+
+def _duration(spec) -> float:
+    """keep_alive Ollama ("5m", "30s", secondes) → secondes."""
+    if isinstance(spec, (int, float)):
+        return float(spec)
+    m = re.fullmatch(r"(\d+(?:\.\d+)?)(ms|s|m|h)?", str(spec).strip())
+    if not m:
+        return 300.0
+    return float(m.group(1)) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600, None: 1}[m.group(2)]
+
+def tokens(text: str):
+    """Pseudo-tokens proches d'un BPE : mot, ou suite de ponctuation, avec l'espace qui précède."""
+    return _TOKEN.findall(text)
+
+def sample(schema: dict, rng: random.Random, pos=None):
+    """Valeur conforme au schéma. Dans un tableau, un enum d'entiers suit la position de
+    l'élément (indices de lot "i" distincts, comme un modèle qui numérote correctement)."""
+    if "enum" in schema:
+        vals = schema["enum"]
+        if pos is not None and all(isinstance(v, int) for v in vals):
+            return vals[pos % len(vals)]
+        return rng.choice(vals)
+    t = schema.get("type")
+    if t == "object":
+        return {k: sample(p, rng, pos) for k, p in schema.get("properties", {}).items()}
+    if t == "array":
+        n = schema.get("minItems", min(2, schema.get("maxItems", 2)))
+        return [sample(schema["items"], rng, j) for j in range(n)]
+    if t == "integer":
+        return rng.randint(0, 3)
+    if t == "number":
+        return round(rng.uniform(0, 100), 2)
+    if t == "boolean":
+        return rng.random() < 0.5
+    return rng.choice(WORDS)
+
+class MockOllama:
+    def __init__(self, port=0, token_ms=TOKEN_MS, prefill_ms=PREFILL_MS, load_s=LOAD_S, canned=None):
+        self.token_ms, self.prefill_ms, self.load_s = token_ms, prefill_ms, load_s
+        self.canned = [(re.compile(p), r) for p, r in (canned or {}).items()]
+        self.loaded = {}            # nom → {"num_ctx", "expires"}
+        self._last = {}             # nom → texte du dernier prompt (simulation du cache KV)
+        self._lock = threading.Lock()
+        self.calls = self.cancelled = self.loads = 0
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            wbufsize = 1 << 16
+            def log_message(self, *a): pass
+            def handle(self):
+                # coupure après un arrêt anticipé : détectée à l'écriture du flux ou à la
+                # lecture de la requête suivante sur la même connexion
+                try:
+                    super().handle()
+                except (BrokenPipeError, ConnectionResetError):
+                    with mock._lock:
+                        mock.cancelled += 1
+            def finish(self):
+                try:   # vidage du tampon d'écriture vers un client déjà parti
+                    super().finish()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+            def do_GET(self):
+                if self.path == "/api/ps":
+                    self._json(200, {"models": mock.ps()})
+                elif self.path == "/api/tags":
+                    self._json(200, {"models": mock.tags()})
+                else:
+                    self._json(404, {"error": f"{self.path} non simulé"})
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if self.path != "/api/generate":
+                    return self._json(404, {"error": f"{self.path} non simulé"})
+                if not body.get("model"):
+                    return self._json(400, {"error": "model is required"})
+                mock.generate(self, body)
+            def _json(self, status, obj):
+                data = json.dumps(obj).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            def _chunk(self, obj):
+                data = json.dumps(obj).encode("utf-8") + b"\n"
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self.host = f"http://127.0.0.1:{self.server.server_port}"
+
+    # --- état simulé ---
+    def ps(self):
+        now = _now()
+        with self._lock:
+            for name in [n for n, m in self.loaded.items() if m["expires"] < now]:
+                del self.loaded[name]
+            return [{"name": n, "model": n, "size": 4_000_000_000, "size_vram": 0,
+                     "digest": self.digest(n), "context_length": m["num_ctx"],
+                     "expires_at": m["expires"].isoformat()} for n, m in self.loaded.items()]
+
+    def tags(self):
+        names = set(MODELS) | set(self.loaded)
+        return [{"name": n, "model": n, "digest": self.digest(n)} for n in sorted(names)]
+
+    def digest(self, name: str) -> str:
+        return hashlib.sha256(_name(name).encode("utf-8")).hexdigest()
+
+    def _load(self, name, num_ctx, keep_alive) -> float:
+        """→ durée de chargement simulée (0 si déjà chargé avec le même num_ctx)."""
+        expires = _now() + timedelta(seconds=_duration(keep_alive))
+        with self._lock:
+            cur = self.loaded.get(name)
+            reload = cur is None or cur["expires"] < _now() or cur["num_ctx"] != num_ctx
+            self.loaded[name] = {"num_ctx": num_ctx, "expires": expires}
+            if reload:
+                self.loads += 1
+                self._last.pop(name, None)    # nouveau contexte : cache KV vide
+        if reload and self.load_s:
+            time.sleep(self.load_s)
+        return self.load_s if reload else 0.0
+
+    def respond(self, body) -> str:
+        text = body.get("system", "") + "\n" + body.get("prompt", "")
+        for pat, resp in self.canned:
+            if pat.search(text):
+                return resp
+        fmt = body.get("format")
+        if isinstance(fmt, dict):
+            rng = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+            return json.dumps(sample(fmt, rng), ensure_ascii=False, separators=(",", ":"))
+        return "{}" if fmt == "json" else "ok"
+
+    def logprobs(self, body, toks):
+        rng = random.Random(hashlib.sha256((body["model"] + body.get("prompt", "")).encode("utf-8")).digest())
+        return [{"token": t, "logprob": round(-rng.expovariate(40 if re.search(r"\w", t) else 2000), 4)}
+                for t in toks]
+
+    def generate(self, h, body):
+        name, opts = _name(body["model"]), body.get("options", {})
+        t0 = time.perf_counter()
+        load = self._load(name, opts.get("num_ctx", 2048), body.get("keep_alive", "5m"))
+        with self._lock:
+            self.calls += 1
+        base = {"model": body["model"], "created_at": _now().isoformat()}
+        if not body.get("prompt"):
+            return h._json(200, {**base, "response": "", "done": True, "done_reason": "load",
+                                 "load_duration": int(load * 1e9)})
+        # prefill : seuls les tokens après le préfixe commun avec l'appel précédent sont évalués
+        full = body.get("system", "") + "\n" + body["prompt"]
+        with self._lock:
+            common = len(os.path.commonprefix([self._last.get(name, ""), full]))
+            self._last[name] = full
+        n_prompt = max(1, (len(full) - common) // CHARS_PER_TOKEN)
+        prefill = n_prompt * self.prefill_ms / 1000
+        time.sleep(prefill)
+        toks = tokens(self.respond(body))
+        limit = opts.get("num_predict", -1)
+        reason = "stop"
+        if 0 <= limit < len(toks):
+            toks, reason = toks[:limit], "length"
+        lps = self.logprobs(body, toks) if body.get("logprobs") else None
+
+        def final(n):
+            total = time.perf_counter() - t0
+            return {**base, "response": "", "done": True, "done_reason": reason,
+                    "total_duration": int(total * 1e9), "load_duration": int(load * 1e9),
+                    "prompt_eval_count": n_prompt, "prompt_eval_duration": int(prefill * 1e9),
+                    "eval_count": n, "eval_duration": int(n * self.token_ms * 1e6)}
+
+        if not body.get("stream", True):
+            time.sleep(len(toks) * self.token_ms / 1000)
+            out = {**final(len(toks)), "response": "".join(toks)}
+            return h._json(200, {**out, "logprobs": lps} if lps is not None else out)
+        h.send_response(200)
+        h.send_header("Content-Type", "application/x-ndjson")
+        h.send_header("Transfer-Encoding", "chunked")
+        h.end_headers()
+        # client parti (arrêt anticipé) → BrokenPipe ici, compté dans Handler.handle : génération annulée
+        for j, tok in enumerate(toks):
+            time.sleep(self.token_ms / 1000)
+            chunk = {**base, "response": tok, "done": False}
+            h._chunk({**chunk, "logprobs": [lps[j]]} if lps is not None else chunk)
+        h._chunk(final(len(toks)))
+        h.wfile.write(b"0\r\n\r\n")
+
+    # --- cycle de vie ---
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def report(self, tag="MOCK"):
+        print(f"[{tag}] {self.calls} appels | chargements={self.loads} | flux coupés={self.cancelled} | "
+              f"token={self.token_ms}ms prefill={self.prefill_ms}ms/token load={self.load_s}s")
+
+def load_canned(path=CANNED) -> dict:
+    return json.loads(open(path, encoding="utf-8").read()) if path else {}
+
+def attach(*clients, **cfg) -> MockOllama:
+    """Démarre un faux serveur (réglages MOCK_* sauf cfg) et y redirige les clients."""
+    cfg.setdefault("canned", load_canned())
+    mock = MockOllama(**cfg).start()
+    for c in clients:
+        c.host = mock.host
+        c._digests.clear()
+    print(f"[MOCK] faux Ollama sur {mock.host}")
+    return mock
+
+def enabled() -> bool:
+    return os.getenv("OLLAMA_MOCK", "0") == "1"
+
+# ========= AUTO-CONTRÔLE (runners de bout en bout) =========
+N_EMAILS, N_INVOICES, N_PAGES = 8, 5, 3
+
+def _selftest_data(tmp):
+    """Données synthétiques dans `tmp` : emails (CSV), factures (JSONL), URLs d'offres dont le texte
+    est déjà dans le cache de pages (llm_runner le lit sans navigateur)."""
+    import csv
+    from page_cache import PageCache
+
+    (tmp / "data/fatura_subset").mkdir(parents=True)
+    with (tmp / "data/messages.csv").open("w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["subject", "message", "label"])
+        for i in range(N_EMAILS):    # moitié spam (suspects → LLM dans hybrid_triage), moitié non
+            if i % 2:
+                w.writerow([f"Offer {i}", "Win a free prize, click here. " * (i + 1), 1])
+            else:
+                w.writerow([f"Réunion {i}", "Bonjour, le compte rendu est en pièce jointe. " * (i + 1), 0])
+    with (tmp / "data/fatura_subset/items.jsonl").open("w", encoding="utf-8") as f:
+        for i in range(N_INVOICES):
+            text = f"ACME SARL\nInvoice No: INV-{i:03d}\nDate: 2024-01-1{i}\nTotal TTC: {120 + i},50 EUR"
+            f.write(json.dumps({"id": f"inv_{i}", "text": text}) + "\n")
+    cache = PageCache(tmp / "cache")
+    urls = [f"https://jobs.example.org/offre/{i}" for i in range(N_PAGES)]
+    for i, url in enumerate(urls):
+        cache.put(url, f"Data Analyst {i}\nAcme\nParis\nSalaire : 45-55 k€\nCDI\n"
+                       f"Compétences : SQL, Python\nDescription\n" + "Analyse de données produit. " * 20)
+    cache.db.close()
+    (tmp / "data/urls.txt").write_text("\n".join(urls) + "\n", encoding="utf-8")
+
+def _selftest():
+    """Chaque runner de bout en bout contre le faux serveur : un enregistrement par entrée, tous en succès."""
+    import importlib.util, subprocess, tempfile
+    from pathlib import Path
+
+    here = Path(__file__).resolve().parent
+    runs = [  # (script, arguments, sortie, enregistrements attendus)
+        ("llm_triage_csv.py", [], "results_email/results_llm.jsonl", N_EMAILS),
+        ("hybrid_triage.py", [], "results_email/results_hybrid.jsonl", N_EMAILS),
+        ("invoice_llm.py", [], "results_invoice/llm.jsonl", N_INVOICES),
+        ("invoices_llm_select.py", [], "results_invoice/llm_select.jsonl", N_INVOICES),
+        ("llm_runner.py", ["--batch"], "results/results_llm.jsonl", N_PAGES),
+    ]
+    if importlib.util.find_spec("playwright") is None:
+        # llm_runner importe Playwright (repli navigateur) même quand tout le texte est en cache
+        print("⚠️  llm_runner.py ignoré : playwright n'est pas installé")
+        runs = [r for r in runs if r[0] != "llm_runner.py"]
+    mock = MockOllama().start()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            _selftest_data(tmp)
+            env = {**os.environ, "OLLAMA_HOST": mock.host, "LLM_CACHE": "0", "SNAPSHOT": "off",
+                   "PAGE_CACHE_DIR": str(tmp / "cache"), "PYTHONIOENCODING": "utf-8"}
+            for script, args, out, expected in runs:
+                t0 = time.time()
+                p = subprocess.run([sys.executable, str(here / script), *args], cwd=tmp, env=env,
+                                   capture_output=True, text=True, timeout=300)
+                assert p.returncode == 0, f"{script} : code {p.returncode}\n{p.stderr[-2000:]}"
+                recs = [json.loads(l) for l in (tmp / out).read_text(encoding="utf-8").splitlines()]
+                assert len(recs) == expected, f"{script} : {len(recs)} enregistrements pour {expected} entrées"
+                bad = [r for r in recs if not r["success"]]
+                assert not bad, f"{script} : {len(bad)}/{len(recs)} échecs ({bad[0]['id']}: {bad[0]['error']})"
+                print(f"✅ {script} : {len(recs)}/{expected} enregistrements, tous en succès ({time.time() - t0:.1f}s)")
+        mock.report()
+    finally:
+        mock.stop()
+
+if __name__ == "__main__":
+    if "--selftest" in sys.argv:
+        _selftest()
+        sys.exit(0)
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 11435
+    mock = MockOllama(port=port, canned=load_canned())
+    print(f"[MOCK] faux Ollama sur {mock.host} (Ctrl+C pour arrêter)")
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        mock.report()
@@ -0,0 +1,119 @@
+# model_residency.py — modèles chargés AVANT la boucle chronométrée (remplace les warmup)
+# - chargement explicite (prompt vide + keep_alive) avec les options du profil : même num_ctx que
+#   les vraies requêtes, sinon Ollama recharge au premier item
+# - confirmation par l'API des modèles en mémoire (GET /api/ps)
+# - battement périodique pendant les longs runs (keep_alive prolongé avant expiration)
+# - temps de chargement enregistré à part (results/residency.jsonl), hors latence par item
+#
+# Usage :
+#   with resident(OLLAMA, MODEL, profile="email", tag="LLM"):
+#       run()
+# Contrôle :  python model_residency.py [modèle ...]   (état de /api/ps, charge les modèles donnés)
+import json, sys, threading, time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+from ollama_client import CONNECT_TIMEOUT_S, KEEP_ALIVE, PROFILES, OllamaError, get_ollama
+
+LOG = Path("results/residency.jsonl")
+LOAD_TIMEOUT_S = 300        # premier chargement d'un gros modèle depuis le disque
+CONFIRM_TIMEOUT_S = 10      # délai pour voir le modèle apparaître dans /api/ps
+HEARTBEAT_S = 60            # rafraîchit keep_alive bien avant son expiration (KEEP_ALIVE = 5m)
+
+def _same(a: str, b: str) -> bool:
+    norm = lambda m: m if ":" in m else f"{m}:latest"
+    return norm(a) == norm(b)
+
+class Residency:
+    def __init__(self, client=None):
+        self.client = client or get_ollama()
+        self._stop = threading.Event()
+        self._beat = None
+
+    def running(self) -> dict:
+        """Modèles en mémoire : {nom: entrée /api/ps (size, size_vram, expires_at...)}."""
+        r = self.client.session.get(f"{self.client.host}/api/ps", timeout=(CONNECT_TIMEOUT_S, 10))
+        r.raise_for_status()
+        return {m["name"]: m for m in r.json().get("models", [])}
+
+    def is_resident(self, model: str) -> bool:
+        try:
+            return any(_same(name, model) for name in self.running())
+        except Exception:
+            return False
+
+    def _options(self, profile):
+        # options qui conditionnent le chargement (num_ctx, threads) ; pas de génération
+        return {k: v for k, v in PROFILES[profile]["options"].items() if k != "num_predict"}
+
+    def load(self, model: str, profile="web") -> dict:
+        """Charge (ou garde) le modèle avec les options du profil → métriques de chargement."""
+        was = self.is_resident(model)
+        opts = self._options(profile)
+        t0 = time.time()
+        body = self.client.post("/api/generate",
+                                {"model": model, "prompt": "", "keep_alive": KEEP_ALIVE, "stream": False,
+                                 "options": opts},
+                                read_timeout=LOAD_TIMEOUT_S)
+        wall = time.time() - t0
+        deadline = time.time() + CONFIRM_TIMEOUT_S
+        while not self.is_resident(model):
+            if time.time() > deadline:
+                raise OllamaError(f"{model} absent de /api/ps après chargement")
+            time.sleep(0.2)
+        # les requêtes suivantes ne descendent pas sous ce num_ctx (pas de rechargement)
+        self.client.pin_ctx(model, opts["num_ctx"])
+        return {"model": model, "profile": profile, "was_resident": was, "num_ctx": opts["num_ctx"],
+                "load_s": round(body.get("load_duration", 0) / 1e9, 3), "wall_s": round(wall, 3)}
+
+    def _heartbeat(self, models, profile):
+        opts = self._options(profile)
+        while not self._stop.wait(HEARTBEAT_S):
+            for m in models:
+                # num_ctx courant du client (OllamaClient.size a pu monter de palier) : un autre
+                # num_ctx ferait recharger le modèle en plein run
+                beat = {**opts, "num_ctx": self.client.current_ctx(m, opts["num_ctx"])}
+                try:
+                    self.client.post("/api/generate", {"model": m, "prompt": "", "keep_alive": KEEP_ALIVE,
+                                                       "stream": False, "options": beat}, read_timeout=LOAD_TIMEOUT_S)
+                except Exception as e:
+                    print(f"[RESIDENCY] battement {m} en échec : {e!r}")
+
+    def keep(self, models, profile="web"):
+        self._stop.clear()
+        self._beat = threading.Thread(target=self._heartbeat, args=(list(models), profile), daemon=True)
+        self._beat.start()
+
+    def release(self):
+        self._stop.set()
+        if self._beat is not None:
+            self._beat.join(timeout=1)
+            self._beat = None
+
+def log(rec: dict, tag: str):
+    LOG.parent.mkdir(parents=True, exist_ok=True)
+    rec = {"ts": datetime.now(timezone.utc).isoformat(timespec="seconds"), "tag": tag, **rec}
+    LOG.open("a", encoding="utf-8").write(json.dumps(rec, ensure_ascii=False) + "\n")
+    state = "déjà résident" if rec["was_resident"] else f"chargé en {rec['load_s']:.1f}s"
+    print(f"[RESIDENCY] {rec['model']} ({rec['profile']}, num_ctx={rec['num_ctx']}) : {state}")
+
+@contextmanager
+def resident(client, models, profile="web", tag="LLM"):
+    """Charge et confirme les modèles avant le bloc, les garde chargés pendant, consigne les temps."""
+    models = [models] if isinstance(models, str) else list(models)
+    res = Residency(client)
+    for m in models:
+        log(res.load(m, profile), tag)
+    res.keep(models, profile)
+    try:
+        yield res
+    finally:
+        res.release()
+
+if __name__ == "__main__":
+    res = Residency()
+    for m in sys.argv[1:]:
+        log(res.load(m), "CLI")
+    for name, m in res.running().items():
+        print(f"{name:<30} {m.get('size', 0)/1e9:.1f} Go  expire {m.get('expires_at', '')}")
@@ -0,0 +1,148 @@
+# net_filter.py — filtrage réseau commun à tous les chemins Playwright
+# On ne lit que du texte : images, polices, médias et traqueurs ne servent à rien.
+#
+# Réglage par variable d'environnement :
+#   NET_FILTER=on       (défaut) bloque selon la politique
+#   NET_FILTER=observe  ne bloque rien mais mesure (référence pour estimer les octets évités)
+#   NET_FILTER=off      n'installe rien
+import json, os, time
+from collections import Counter
+from pathlib import Path
+from urllib.parse import urlparse
+
+MODE = os.getenv("NET_FILTER", "on").lower()
+BASELINE = Path("results/net_baseline.json")   # taille moyenne par type, mesurée en mode observe
+
+BLOCK_TYPES = {"image", "font", "media"}
+BLOCK_DOMAINS = {
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net", "facebook.net",
+    "facebook.com", "hotjar.com", "segment.io", "segment.com", "criteo.com", "criteo.net",
+    "bing.com", "linkedin.com", "licdn.com", "tiktok.com", "didomi.io", "datadoghq-browser-agent.com",
+    "sentry.io", "amplitude.com", "mixpanel.com", "intercom.io", "clarity.ms",
+}
+
+# lecture de la mémoire JS d'une page (Chromium uniquement)
+JS_HEAP = "() => (performance.memory ? performance.memory.usedJSHeapSize : 0)"
+
+def _domain_match(host: str, domains) -> bool:
+    host = host.lower()
+    return any(host == d or host.endswith("." + d) for d in domains)
+
+class NetPolicy:
+    """Politique allow/deny par type de ressource et par domaine (allow prioritaire)."""
+    def __init__(self, block_types=BLOCK_TYPES, block_domains=BLOCK_DOMAINS,
+                 allow_domains=(), allow_types=("document",)):
+        self.block_types = set(block_types)
+        self.block_domains = set(block_domains)
+        self.allow_domains = set(allow_domains)
+        self.allow_types = set(allow_types)
+
+    def reason(self, resource_type: str, url: str) -> str:
+        """'' si la requête passe, sinon 'type:<t>' ou 'domain:<host>'."""
+        if resource_type in self.allow_types:
+            return ""
+        host = urlparse(url).hostname or ""
+        if self.allow_domains and _domain_match(host, self.allow_domains):
+            return ""
+        if resource_type in self.block_types:
+            return f"type:{resource_type}"
+        if _domain_match(host, self.block_domains):
+            return f"domain:{host}"
+        return ""
+
+class NetFilter:
+    """Intercepte les requêtes d'un contexte Playwright et compte ce qui est évité/chargé."""
+    def __init__(self, policy: NetPolicy = None, mode: str = MODE):
+        self.policy = policy or NetPolicy()
+        self.mode = mode
+        self.blocked = Counter()        # par type de ressource
+        self.loaded = Counter()         # requêtes chargées par type
+        self.loaded_bytes = Counter()   # octets chargés par type (content-length)
+        self.heap = []                  # usedJSHeapSize par page
+        self.pages = 0
+        self.t_load = 0.0
+
+    # --- installation (sync / async)
+    def install(self, ctx):
+        if self.mode == "off":
+            return ctx
+        ctx.on("response", self._on_response)
+        if self.mode == "on":
+            ctx.route("**/*", self._route)
+        return ctx
+
+    async def install_async(self, ctx):
+        if self.mode == "off":
+            return ctx
+        ctx.on("response", self._on_response)
+        if self.mode == "on":
+            await ctx.route("**/*", self._route_async)
+        return ctx
+
+    def _route(self, route):
+        req = route.request
+        if self.policy.reason(req.resource_type, req.url):
+            self.blocked[req.resource_type] += 1
+            route.abort()
+        else:
+            route.continue_()
+
+    async def _route_async(self, route):
+        req = route.request
+        if self.policy.reason(req.resource_type, req.url):
+            self.blocked[req.resource_type] += 1
+            await route.abort()
+        else:
+            await route.continue_()
+
+    def _on_response(self, response):
+        try:
+            rtype = response.request.resource_type
+            self.loaded[rtype] += 1
+            self.loaded_bytes[rtype] += int(response.headers.get("content-length", 0) or 0)
+        except Exception:
+            pass
+
+    # --- mesures par page
+    def note_page(self, heap_bytes=0, load_s=0.0):
+        self.pages += 1
+        self.t_load += load_s
+        if heap_bytes:
+            self.heap.append(heap_bytes)
+
+    def summary(self) -> dict:
+        avg = _load_baseline()
+        avoided_bytes = sum(n * avg.get(t, 0) for t, n in self.blocked.items())
+        return {
+            "mode": self.mode,
+            "pages": self.pages,
+            "blocked_requests": sum(self.blocked.values()),
+            "blocked_by_type": dict(self.blocked),
+            "avoided_bytes_est": int(avoided_bytes),
+            "loaded_requests": sum(self.loaded.values()),
+            "loaded_bytes": sum(self.loaded_bytes.values()),
+            "avg_load_s": round(self.t_load / self.pages, 3) if self.pages else 0.0,
+            "avg_heap_mb": round(sum(self.heap) / len(self.heap) / 1e6, 1) if self.heap else 0.0,
+        }
+
+    def report(self, tag="NET"):
+        s = self.summary()
+        if self.mode == "observe":
+            save_baseline(self)
+        print(f"[{tag}] mode={s['mode']} pages={s['pages']} | bloquées={s['blocked_requests']} "
+              f"(~{s['avoided_bytes_est']/1e6:.1f} Mo évités) | chargées={s['loaded_requests']} "
+              f"({s['loaded_bytes']/1e6:.1f} Mo) | chargement moyen={s['avg_load_s']}s | "
+              f"heap JS moyen={s['avg_heap_mb']} Mo")
+        return s
+
+def _load_baseline() -> dict:
+    try:
+        return json.loads(BASELINE.read_text(encoding="utf-8")).get("avg_bytes", {})
+    except Exception:
+        return {}
+
+def save_baseline(nf: NetFilter):
+    """Enregistre la taille moyenne par type (mode observe) pour estimer les octets évités."""
+    avg = {t: nf.loaded_bytes[t] / n for t, n in nf.loaded.items() if n}
+    BASELINE.parent.mkdir(parents=True, exist_ok=True)
+    BASELINE.write_text(json.dumps({"ts": time.time(), "avg_bytes": avg}, indent=2), encoding="utf-8")
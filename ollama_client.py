@@ -0,0 +1,312 @@
+# ollama_client.py — client Ollama partagé (remplace les copies de call_ollama)
+# - une session HTTP keep-alive pour tout le processus
+# - profils d'options par tâche (web, email, email_hybrid, email_batch, invoice, invoice_select)
+# - timeouts uniformes et erreurs typées (OllamaError et sous-classes)
+# - cache disque des réponses déterministes (llm_cache.py, LLM_CACHE=0 pour le contourner)
+# - streaming avec arrêt dès qu'un objet JSON complet et valide est arrivé (LLM_STREAM=0 pour
+#   revenir à "stream": false) ; temps au 1er token et au JSON valide mesurés par appel
+# - réutilisation du préfixe : consignes statiques en tête du prompt (compose) pour qu'Ollama
+#   reprenne son cache KV d'un item à l'autre, num_keep couvrant ce préfixe (LLM_PREFIX=0 : ancien ordre)
+# - dimensionnement par requête (LLM_ADAPT=0 : valeurs fixes des profils) : num_predict borné par le
+#   schéma de sortie, num_ctx = palier CTX_BUCKETS couvrant prompt + sortie
+# - logprobs des tokens générés demandés avec LLM_LOGPROBS=1 (activé par LLM_CASCADE=1, cf. llm_cascade.py)
+#
+# Hôte : variable d'environnement OLLAMA_HOST (défaut http://localhost:11434)
+import json, multiprocessing, os, threading, time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import llm_cache
+import llm_schemas
+
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434").rstrip("/")
+CONNECT_TIMEOUT_S = 10
+KEEP_ALIVE = "5m"
+STREAM = os.getenv("LLM_STREAM", "1") != "0"
+PREFIX = os.getenv("LLM_PREFIX", "1") != "0"
+CHARS_PER_TOKEN = 4     # estimation pour num_keep (pas besoin du tokenizer exact)
+ADAPT = os.getenv("LLM_ADAPT", "1") != "0"
+# paliers de num_ctx : peu de valeurs distinctes → peu de rechargements du modèle
+CTX_BUCKETS = (512, 1024, 2048, 4096, 8192)
+LOGPROBS = os.getenv("LLM_LOGPROBS", os.getenv("LLM_CASCADE", "0")) == "1"
+
+_BASE = {"temperature": 0, "num_thread": multiprocessing.cpu_count()}
+
+# options de décodage + timeout (connexion, lecture) par tâche
+PROFILES = {
+    "web":            {"options": {**_BASE, "num_predict": 80, "num_ctx": 2048, "top_p": 0.9}, "read_timeout": 60},
+    "email":          {"options": {**_BASE, "num_predict": 40, "num_ctx": 1024}, "read_timeout": 35},
+    "email_hybrid":   {"options": {**_BASE, "num_predict": 25, "num_ctx": 768},  "read_timeout": 30},
+    # lots d'emails (email_batch.py) : num_predict recalculé par lot, taille de lot bornée par num_ctx
+    "email_batch":    {"options": {**_BASE, "num_predict": 400, "num_ctx": 4096}, "read_timeout": 180},
+    "invoice":        {"options": {**_BASE, "num_predict": 80, "num_ctx": 1024}, "read_timeout": 35},
+    "invoice_select": {"options": {**_BASE, "num_predict": 50, "num_ctx": 768},  "read_timeout": 35},
+}
+
+class OllamaError(RuntimeError):
+    """Erreur d'appel Ollama (classe de base)."""
+
+class OllamaUnavailable(OllamaError):
+    """Serveur injoignable (connexion refusée / DNS)."""
+
+class OllamaTimeout(OllamaError):
+    """Pas de réponse dans le délai du profil."""
+
+class OllamaHTTPError(OllamaError):
+    """Statut HTTP != 200 (modèle absent, requête invalide...)."""
+    def __init__(self, status, body):
+        super().__init__(f"Ollama {status}: {body[:300]}")
+        self.status = status
+
+class JsonObjectScanner:
+    """Suit la profondeur des accolades token par token (chaînes et échappements compris)
+    pour repérer la fermeture du premier objet JSON de premier niveau."""
+    def __init__(self):
+        self.buf = []
+        self.depth = 0
+        self.in_str = self.esc = False
+        self.started = False
+
+    def feed(self, chunk: str):
+        """→ texte de l'objet dès qu'il est fermé, sinon None."""
+        for ch in chunk:
+            if not self.started:
+                if ch != "{":
+                    continue
+                self.started = True
+            self.buf.append(ch)
+            if self.in_str:
+                if self.esc:
+                    self.esc = False
+                elif ch == "\\":
+                    self.esc = True
+                elif ch == '"':
+                    self.in_str = False
+            elif ch == '"':
+                self.in_str = True
+            elif ch == "{":
+                self.depth += 1
+            elif ch == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    return "".join(self.buf)
+        return None
+
+def compose(head: str, body: str, tail: str = ""):
+    """Prompt utilisateur → (préfixe, suite). Avec LLM_PREFIX, toutes les consignes (head + tail)
+    passent avant le contenu propre à l'item : SYSTEM + préfixe sont identiques d'un appel à
+    l'autre et Ollama ne réévalue que la suite. Sinon : ordre historique head + body + tail."""
+    if PREFIX:
+        return head + (tail + "\n" if tail else ""), body
+    return head, body + tail
+
+def predict_tokens(profile: str, fmt=None) -> int:
+    """num_predict d'un appel : borne de la sortie d'après le schéma ("format" dict, LLM_ADAPT),
+    sinon celle du profil. Partagé avec token_window.budget, qui réserve exactement cette sortie :
+    sinon une fenêtre pleine dépasse le num_ctx du profil et fait monter le palier (rechargement)."""
+    if ADAPT and isinstance(fmt, dict):
+        return int(llm_schemas.max_tokens(fmt) * 1.2) + 4
+    return PROFILES[profile]["options"]["num_predict"]
+
+def usage(resp: dict) -> dict:
+    """Compteurs de tokens à recopier dans l'enregistrement (prompt_eval_* absents après un arrêt anticipé)."""
+    out = {"eval_count": resp.get("eval_count", 0)}
+    if "num_ctx" in resp:       # valeurs choisies pour cet appel (cf. OllamaClient.size)
+        out["num_ctx"], out["num_predict"] = resp["num_ctx"], resp["num_predict"]
+    if resp.get("load_duration"):   # > 0 : modèle (re)chargé pour cet appel
+        out["load_s"] = round(resp["load_duration"] / 1e9, 3)
+    if "prompt_eval_count" in resp:
+        out["prompt_eval_count"] = resp["prompt_eval_count"]
+        out["prompt_eval_s"] = round(resp.get("prompt_eval_duration", 0) / 1e9, 3)
+    return out
+
+def timing(resp: dict) -> dict:
+    """Champs de chronométrage à recopier dans l'enregistrement (appels en streaming seulement)."""
+    return {k: resp[k] for k in ("ttft_s", "t_json_s", "early_stop") if k in resp}
+
+class OllamaClient:
+    def __init__(self, host=OLLAMA_HOST, pool_size=8, cache=None):
+        self.host = host
+        self.cache = cache
+        self._digests = {}
+        self._ctx = {}              # plus grand palier num_ctx déjà demandé, par modèle
+        self._lock = threading.Lock()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def payload(self, model, prompt, system="", profile="web", fmt="json", options=None, **extra) -> dict:
+        prof = PROFILES[profile]
+        body = {
+            "model": model,
+            "prompt": prompt,
+            "options": {**prof["options"], **(options or {})},
+            "stream": False,
+            "keep_alive": KEEP_ALIVE,
+        }
+        if system:
+            body["system"] = system
+        if fmt:
+            body["format"] = fmt
+        body.update(extra)
+        return body
+
+    def post(self, path, body, read_timeout=60):
+        try:
+            r = self.session.post(f"{self.host}{path}", json=body, timeout=(CONNECT_TIMEOUT_S, read_timeout))
+        except requests.ConnectionError as e:
+            raise OllamaUnavailable(f"{self.host}: {e}") from e
+        except requests.Timeout as e:
+            raise OllamaTimeout(f"{path} > {read_timeout}s") from e
+        if r.status_code != 200:
+            raise OllamaHTTPError(r.status_code, r.text)
+        return r.json()
+
+    def stream(self, path, body, read_timeout=60, required=()):
+        """/api/generate en streaming : s'arrête (fermeture de la connexion → Ollama annule la
+        génération) dès qu'un objet JSON valide contenant les clés `required` est arrivé."""
+        t0 = time.perf_counter()
+        try:
+            r = self.session.post(f"{self.host}{path}", json={**body, "stream": True},
+                                  timeout=(CONNECT_TIMEOUT_S, read_timeout), stream=True)
+        except requests.ConnectionError as e:
+            raise OllamaUnavailable(f"{self.host}: {e}") from e
+        except requests.Timeout as e:
+            raise OllamaTimeout(f"{path} > {read_timeout}s") from e
+        if r.status_code != 200:
+            raise OllamaHTTPError(r.status_code, r.text)
+        scan, parts, lps, out = JsonObjectScanner(), [], [], {}
+        ttft = None
+        try:
+            for line in r.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                tok = chunk.get("response", "")
+                if tok and ttft is None:
+                    ttft = time.perf_counter() - t0
+                parts.append(tok)
+                lps.extend(chunk.get("logprobs") or [])
+                obj = scan.feed(tok) if tok else None
+                if obj is not None:
+                    try:
+                        data = json.loads(obj)
+                    except ValueError:
+                        data = None
+                    if isinstance(data, dict) and all(k in data for k in required):
+                        out = {"response": obj, "done": True, "early_stop": not chunk.get("done"),
+                               "eval_count": len(parts), "t_json_s": round(time.perf_counter() - t0, 3)}
+                        if chunk.get("done"):
+                            out = {**chunk, **out, "eval_count": chunk.get("eval_count", len(parts))}
+                        break
+                if chunk.get("done"):
+                    out = {**chunk, "response": "".join(parts), "early_stop": False}
+                    break
+                if time.perf_counter() - t0 > read_timeout:
+                    raise OllamaTimeout(f"{path} > {read_timeout}s")
+        except requests.RequestException as e:
+            raise OllamaTimeout(f"{path}: flux interrompu ({e})") from e
+        finally:
+            r.close()
+        if not out:
+            out = {"response": "".join(parts), "done": False, "early_stop": False}
+        if lps:
+            out["logprobs"] = lps
+        out["ttft_s"] = round(ttft, 3) if ttft is not None else None
+        return out
+
+    def model_digest(self, model) -> str:
+        """Digest du modèle installé (/api/tags) ; dernier connu si le serveur ne répond pas."""
+        if model in self._digests:
+            return self._digests[model]
+        digest = ""
+        try:
+            r = self.session.get(f"{self.host}/api/tags", timeout=(CONNECT_TIMEOUT_S, 10))
+            tags = {m["name"]: m.get("digest", "") for m in r.json().get("models", [])}
+            digest = tags.get(model) or tags.get(f"{model}:latest", "")
+        except Exception:
+            pass
+        if self.cache is not None:
+            if digest:
+                self.cache.remember_digest(model, digest)
+            else:
+                digest = self.cache.known_digest(model)
+        self._digests[model] = digest = digest or model
+        return digest
+
+    def size(self, model, body, explicit=(), profile="web"):
+        """num_predict = borne de la sortie d'après le schéma ("format" dict) ; num_ctx = plus petit
+        palier couvrant prompt + sortie. Le palier ne redescend pas pour un modèle : changer num_ctx
+        force Ollama à recharger le modèle, un palier un peu large coûte moins qu'un rechargement."""
+        import token_window   # import local : token_window importe PROFILES d'ici
+        opts = body["options"]
+        if isinstance(body.get("format"), dict) and "num_predict" not in explicit:
+            opts["num_predict"] = predict_tokens(profile, body["format"])
+        if "num_ctx" in explicit:
+            return
+        need = token_window.est_tokens(body.get("system", "") + body["prompt"], model) \
+            + token_window.MARGIN + opts["num_predict"]
+        ctx = next((b for b in CTX_BUCKETS if b >= need), CTX_BUCKETS[-1])
+        with self._lock:
+            ctx = self._ctx[model] = max(ctx, self._ctx.get(model, 0))
+        opts["num_ctx"] = ctx
+
+    def generate(self, model, prompt, system="", profile="web", cache=True, stream=None, required=(), prefix="", **kw) -> dict:
+        """Réponse complète de /api/generate ("response", prompt_eval_count, eval_count, durées...).
+        "cached": True si servie par llm_cache (durées alors celles de l'appel d'origine).
+        En streaming (LLM_STREAM) : + ttft_s, t_json_s, early_stop ; après un arrêt anticipé,
+        eval_count = tokens reçus et prompt_eval_* absents (Ollama ne les envoie qu'en fin).
+        `prefix` : partie statique du prompt (cf. compose), gardée en contexte via num_keep.
+        LLM_LOGPROBS : + "logprobs" (liste {token, logprob} des tokens générés, si le serveur les fournit)."""
+        if LOGPROBS:
+            kw.setdefault("logprobs", True)
+        if prefix and PREFIX:
+            kw["options"] = {**(kw.get("options") or {}), "num_keep": len(system + prefix) // CHARS_PER_TOKEN}
+        body = self.payload(model, prefix + prompt, system=system, profile=profile, **kw)
+        if ADAPT:
+            self.size(model, body, explicit=kw.get("options") or {}, profile=profile)
+        stream = STREAM if stream is None else stream
+        k = None
+        if cache and self.cache is not None and llm_cache.cacheable(body):
+            k = llm_cache.key(self.model_digest(model), body)
+            hit = self.cache.get(k)
+            if hit is not None:
+                return {**hit, "cached": True}
+        read_timeout = PROFILES[profile]["read_timeout"]
+        if stream and body.get("format"):
+            resp = self.stream("/api/generate", body, read_timeout=read_timeout, required=required)
+        else:
+            resp = self.post("/api/generate", body, read_timeout=read_timeout)
+        if k is not None and resp.get("done", True):
+            self.cache.put(k, model, {f: v for f, v in resp.items() if f not in ("ttft_s", "t_json_s", "early_stop")})
+        return {**resp, "cached": False,
+                "num_ctx": body["options"]["num_ctx"], "num_predict": body["options"]["num_predict"]}
+
+    def generate_text(self, model, prompt, system="", profile="web", **kw) -> str:
+        return self.generate(model, prompt, system=system, profile=profile, **kw)["response"]
+
+    def pin_ctx(self, model, num_ctx):
+        """num_ctx plancher pour ce modèle (celui du chargement, cf. model_residency)."""
+        with self._lock:
+            self._ctx[model] = max(num_ctx, self._ctx.get(model, 0))
+
+    def current_ctx(self, model, default=None):
+        """Palier num_ctx en cours pour ce modèle (celui des prochaines requêtes), sinon `default`."""
+        with self._lock:
+            return self._ctx.get(model, default)
+
+    def close(self):
+        self.session.close()
+
+_CLIENT = None
+
+def get_ollama() -> OllamaClient:
+    """Client partagé du processus (une seule connexion keep-alive réutilisée)."""
+    global _CLIENT
+    if _CLIENT is None:
+        # au moins une connexion par requête en vol (LLM_PARALLEL, cf. llm_dispatch.py)
+        _CLIENT = OllamaClient(pool_size=max(8, int(os.getenv("LLM_PARALLEL", "1"))),
+                               cache=llm_cache.get_llm_cache())
+    return _CLIENT
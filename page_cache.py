@@ -0,0 +1,157 @@
+# page_cache.py — cache borné du texte des pages (partagé RPA / LLM)
+# - clé = sha1 complet de l'URL + URL stockée dans l'index (collision → miss)
+# - ETag / Last-Modified conservés pour la revalidation conditionnelle (304)
+# - éviction par âge (PURGE_AGE_S) et par taille totale (MAX_BYTES, LRU)
+# - compteurs hits / misses / octets lus et écrits
+#
+# Index : cache/index.sqlite ; contenus : cache/pages/<sha1>.txt
+# Bilan :  python page_cache.py
+import hashlib, os, sqlite3, threading, time
+from pathlib import Path
+
+CACHE_DIR   = Path(os.getenv("PAGE_CACHE_DIR", "cache"))
+MAX_BYTES   = int(os.getenv("PAGE_CACHE_MAX_MB", "200")) * 1_000_000
+MAX_AGE_S   = 7 * 24 * 3600      # au-delà : entrée "périmée", à revalider
+PURGE_AGE_S = 30 * 24 * 3600     # au-delà : supprimée
+
+def key(url: str) -> str:
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+class PageCache:
+    def __init__(self, root: Path = CACHE_DIR, max_bytes=MAX_BYTES, max_age=MAX_AGE_S, purge_age=PURGE_AGE_S):
+        self.root = root
+        self.pages = root / "pages"
+        self.pages.mkdir(parents=True, exist_ok=True)
+        self.max_bytes, self.max_age, self.purge_age = max_bytes, max_age, purge_age
+        self.db = sqlite3.connect(str(root / "index.sqlite"), check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS entries (
+            key TEXT PRIMARY KEY, url TEXT, size INTEGER, etag TEXT, last_modified TEXT,
+            fetched_at REAL, accessed_at REAL)""")
+        self.db.commit()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.stale = self.revalidated = 0
+        self.bytes_read = self.bytes_written = 0
+
+    def _file(self, k: str) -> Path:
+        return self.pages / f"{k}.txt"
+
+    def _row(self, url: str):
+        with self._lock:
+            row = self.db.execute("SELECT url, size, etag, last_modified, fetched_at FROM entries WHERE key=?",
+                                  (key(url),)).fetchone()
+        if row and row[0] != url:   # collision de préfixe / clé : on ne fait pas confiance
+            return None
+        return row
+
+    def _legacy(self, url: str):
+        """Ancien format cache/<sha1[:12]>.txt : importé à la première lecture."""
+        old = self.root / f"{key(url)[:12]}.txt"
+        if old.exists():
+            text = old.read_text(encoding="utf-8")
+            self.put(url, text)
+            old.unlink()
+            return text
+        return None
+
+    def get(self, url: str, allow_stale=False):
+        """Texte en cache ou None (absent, ou périmé sauf allow_stale)."""
+        row = self._row(url)
+        if row is None:
+            text = self._legacy(url)
+            if text is None:
+                self.misses += 1
+                return None
+            row = self._row(url)
+        if not allow_stale and time.time() - row[4] > self.max_age:
+            self.stale += 1
+            return None
+        p = self._file(key(url))
+        if not p.exists():
+            self.misses += 1
+            return None
+        text = p.read_text(encoding="utf-8")
+        self.hits += 1
+        self.bytes_read += row[1]
+        with self._lock:
+            self.db.execute("UPDATE entries SET accessed_at=? WHERE key=?", (time.time(), key(url)))
+            self.db.commit()
+        return text
+
+    def has(self, url: str) -> bool:
+        return self._row(url) is not None
+
+    def put(self, url: str, text: str, etag="", last_modified=""):
+        k = key(url)
+        data = text.encode("utf-8")
+        tmp = self._file(k).with_suffix(".tmp")
+        tmp.write_bytes(data)
+        tmp.replace(self._file(k))
+        now = time.time()
+        with self._lock:
+            self.db.execute("INSERT OR REPLACE INTO entries VALUES (?,?,?,?,?,?,?)",
+                            (k, url, len(data), etag or "", last_modified or "", now, now))
+            self.db.commit()
+        self.bytes_written += len(data)
+        self.evict()
+
+    def conditional_headers(self, url: str) -> dict:
+        """En-têtes If-None-Match / If-Modified-Since pour une entrée connue."""
+        row = self._row(url)
+        if not row:
+            return {}
+        h = {}
+        if row[2]: h["If-None-Match"] = row[2]
+        if row[3]: h["If-Modified-Since"] = row[3]
+        return h
+
+    def touch(self, url: str):
+        """Réponse 304 : l'entrée redevient fraîche sans réécrire le contenu."""
+        self.revalidated += 1
+        with self._lock:
+            self.db.execute("UPDATE entries SET fetched_at=? WHERE key=?", (time.time(), key(url)))
+            self.db.commit()
+
+    def evict(self):
+        with self._lock:
+            old = self.db.execute("SELECT key FROM entries WHERE fetched_at < ?",
+                                  (time.time() - self.purge_age,)).fetchall()
+            total = self.db.execute("SELECT COALESCE(SUM(size),0) FROM entries").fetchone()[0]
+            lru = []
+            if total > self.max_bytes:
+                for k, size in self.db.execute("SELECT key, size FROM entries ORDER BY accessed_at"):
+                    if total <= self.max_bytes * 0.9:   # marge pour ne pas évincer à chaque put
+                        break
+                    lru.append((k,)); total -= size
+            for (k,) in old + lru:
+                self._file(k).unlink(missing_ok=True)
+            self.db.executemany("DELETE FROM entries WHERE key=?", old + lru)
+            self.db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            n, total = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size),0) FROM entries").fetchone()
+        lookups = self.hits + self.misses + self.stale
+        return {"entries": n, "bytes": total, "hits": self.hits, "misses": self.misses,
+                "stale": self.stale, "revalidated_304": self.revalidated,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "bytes_read": self.bytes_read, "bytes_written": self.bytes_written}
+
+    def report(self, tag="CACHE"):
+        s = self.stats()
+        print(f"[{tag}] {s['entries']} pages ({s['bytes']/1e6:.1f}/{self.max_bytes/1e6:.0f} Mo) | "
+              f"hits={s['hits']} misses={s['misses']} périmées={s['stale']} 304={s['revalidated_304']} "
+              f"(taux={s['hit_rate']:.1%}) | lus={s['bytes_read']/1e6:.1f} Mo écrits={s['bytes_written']/1e6:.1f} Mo")
+        return s
+
+_CACHE = None
+
+def get_cache() -> PageCache:
+    """Cache partagé du processus."""
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = PageCache()
+    return _CACHE
+
+if __name__ == "__main__":
+    get_cache().report()
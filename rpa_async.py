@@ -0,0 +1,166 @@
+# rpa_async.py — moteur Playwright asynchrone (N URLs en parallèle, mêmes champs que rpa_runner)
+# Usage:
+#   python rpa_async.py [data/urls.txt] [concurrence=8] [req/s par hôte=2]
+import asyncio, json, sys, time
+from collections import defaultdict
+from pathlib import Path
+from urllib.parse import urlparse
+from playwright.async_api import async_playwright, TimeoutError
+
+from rpa_runner import (OUT, SS_DIR, PAGES, URLS_PATH, SEL_TITLE, EXTRACT_JS, EXTRACT_RULES,
+                        NET, SNAP, shape_dom, safe_name, read_urls)
+from net_filter import JS_HEAP
+import site_template
+import snapshots
+
+try:
+    sys.stdout.reconfigure(encoding="utf-8")
+except Exception:
+    pass
+
+CONCURRENCY   = 8      # pages ouvertes en même temps
+HOST_RATE     = 2.0    # navigations max par seconde et par hôte
+HOST_PARALLEL = 4      # pages max en parallèle sur un même hôte
+
+class HostLimiter:
+    """Limite par hôte : nb de pages simultanées + intervalle mini entre deux navigations."""
+    def __init__(self, rate=HOST_RATE, parallel=HOST_PARALLEL):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.parallel = parallel
+        self.sems = {}
+        self.locks = defaultdict(asyncio.Lock)
+        self.next_slot = defaultdict(float)
+
+    def sem(self, host):
+        if host not in self.sems:
+            self.sems[host] = asyncio.Semaphore(self.parallel)
+        return self.sems[host]
+
+    async def wait_turn(self, host):
+        if not self.interval:
+            return
+        async with self.locks[host]:
+            now = time.monotonic()
+            wait = self.next_slot[host] - now
+            self.next_slot[host] = max(now, self.next_slot[host]) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+async def accept_cookies(page):
+    for txt in ["Tout accepter","Accepter tout","Accept all","J'accepte"]:
+        btn = page.get_by_role("button", name=txt)
+        if await btn.count() > 0:
+            try:
+                await btn.first.click(timeout=1500)
+                break
+            except Exception:
+                pass
+
+async def extract_all(page):
+    # un seul page.evaluate, mêmes règles que rpa_runner.extract_dom
+    return shape_dom(await page.evaluate(EXTRACT_JS, EXTRACT_RULES))
+
+async def scrape(browser, url, timeout_ms=15000, retries=1):
+    success=False; err=""; pred={}
+    ctx = None
+    t0 = time.time()
+    try:
+        # contexte dans le try : un échec d'ouverture devient un enregistrement success=False
+        try:
+            ctx = await NET.install_async(await browser.new_context())
+            if SNAP and snapshots.MODE == "replay":
+                await SNAP.install_replay_async(ctx)
+            page = await ctx.new_page()
+        except Exception as e:
+            return False, f"context: {type(e).__name__}: {e}", pred
+        attempt=0
+        while attempt <= retries and not success:
+            attempt += 1
+            try:
+                resp = await page.goto(url, timeout=timeout_ms)
+                await page.wait_for_load_state("domcontentloaded")
+                await accept_cookies(page)
+                await page.wait_for_selector(SEL_TITLE, timeout=timeout_ms)
+                await asyncio.sleep(0.4)  # petite hydratation
+                pred, main_text = await extract_all(page)
+
+                # cache texte pour LLM (même emplacement que rpa_runner)
+                hdr = resp.headers if resp else {}
+                PAGES.put(url, main_text, hdr.get("etag", ""), hdr.get("last-modified", ""))
+                site_template.observe(url, main_text)
+                if SNAP and snapshots.MODE == "record":
+                    SNAP.put(url, await page.content(), main_text,
+                             resp.headers if resp else {}, resp.status if resp else 200)
+                success = True
+            except TimeoutError as e:
+                err = f"timeout:{e} (try {attempt}/{retries})"
+            except Exception as e:
+                err = f"{type(e).__name__}: {e} (try {attempt}/{retries})"
+        if not success:
+            try:
+                await page.screenshot(path=str(SS_DIR / f"{safe_name(url)}.png"))
+            except Exception:
+                pass
+        try:
+            heap = await page.evaluate(JS_HEAP)
+        except Exception:
+            heap = 0
+        NET.note_page(heap_bytes=heap, load_s=time.time()-t0)
+    finally:
+        if ctx is not None:
+            try:
+                await ctx.close()
+            except Exception:
+                pass
+    return success, err, pred
+
+async def run_all(urls, concurrency=CONCURRENCY, host_rate=HOST_RATE, headless=True):
+    sem = asyncio.Semaphore(concurrency)
+    hosts = HostLimiter(rate=host_rate)
+    out = OUT.open("a", encoding="utf-8")
+    recs = []
+
+    async def one(browser, url):
+        host = urlparse(url).netloc
+        async with sem, hosts.sem(host):
+            await hosts.wait_turn(host)
+            t0 = time.time()   # latence propre à l'URL (hors attente de file)
+            try:
+                success, err, pred = await scrape(browser, url)
+            except Exception as e:   # navigateur tombé... : l'URL est consignée en échec, le run continue
+                success, err, pred = False, f"{type(e).__name__}: {e}", {}
+        rec = {
+            "id": url, "variant": "A_RPA", "tier": "browser",
+            "latency_s": round(time.time()-t0,3),
+            "success": success, "error": err, "pred": pred
+        }
+        out.write(json.dumps(rec, ensure_ascii=False)+"\n"); out.flush()
+        print(f"[RPA-ASYNC] {url} -> {success} ({rec['latency_s']}s) err={err}")
+        recs.append(rec)
+
+    t_wall = time.time()
+    try:
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(headless=headless)
+            try:
+                await asyncio.gather(*(one(browser, u) for u in urls), return_exceptions=True)
+            finally:
+                await browser.close()
+    finally:
+        out.close()
+    wall = time.time() - t_wall
+
+    if recs:
+        lat = sorted(r["latency_s"] for r in recs)
+        ok = sum(r["success"] for r in recs)
+        print(f"[RPA-ASYNC] n={len(recs)} | succès={ok/len(recs):.1%} | médiane={lat[len(lat)//2]:.3f}s/URL | "
+              f"mur={wall:.1f}s | débit={len(recs)/wall:.2f} URL/s (concurrence={concurrency})")
+        NET.report("RPA-NET")
+        PAGES.report("RPA-CACHE")
+    return recs
+
+if __name__ == "__main__":
+    path = Path(sys.argv[1]) if len(sys.argv) > 1 else URLS_PATH
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else CONCURRENCY
+    host_rate = float(sys.argv[3]) if len(sys.argv) > 3 else HOST_RATE
+    asyncio.run(run_all(read_urls(path), concurrency=concurrency, host_rate=host_rate))
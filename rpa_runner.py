@@ -1,12 +1,15 @@
 # rpa_runner.py (OK: wait sur le titre, champs optionnels, + cache pour LLM)
-import json, time, sys, re, hashlib
+import json, os, time, sys, re, hashlib
 from pathlib import Path
 from playwright.sync_api import sync_playwright, TimeoutError
+from net_filter import NetFilter, JS_HEAP
+import site_template
+import snapshots
+from page_cache import get_cache
 
 OUT = Path("results/results_rpa.jsonl")
 SS_DIR = Path("results/screens")
-CACHE_DIR = Path("cache")
-for d in [OUT.parent, SS_DIR, CACHE_DIR]:
+for d in [OUT.parent, SS_DIR]:
     d.mkdir(parents=True, exist_ok=True)
 
 SEL_TITLE    = "h1, h2, [data-testid='job-title'], .job-title, .two-line-clamp"
@@ -14,6 +17,29 @@ SEL_COMPANY  = "[data-testid='company'], [data-qa*='company'], a[href*='/compani
 SEL_LOCATION = "[data-testid='location'], [class*='location'], li[aria-label*='Lieu'], [itemprop='address'], [data-testid*='address']"
 SEL_SALARY   = "[data-testid='salary'], [class*='salary'], [itemprop='salary']"
 SEL_SKILLS   = "[data-testid*='skills'] li, ul li"
+SEL_MAIN     = "[data-testid='job-description'], [role='main'], main, article"
+
+# Règles de sélection pour l'extraction en un seul aller-retour (EXTRACT_JS)
+EXTRACT_RULES = {
+    "fields": {"title": SEL_TITLE, "company": SEL_COMPANY, "location": SEL_LOCATION, "salary": SEL_SALARY},
+    "skills": SEL_SKILLS,
+    "main": SEL_MAIN,
+}
+EXTRACT_MODE = "dom"   # "dom" = 1 page.evaluate ; "locators" = ancien chemin (1 appel par champ)
+
+# Tout est lu côté navigateur : mêmes sémantiques que text_content / all_text_contents / inner_text
+EXTRACT_JS = """(rules) => {
+    const txt = (sel) => { const n = document.querySelector(sel); return n ? (n.textContent || "") : ""; };
+    const fields = {};
+    for (const [k, sel] of Object.entries(rules.fields)) fields[k] = txt(sel);
+    const skills = Array.from(document.querySelectorAll(rules.skills), n => n.textContent || "");
+    const main = document.querySelector(rules.main) || document.body;
+    return {fields, skills, main_text: main ? main.innerText : ""};
+}"""
+
+NET = NetFilter()   # images/polices/médias/traqueurs bloqués (cf. net_filter.py)
+SNAP = snapshots.get_store()   # SNAPSHOT=record|replay (cf. snapshots.py), None sinon
+PAGES = get_cache()            # cache texte borné, partagé avec llm_runner (cf. page_cache.py)
 
 def clean(s: str) -> str:
     if not s: return ""
@@ -42,6 +68,18 @@ def get_text(page, selector, timeout_ms=0):
     except Exception:
         return ""
 
+def pick_skills(raw):
+    """Nettoie, dédoublonne et borne la liste des skills (10 items ≤ 50 car.)."""
+    skills = []; seen=set()
+    for s in (clean(x) for x in raw):
+        if not s or len(s) > 50:
+            continue
+        k=s.lower()
+        if k not in seen:
+            seen.add(k); skills.append(s)
+        if len(skills) >= 10: break
+    return skills
+
 def extract(page):
     title   = get_text(page, SEL_TITLE, timeout_ms=100)  # déjà attendu avant
     company = get_text(page, SEL_COMPANY)
@@ -50,81 +88,245 @@ def extract(page):
     # skills (optionnel)
     skills = []
     try:
-        raw = [clean(s) for s in page.locator(SEL_SKILLS).all_text_contents()]
-        seen=set()
-        for s in raw:
-            if not s or len(s) > 50: 
-                continue
-            k=s.lower()
-            if k not in seen:
-                seen.add(k); skills.append(s)
-            if len(skills) >= 10: break
+        skills = pick_skills(page.locator(SEL_SKILLS).all_text_contents())
     except Exception:
         pass
     return {"title": title, "company": company, "location": location, "salary": salary, "skills": skills}
 
-def run_one(url: str, timeout_ms=15000, retries=1, headless=True):
-    t0 = time.time(); success=False; err=""; pred={}
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=headless)
-        ctx = browser.new_context()
-        page = ctx.new_page()
+def read_main_text(page):
+    try:
+        node = page.locator(SEL_MAIN).first
+        if node.count() == 0:
+            node = page.locator("body")
+        return node.inner_text(timeout=800)
+    except Exception:
         try:
-            attempt=0
-            while attempt <= retries and not success:
-                attempt += 1
-                try:
-                    page.goto(url, timeout=timeout_ms)
-                    page.wait_for_load_state("domcontentloaded")
-                    accept_cookies(page)
-                    # 👇 On attend UNIQUEMENT le titre
-                    page.wait_for_selector(SEL_TITLE, timeout=timeout_ms)
-                    time.sleep(0.4)  # petite hydratation
-                    pred = extract(page)
-
-                    # --- CACHE TEXTE POUR LLM (écrit ici, où 'page' et 'url' existent) ---
-                    try:
-                        node = page.locator("[data-testid='job-description'], [role='main'], main, article").first
-                        if node.count() == 0:
-                            node = page.locator("body")
-                        main_text = node.inner_text(timeout=800)
-                    except Exception:
-                        try:
-                            main_text = page.locator("body").inner_text(timeout=500)
-                        except Exception:
-                            main_text = ""
-                    (CACHE_DIR / f"{safe_name(url)}.txt").write_text(main_text, encoding="utf-8")
-                    # --- FIN CACHE ---
-
-                    success = True
-                except TimeoutError as e:
-                    err = f"timeout:{e} (try {attempt}/{retries})"
-                    if attempt > retries: raise
-                except Exception as e:
-                    err = f"{type(e).__name__}: {e} (try {attempt}/{retries})"
-                    if attempt > retries: raise
+            return page.locator("body").inner_text(timeout=500)
         except Exception:
-            # screenshot nominatif
+            return ""
+
+def shape_dom(raw: dict):
+    """Résultat brut d'EXTRACT_JS → (pred, main_text) au format d'extract()."""
+    fields = raw.get("fields", {})
+    pred = {k: clean(fields.get(k, "")) for k in EXTRACT_RULES["fields"]}
+    pred["skills"] = pick_skills(raw.get("skills", []))
+    return pred, raw.get("main_text", "") or ""
+
+def extract_dom(page, rules=EXTRACT_RULES):
+    """Champs + skills + texte principal en un seul aller-retour navigateur."""
+    return shape_dom(page.evaluate(EXTRACT_JS, rules))
+
+def extract_all(page, mode=None):
+    if (mode or EXTRACT_MODE) == "dom":
+        return extract_dom(page)
+    return extract(page), read_main_text(page)
+
+def scrape(page, url: str, timeout_ms=15000, retries=1):
+    """Navigue sur `url` dans une page déjà ouverte → (success, err, pred)."""
+    success=False; err=""; pred={}
+    try:
+        attempt=0
+        while attempt <= retries and not success:
+            attempt += 1
             try:
-                page.screenshot(path=str(SS_DIR / f"{safe_name(url)}.png"))
-            except Exception:
-                pass
-        finally:
-            browser.close()
+                resp = page.goto(url, timeout=timeout_ms)
+                page.wait_for_load_state("domcontentloaded")
+                accept_cookies(page)
+                # 👇 On attend UNIQUEMENT le titre
+                page.wait_for_selector(SEL_TITLE, timeout=timeout_ms)
+                time.sleep(0.4)  # petite hydratation
+                pred, main_text = extract_all(page)
+
+                # --- CACHE TEXTE POUR LLM (écrit ici, où 'page' et 'url' existent) ---
+                hdr = resp.headers if resp else {}
+                PAGES.put(url, main_text, hdr.get("etag", ""), hdr.get("last-modified", ""))
+                site_template.observe(url, main_text)   # gabarit du site (cf. site_template.py)
+                if SNAP and snapshots.MODE == "record":
+                    SNAP.put(url, page.content(), main_text,
+                             resp.headers if resp else {}, resp.status if resp else 200)
+                # --- FIN CACHE ---
+
+                success = True
+            except TimeoutError as e:
+                err = f"timeout:{e} (try {attempt}/{retries})"
+                if attempt > retries: raise
+            except Exception as e:
+                err = f"{type(e).__name__}: {e} (try {attempt}/{retries})"
+                if attempt > retries: raise
+    except Exception:
+        # screenshot nominatif
+        try:
+            page.screenshot(path=str(SS_DIR / f"{safe_name(url)}.png"))
+        except Exception:
+            pass
+    return success, err, pred
+
+def new_context(browser, **kw):
+    """Contexte avec filtre réseau ; en replay, les documents viennent du magasin de snapshots."""
+    ctx = NET.install(browser.new_context(**kw))
+    if SNAP and snapshots.MODE == "replay":
+        SNAP.install_replay(ctx)
+    return ctx
+
+def note_page(page, t0: float):
+    """Mesure réseau/mémoire de la page pour le bilan NET."""
+    try:
+        heap = page.evaluate(JS_HEAP)
+    except Exception:
+        heap = 0
+    NET.note_page(heap_bytes=heap, load_s=time.time()-t0)
 
+def write_record(url: str, t0: float, success: bool, err: str, pred: dict, **extra):
+    # tier : "browser" (visite Playwright), "meta" (métadonnées de recherche), "jsonld" (jsonld_fast.py)
     rec = {
-        "id": url, "variant": "A_RPA",
+        "id": url, "variant": "A_RPA", "tier": "browser",
         "latency_s": round(time.time()-t0,3),
-        "success": success, "error": err, "pred": pred
+        "success": success, "error": err, "pred": pred, **extra
     }
     OUT.open("a", encoding="utf-8").write(json.dumps(rec, ensure_ascii=False)+"\n")
     print(f"[RPA] {url} -> {success} ({rec['latency_s']}s) err={err}")
     return rec
 
+def run_one(url: str, timeout_ms=15000, retries=1, headless=True):
+    t0 = time.time()
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=headless)
+        ctx = new_context(browser)
+        page = ctx.new_page()
+        try:
+            success, err, pred = scrape(page, url, timeout_ms, retries)
+            note_page(page, t0)
+        finally:
+            browser.close()
+    return write_record(url, t0, success, err, pred)
+
+# ========= MODE BATCH (navigateur persistant) =========
+URLS_PATH = Path("data/urls.txt")
+RECYCLE_EVERY = 200   # relance le navigateur toutes les N pages (fuites mémoire Chromium)
+
+def read_urls(path: Path = URLS_PATH):
+    return [u.strip() for u in path.read_text(encoding="utf-8").splitlines() if u.strip()]
+
+META_PATH = Path("data/urls_meta.jsonl")   # écrit par build_urls_wttj.py en mode api
+# RPA_META=1 : URLs aux métadonnées complètes non visitées (variant A_RPA_META, pas A_RPA) ;
+# par défaut toutes les URLs sont visitées, comme avant
+USE_META = os.getenv("RPA_META", "0") == "1"
+META_FIELDS = ("title", "company", "location", "salary")
+
+def load_meta(path: Path = META_PATH) -> dict:
+    """url -> métadonnées de recherche (titre, entreprise, lieu, salaire, résumé)."""
+    if not path.exists():
+        return {}
+    meta = {}
+    for line in path.read_text(encoding="utf-8").splitlines():
+        try:
+            m = json.loads(line)
+            meta[m["url"]] = m
+        except Exception:
+            pass
+    return meta
+
+def meta_pred(m: dict):
+    """pred complet depuis les métadonnées, ou None s'il manque un champ (→ visite)."""
+    if not m or not all(m.get(k) for k in META_FIELDS):
+        return None
+    return {**{k: clean(m[k]) for k in META_FIELDS}, "skills": []}
+
+def prefill_cache(url: str, m: dict):
+    # le résumé de l'API sert de texte LLM tant que la page n'a pas été visitée
+    if m and m.get("summary") and not PAGES.has(url):
+        head = "\n".join(m.get(k, "") for k in META_FIELDS if m.get(k))
+        PAGES.put(url, head + "\n" + m["summary"])
+
+def run_batch(urls, timeout_ms=15000, retries=1, headless=True, recycle_every=RECYCLE_EVERY, meta=None):
+    """Un seul Chromium pour toute la liste ; contexte + page neufs par URL.
+
+    Même format de sortie que run_one (A_RPA dans OUT). Le temps de lancement
+    du navigateur est mesuré à part : c'est ce que chaque URL paie en mode run_one.
+    Avec RPA_META=1 (ou `meta` fourni), les URLs dont les métadonnées de recherche sont complètes
+    ne sont pas visitées : enregistrées sous le variant A_RPA_META, hors mesures du RPA.
+    """
+    if meta is None:
+        meta = load_meta() if USE_META else {}
+    todo = []
+    recs = []; launches = []; skipped = 0
+    for url in urls:
+        t0 = time.time()
+        pred = meta_pred(meta.get(url))
+        if pred is None:
+            prefill_cache(url, meta.get(url))
+            todo.append(url)
+            continue
+        recs.append(write_record(url, t0, True, "", pred, tier="meta", variant="A_RPA_META")); skipped += 1
+    if skipped:
+        print(f"[RPA-BATCH] {skipped} URL(s) résolues par les métadonnées de recherche (pas de visite)")
+
+    with sync_playwright() as p:
+        browser = None
+        try:
+            for i, url in enumerate(todo):
+                t0 = time.time()
+                ctx = None
+                try:
+                    if browser is None or (recycle_every and i and i % recycle_every == 0):
+                        if browser is not None:
+                            browser.close()
+                            browser = None
+                        tl = time.time()
+                        browser = p.chromium.launch(headless=headless)
+                        launches.append(time.time() - tl)
+                        t0 = time.time()
+                    ctx = new_context(browser)
+                    page = ctx.new_page()
+                    success, err, pred = scrape(page, url, timeout_ms, retries)
+                    note_page(page, t0)
+                except Exception as e:
+                    # navigateur/contexte tombé : l'URL est consignée en échec, le lot continue
+                    # (navigateur relancé à l'URL suivante s'il n'a pas pu ouvrir de contexte)
+                    success, err, pred = False, f"context: {type(e).__name__}: {e}", {}
+                    if ctx is None and browser is not None:
+                        try:
+                            browser.close()
+                        except Exception:
+                            pass
+                        browser = None
+                finally:
+                    if ctx is not None:
+                        try:
+                            ctx.close()
+                        except Exception:
+                            pass
+                recs.append(write_record(url, t0, success, err, pred))
+        finally:
+            if browser is not None:
+                try:
+                    browser.close()
+                except Exception:
+                    pass
+
+    visited = [r for r in recs if r["tier"] == "browser"]
+    if visited:
+        lat = sorted(r["latency_s"] for r in visited)
+        launch_avg = sum(launches) / len(launches) if launches else 0.0
+        saved = launch_avg * (len(visited) - len(launches))
+        print(f"[RPA-BATCH] n={len(visited)} | médiane={lat[len(lat)//2]:.3f}s/URL | "
+              f"lancement navigateur≈{launch_avg:.3f}s x{len(launches)} "
+              f"(au lieu de x{len(visited)}) → économie≈{launch_avg:.3f}s/URL, {saved:.1f}s au total")
+        NET.report("RPA-NET")
+        PAGES.report("RPA-CACHE")
+    return recs
+
 if __name__ == "__main__":
-    url = sys.argv[1] if len(sys.argv)>1 else "https://example.org"
-    headless = (sys.argv[2].lower() != "false") if len(sys.argv) > 2 else True
-    run_one(url, headless=headless)
+    # Usage : python rpa_runner.py <url> [headless]
+    #         python rpa_runner.py --batch [data/urls.txt] [headless]
+    if len(sys.argv) > 1 and sys.argv[1] == "--batch":
+        path = Path(sys.argv[2]) if len(sys.argv) > 2 else URLS_PATH
+        headless = (sys.argv[3].lower() != "false") if len(sys.argv) > 3 else True
+        run_batch(read_urls(path), headless=headless)
+    else:
+        url = sys.argv[1] if len(sys.argv)>1 else "https://example.org"
+        headless = (sys.argv[2].lower() != "false") if len(sys.argv) > 2 else True
+        run_one(url, headless=headless)
 
 
 
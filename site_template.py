@@ -0,0 +1,136 @@
+# site_template.py — apprentissage des lignes communes à toutes les pages d'un même site
+# (en-tête, pied de page, barre latérale) pour ne pas les payer en prefill LLM.
+#
+# Le modèle par domaine est stocké une fois dans cache/_templates/<domaine>.json :
+#   {"pages": N, "lines": {"<ligne normalisée>": nb_de_pages_où_elle_apparaît}, "seen": [url, ...]}
+# rpa_runner l'enrichit à chaque page mise en cache (une URL n'est comptée qu'une fois : relances,
+# retries et run_one ne gonflent pas les compteurs) ; llm_runner s'en sert pour filtrer.
+# Garde-fous (les offres d'une même requête se ressemblent : titre, contrat, ville, stack...) :
+# - les lignes portant un indice de champ d'offre (token_window.CUES["job"] : salaire, lieu,
+#   contrat, compétences...) ne sont jamais suivies ni retirées, ni les FIELD_SPAN lignes qui
+#   les suivent (valeurs sous leur libellé : "Compétences" puis "SQL", "Python"...)
+# - seuls les blocs de gabarit en tête et en fin de texte sont retirés (en-tête, pied de page),
+#   jamais une ligne commune au milieu du contenu
+# - pas de masquage des chiffres : "Data Analyst 9" ou "45-55 k€" restent des lignes distinctes
+#
+# Reconstruction depuis le cache existant :
+#   python site_template.py [data/urls.txt]
+import json, re, sys, threading
+from pathlib import Path
+from urllib.parse import urlparse
+
+from token_window import CUES
+
+TEMPLATE_DIR = Path("cache/_templates")
+MIN_PAGES = 5          # pas de filtrage tant que le domaine a moins de pages observées
+MIN_SHARE = 0.6        # ligne "gabarit" si présente sur >= 60% des pages
+MAX_LINE = 200         # les longues lignes sont du contenu, on ne les suit pas
+MAX_TRACKED = 20000    # borne mémoire/disque par domaine
+FIELD_SPAN = 10        # lignes protégées après un libellé de champ (cf. "Limite skills à 10 items")
+
+_lock = threading.Lock()
+_FIELDS = [re.compile(p, re.I) for p in CUES["job"]]
+
+def domain(url: str) -> str:
+    host = (urlparse(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+def _norm(line: str) -> str:
+    return re.sub(r"\s+", " ", line).strip().lower()
+
+def _field(line: str) -> bool:
+    """Ligne qui porte (ou annonce) un champ de l'offre : jamais du gabarit."""
+    return any(p.search(line) for p in _FIELDS)
+
+def _path(dom: str) -> Path:
+    return TEMPLATE_DIR / f"{re.sub(r'[^a-z0-9.-]', '_', dom)}.json"
+
+def load(dom: str) -> dict:
+    p = _path(dom)
+    if p.exists():
+        try:
+            return json.loads(p.read_text(encoding="utf-8"))
+        except Exception:
+            pass
+    return {"pages": 0, "lines": {}, "seen": []}
+
+def save(dom: str, tpl: dict):
+    TEMPLATE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = _path(dom).with_suffix(".tmp")
+    tmp.write_text(json.dumps(tpl, ensure_ascii=False), encoding="utf-8")
+    tmp.replace(_path(dom))
+
+def observe(url: str, text: str):
+    """Mise à jour incrémentale : +1 page, +1 pour chaque ligne distincte de cette page.
+    Une URL déjà comptée est ignorée : sinon les lignes propres à une page re-scrapée
+    atteindraient MIN_SHARE et strip() supprimerait du vrai contenu."""
+    dom = domain(url)
+    if not dom or not text:
+        return
+    keys = {_norm(l) for l in text.splitlines() if l.strip() and len(l) <= MAX_LINE and not _field(l)}
+    with _lock:
+        tpl = load(dom)
+        seen = set(tpl.get("seen", []))
+        if url in seen:
+            return
+        seen.add(url)
+        tpl["seen"] = sorted(seen)
+        tpl["pages"] += 1
+        lines = tpl["lines"]
+        for k in keys:
+            lines[k] = lines.get(k, 0) + 1
+        if len(lines) > MAX_TRACKED:
+            # on oublie les lignes vues une seule fois (contenu propre à une page)
+            tpl["lines"] = {k: v for k, v in lines.items() if v > 1}
+        save(dom, tpl)
+
+def boilerplate(dom: str) -> set:
+    tpl = load(dom)
+    n = tpl["pages"]
+    if n < MIN_PAGES:
+        return set()
+    return {k for k, v in tpl["lines"].items() if v / n >= MIN_SHARE}
+
+def strip(url: str, text: str) -> str:
+    """Retire les blocs de gabarit en tête et en fin de texte (texte inchangé si modèle trop jeune) :
+    le retrait s'arrête à la première ligne propre à la page ou portant un champ de l'offre."""
+    bp = boilerplate(domain(url))
+    if not bp:
+        return text
+    lines = text.splitlines()
+    keep, last = set(), None
+    for k, l in enumerate(lines):
+        if _field(l):
+            last = k
+        if last is not None and k - last <= FIELD_SPAN:
+            keep.add(k)
+    def tpl(k):
+        return k not in keep and (not lines[k].strip() or _norm(lines[k]) in bp)
+    i, j = 0, len(lines)
+    while i < j and tpl(i):
+        i += 1
+    while j > i and tpl(j - 1):
+        j -= 1
+    return "\n".join(lines[i:j])
+
+def rebuild(urls):
+    """Reconstruit les modèles à partir des textes déjà en cache (page_cache)."""
+    from page_cache import get_cache
+    cache = get_cache()
+    for dom in {domain(u) for u in urls}:
+        if _path(dom).exists():
+            _path(dom).unlink()
+    n = 0
+    for u in urls:
+        text = cache.get(u, allow_stale=True)
+        if text:
+            observe(u, text); n += 1
+    for dom in sorted({domain(u) for u in urls}):
+        tpl = load(dom)
+        print(f"[TEMPLATE] {dom}: {tpl['pages']} pages, {len(boilerplate(dom))} lignes de gabarit")
+    return n
+
+if __name__ == "__main__":
+    path = Path(sys.argv[1]) if len(sys.argv) > 1 else Path("data/urls.txt")
+    urls = [u.strip() for u in path.read_text(encoding="utf-8").splitlines() if u.strip()]
+    rebuild(urls)
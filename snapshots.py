@@ -0,0 +1,102 @@
+# snapshots.py — magasin record/replay des pages (un seul fichier SQLite, contenus compressés zlib)
+# Chaque URL est enregistrée une fois (HTML rendu, texte principal, en-têtes de réponse) ;
+# RPA et LLM peuvent ensuite rejouer exactement les mêmes octets, hors ligne.
+#
+# Réglage par variables d'environnement :
+#   SNAPSHOT=off (défaut) | record | replay
+#   SNAPSHOT_PATH=data/snapshots.sqlite
+#
+# Inventaire :  python snapshots.py [SNAPSHOT_PATH]
+import json, os, sqlite3, sys, threading, time, zlib
+from pathlib import Path
+
+MODE = os.getenv("SNAPSHOT", "off").lower()
+PATH = Path(os.getenv("SNAPSHOT_PATH", "data/snapshots.sqlite"))
+KEEP_HEADERS = {"content-type", "content-language", "etag", "last-modified", "date", "cache-control"}
+
+class SnapshotStore:
+    def __init__(self, path: Path = PATH):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.db = sqlite3.connect(str(path), check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS pages (
+            url TEXT PRIMARY KEY, status INTEGER, headers TEXT,
+            html BLOB, main_text BLOB, ts REAL)""")
+        self.db.commit()
+        self._lock = threading.Lock()
+
+    def put(self, url: str, html="", main_text="", headers=None, status=200):
+        hdr = {k.lower(): v for k, v in (headers or {}).items() if k.lower() in KEEP_HEADERS}
+        if isinstance(html, bytes):
+            html = html.decode("utf-8", errors="replace")
+        with self._lock:
+            self.db.execute("INSERT OR REPLACE INTO pages VALUES (?,?,?,?,?,?)", (
+                url, status, json.dumps(hdr),
+                zlib.compress(html.encode("utf-8"), 6), zlib.compress(main_text.encode("utf-8"), 6),
+                time.time()))
+            self.db.commit()
+
+    def get(self, url: str):
+        """→ {"status", "headers", "html", "main_text", "ts"} ou None."""
+        with self._lock:
+            row = self.db.execute("SELECT status, headers, html, main_text, ts FROM pages WHERE url=?",
+                                  (url,)).fetchone()
+        if not row:
+            return None
+        return {"status": row[0], "headers": json.loads(row[1] or "{}"),
+                "html": zlib.decompress(row[2]).decode("utf-8") if row[2] else "",
+                "main_text": zlib.decompress(row[3]).decode("utf-8") if row[3] else "",
+                "ts": row[4]}
+
+    def has(self, url: str) -> bool:
+        with self._lock:
+            return self.db.execute("SELECT 1 FROM pages WHERE url=?", (url,)).fetchone() is not None
+
+    def stats(self) -> dict:
+        with self._lock:
+            n, raw = self.db.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(html)+LENGTH(main_text)),0) FROM pages").fetchone()
+        return {"pages": n, "stored_bytes": raw, "file_bytes": self.path.stat().st_size if self.path.exists() else 0}
+
+    # --- replay Playwright : le document vient du magasin, tout le reste est coupé (hors ligne)
+    def _fulfill_args(self, request):
+        if request.resource_type != "document":
+            return None
+        snap = self.get(request.url)
+        if not snap:
+            return None
+        headers = {"content-type": snap["headers"].get("content-type", "text/html; charset=utf-8")}
+        return {"status": snap["status"] or 200, "headers": headers, "body": snap["html"]}
+
+    def install_replay(self, ctx):
+        def handler(route):
+            args = self._fulfill_args(route.request)
+            route.fulfill(**args) if args else route.abort()
+        ctx.route("**/*", handler)
+        return ctx
+
+    async def install_replay_async(self, ctx):
+        async def handler(route):
+            args = self._fulfill_args(route.request)
+            await (route.fulfill(**args) if args else route.abort())
+        await ctx.route("**/*", handler)
+        return ctx
+
+    def close(self):
+        self.db.close()
+
+_STORE = None
+
+def get_store():
+    """Magasin partagé du processus, ou None si SNAPSHOT=off."""
+    global _STORE
+    if MODE == "off":
+        return None
+    if _STORE is None:
+        _STORE = SnapshotStore()
+    return _STORE
+
+if __name__ == "__main__":
+    st = SnapshotStore(Path(sys.argv[1]) if len(sys.argv) > 1 else PATH)
+    s = st.stats()
+    print(f"{st.path}: {s['pages']} pages | {s['stored_bytes']/1e6:.1f} Mo compressés | fichier {s['file_bytes']/1e6:.1f} Mo")
@@ -0,0 +1,94 @@
+# token_window.py — fenêtrage des entrées LLM en tokens (au lieu de [:6000] / [:4000] / [:1500])
+# - estimation du nombre de tokens par famille de modèle (car./token mesurés sur nos textes FR/EN)
+# - budget = num_ctx du profil - SYSTEM - préfixe - num_predict de l'appel (predict_tokens) - marge
+# - si le texte dépasse : on garde les segments les plus utiles (lignes proches d'indices
+#   "total", "facture", salaire, lieu...) + le début du document, dans l'ordre d'origine
+#
+# Contrôle : python token_window.py <fichier.txt> [invoice|job|email] [budget_tokens]
+import re, sys
+
+from ollama_client import PROFILES, predict_tokens
+
+# caractères par token (prudent : sous-estimer le ratio = surestimer les tokens = pas de débordement)
+CHARS_PER_TOKEN = {"mistral": 3.2, "llama3": 3.6, "qwen": 3.4, "phi": 3.3}
+DEFAULT_CPT = 3.0
+MARGIN = 32             # tokens du gabarit de chat (balises [INST], <|start_header_id|>...)
+SEG_CHARS = 300         # les lignes plus longues sont découpées (paragraphes d'emails, descriptions)
+GAP = "…"                # marque un saut entre segments conservés
+
+CUES = {
+    "invoice": [r"\btotal\b", r"amount\s+due", r"\bbalance\b", r"\bttc\b", r"\bnet\s+à\s+payer",
+                r"\binvoice\b", r"\bfacture\b", r"\bn[°o]\b|#", r"\bdate\b", r"\bdue\b",
+                r"€|\$|£|\beur\b|\busd\b|\bgbp\b", r"\bvat\b|\btva\b"],
+    "job":     [r"salaire|salary|rémunération|k€|€", r"\blieu\b|location|localisation|adresse|ville",
+                r"télétravail|remote|hybride", r"\bcdi\b|\bcdd\b|freelance|stage|alternance",
+                r"compétences|skills|stack|profil recherché|requirements", r"entreprise|company|poste"],
+    "email":   [r"^subject:", r"unsubscribe|désinscri", r"\bfree\b|gratuit|\bwin\b|prize|lottery",
+                r"click|cliquez|http", r"\$|€|credit|loan|offer|offre"],
+}
+HEAD_SEGS = {"invoice": 6, "job": 4, "email": 8}   # le début porte l'en-tête / le sujet
+
+def cpt(model: str) -> float:
+    m = (model or "").lower()
+    return next((v for k, v in CHARS_PER_TOKEN.items() if m.startswith(k)), DEFAULT_CPT)
+
+def est_tokens(text: str, model: str = "") -> int:
+    return int(len(text) / cpt(model)) + 1
+
+def budget(model: str, profile: str, system: str = "", prefix: str = "", template: str = "", num_ctx=None,
+           fmt=None) -> int:
+    """Tokens disponibles pour le contenu de l'item dans le profil (ou num_ctx donné).
+    `fmt` : "format" de l'appel, pour réserver le même num_predict que OllamaClient.size."""
+    ctx = num_ctx or PROFILES[profile]["options"]["num_ctx"]
+    fixed = est_tokens(system + prefix + template, model) + predict_tokens(profile, fmt) + MARGIN
+    return max(64, ctx - fixed)
+
+def segments(text: str):
+    out = []
+    for line in text.splitlines():
+        line = line.rstrip()
+        if not line.strip():
+            continue
+        while len(line) > SEG_CHARS:
+            cut = line.rfind(" ", 0, SEG_CHARS)
+            cut = cut if cut > SEG_CHARS // 2 else SEG_CHARS
+            out.append(line[:cut]); line = line[cut:].lstrip()
+        if line:
+            out.append(line)
+    return out
+
+def window(text: str, max_tokens: int, model: str = "", kind: str = "invoice") -> str:
+    """Texte tenant dans max_tokens : inchangé s'il tient, sinon les segments les mieux notés
+    (indices du domaine, voisins immédiats, début du texte) remis dans l'ordre d'origine."""
+    if est_tokens(text, model) <= max_tokens:
+        return text
+    segs = segments(text)
+    pats = [re.compile(p, re.I | re.M) for p in CUES.get(kind, [])]
+    hits = [sum(1 for p in pats if p.search(s)) for s in segs]
+    head = HEAD_SEGS.get(kind, 4)
+    scores = []
+    for i, s in enumerate(segs):
+        near = max(hits[max(0, i - 1):i + 2])          # valeur souvent sur la ligne voisine du libellé
+        sc = 3 * hits[i] + near + (4 if i < head else 0) - i / (10 * len(segs))
+        scores.append(sc)
+    keep, used = set(), 0
+    max_tokens = int(max_tokens * 0.95)                 # marques de saut "…" + retours ligne
+    for i in sorted(range(len(segs)), key=lambda i: -scores[i]):
+        t = est_tokens(segs[i], model) + 1
+        if used + t > max_tokens:
+            continue
+        keep.add(i); used += t
+    out, prev = [], -1
+    for i in sorted(keep):
+        if out and i != prev + 1:
+            out.append(GAP)
+        out.append(segs[i]); prev = i
+    return "\n".join(out)
+
+if __name__ == "__main__":
+    text = open(sys.argv[1], encoding="utf-8").read()
+    kind = sys.argv[2] if len(sys.argv) > 2 else "invoice"
+    n = int(sys.argv[3]) if len(sys.argv) > 3 else 300
+    w = window(text, n, kind=kind)
+    print(w)
+    print(f"\n[WINDOW] {est_tokens(text)} → {est_tokens(w)} tokens estimés (budget {n})", file=sys.stderr)